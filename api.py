@@ -0,0 +1,279 @@
+import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Show
+from resources import RESOURCES
+from exporter import generate
+from stats import refresh_for_shows
+from booking import is_conflict, is_deadlock, lock_slots
+from availability import search as search_availability
+from forms import AvailabilityForm
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_BATCH = 1000
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def error(status, message, **details):
+    response = jsonify(error=message, **details)
+    response.status_code = status
+    return response
+
+
+def deadlocked(e, verb):
+    # Postgres failed the transaction to break a deadlock with another write;
+    # nothing was written and the same request can simply be sent again.
+    if not is_deadlock(e):
+        raise e
+    response = error(503, 'The write collided with another one; nothing was %s. Retry the request.' % verb,
+                     detail=str(e.orig))
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def serialize(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for key, value in row._asdict().items()
+    }
+
+
+def conditional(payload):
+    # Strong ETag over the serialized body: polling clients that send it back
+    # in If-None-Match get an empty 304.
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def selected_fields(resource):
+    fields = request.args.get('fields')
+    if not fields:
+        return list(resource.fields), None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in resource.fields]
+    if unknown:
+        return None, error(400, 'Unknown fields.', fields=unknown)
+    # The id is always returned; clients need it to page and to update.
+    return ['id'] + [field for field in fields if field != 'id'], None
+
+
+def batch():
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get('data')
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        return None, error(400, 'Expected a non-empty JSON list of objects, or {"data": [...]}.')
+    if len(rows) > MAX_BATCH:
+        return None, error(413, 'At most %d rows per request.' % MAX_BATCH)
+    return rows, None
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/<any(venues, artists, shows):name>')
+def list_resource(name):
+    # Keyset pagination on id: ?after=<last id seen>&limit=<n>.
+    resource = RESOURCES[name]
+    fields, response = selected_fields(resource)
+    if response:
+        return response
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    after = request.args.get('after', 0, type=int)
+
+    query = resource.model.query.with_entities(*resource.columns(fields)) \
+        .filter(resource.model.id > after)
+    if name == 'shows':
+        for field in ('venue_id', 'artist_id'):
+            value = request.args.get(field, type=int)
+            if value is not None:
+                query = query.filter(getattr(Show, field) == value)
+    rows = [serialize(row) for row in query.order_by(resource.model.id).limit(limit + 1)]
+
+    payload = {'data': rows[:limit], 'next': None}
+    if len(rows) > limit:
+        args = dict(request.args.to_dict(), after=rows[limit - 1]['id'])
+        payload['next'] = url_for('api.list_resource', name=name, **args)
+    return conditional(payload)
+
+
+@api.route('/<any(venues, artists, shows):name>/export')
+def export_resource(name):
+    # Streams the whole (filtered) table as a chunked response:
+    # ?format=csv|jsonl&since=&until=&city=&state=&genre=
+    format = request.args.get('format', 'jsonl')
+    if format not in ('csv', 'jsonl'):
+        return error(400, 'format must be csv or jsonl.')
+    try:
+        filters = {key: request.args.get(key) for key in ('city', 'state', 'genre')}
+        for key in ('since', 'until'):
+            value = request.args.get(key)
+            filters[key] = datetime.datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return error(400, 'since and until must be ISO 8601 dates.')
+
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate(name, format, **filters)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename=%s.%s' % (name, format)
+    return response
+
+
+@api.route('/availability')
+def availability():
+    # Same filters as the /availability page:
+    # ?start=&end=&city=&state=&genres=&genres=&artist_id=&venue_id=&min_hours=
+    form = AvailabilityForm(formdata=request.args)
+    if not form.validate():
+        return error(400, 'Invalid filters.', fields=form.errors)
+    start, end, venues = search_availability(form)
+    for venue in venues:
+        venue['free_slots'] = [
+            {key: value.isoformat() for key, value in slot.items()} for slot in venue['free_slots']
+        ]
+    return conditional({'start': start.isoformat(), 'end': end.isoformat(), 'data': venues})
+
+
+@api.route('/<any(venues, artists, shows):name>/<int:item_id>')
+def get_resource(name, item_id):
+    resource = RESOURCES[name]
+    fields, response = selected_fields(resource)
+    if response:
+        return response
+    row = resource.model.query.with_entities(*resource.columns(fields)) \
+        .filter(resource.model.id == item_id).first()
+    if row is None:
+        return error(404, 'Not found.')
+    return conditional({'data': serialize(row)})
+
+
+@api.route('/<any(venues, artists, shows):name>', methods=['POST'])
+def create_resources(name):
+    # Bulk create: every row is validated first, then all of them are
+    # inserted with a single multi-row INSERT in one transaction.
+    resource = RESOURCES[name]
+    rows, response = batch()
+    if response:
+        return response
+
+    values, errors = [], {}
+    for index, row in enumerate(rows):
+        row_values, row_errors = resource.validate(row)
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            values.append(row_values)
+    if errors:
+        return error(400, 'Validation failed; nothing was created.', rows=errors)
+
+    table = resource.model.__table__
+    try:
+        ids = db.session.execute(table.insert().values(values).returning(table.c.id)).scalars().all()
+        for row, row_id in zip(values, ids):
+            row['id'] = row_id
+        if name == 'shows':
+            refresh_for_shows(values)
+        resource.refresh(values)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_conflict(e):
+            return error(409, 'A show overlaps another booking of its venue or artist; nothing was created.',
+                         detail=str(e.orig))
+        return error(409, 'Rows conflict with existing data; nothing was created.', detail=str(e.orig))
+    except OperationalError as e:
+        db.session.rollback()
+        return deadlocked(e, 'created')
+    resource.invalidate(values)
+    return jsonify(ids=ids), 201
+
+
+@api.route('/<any(venues, artists, shows):name>', methods=['PATCH'])
+def update_resources(name):
+    # Bulk update: each row carries its id and the fields to change. Rows
+    # are merged with their current values and validated as a whole (only
+    # errors on the changed fields count), then written with one executemany
+    # UPDATE per set of changed fields.
+    resource = RESOURCES[name]
+    rows, response = batch()
+    if response:
+        return response
+    try:
+        ids = [int(row['id']) for row in rows]
+    except (KeyError, TypeError, ValueError):
+        return error(400, 'Every row needs an integer id.')
+
+    model = resource.model
+    current = {
+        row.id: row._asdict() for row in
+        model.query.with_entities(*resource.columns(resource.fields)).filter(model.id.in_(ids))
+    }
+    missing = [row_id for row_id in ids if row_id not in current]
+    if missing:
+        return error(404, 'Not found.', ids=missing)
+
+    groups, errors, changed = {}, {}, []
+    for index, (row_id, row) in enumerate(zip(ids, rows)):
+        merged = dict(current[row_id])
+        merged.update({key: value for key, value in row.items() if key != 'id'})
+        merged.pop('id')
+        keys = set(row) - {'id'}
+        length = None
+        if name == 'shows' and 'start_time' in row and 'end_time' not in row:
+            # A show moved without a new end time keeps its length.
+            length = current[row_id]['end_time'] - current[row_id]['start_time']
+            merged['end_time'] = None
+            keys.add('end_time')
+        for key in ('start_time', 'end_time'):
+            if isinstance(merged.get(key), datetime.datetime):
+                merged[key] = merged[key].isoformat()
+        row_values, row_errors = resource.validate(merged, only=keys)
+        if row_errors:
+            errors[index] = row_errors
+            continue
+        if length is not None:
+            row_values['end_time'] = row_values['start_time'] + length
+        keys = tuple(sorted(keys))
+        groups.setdefault(keys, []).append(
+            dict({'_id': row_id}, **{'new_' + key: row_values[key] for key in keys})
+        )
+        changed.append(dict(current[row_id], **row_values))
+    if errors:
+        return error(400, 'Validation failed; nothing was updated.', rows=errors)
+
+    table = model.__table__
+    try:
+        if name == 'shows':
+            # One UPDATE per row: take the slot locks of all of them first, in
+            # order, as a single statement would (see booking.py).
+            lock_slots(changed)
+        for keys, params in groups.items():
+            if not keys:
+                continue
+            statement = table.update() \
+                .where(table.c.id == bindparam('_id')) \
+                .values({key: bindparam('new_' + key) for key in keys})
+            db.session.execute(statement, params)
+        if name == 'shows':
+            # Moving a show changes the counts of its old and new venue/artist.
+            refresh_for_shows(list(current.values()) + changed)
+        resource.refresh(list(current.values()) + changed)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_conflict(e):
+            return error(409, 'A show overlaps another booking of its venue or artist; nothing was updated.',
+                         detail=str(e.orig))
+        return error(409, 'Rows conflict with existing data; nothing was updated.', detail=str(e.orig))
+    except OperationalError as e:
+        db.session.rollback()
+        return deadlocked(e, 'updated')
+    # Pages of both the old and the new venue/artist of a moved show change.
+    resource.invalidate(list(current.values()) + changed)
+    return jsonify(ids=ids)
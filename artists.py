@@ -0,0 +1,184 @@
+from flask import Blueprint, render_template, request, flash, redirect, url_for
+from sqlalchemy.orm import joinedload
+from forms import ArtistForm
+from models import db, Artist, ArtistStats, Show
+from queries import find_artists, show_page
+from cache import page_cache, invalidate_artists
+from pages import render_detail, cacheable_page, page_timeout
+from documents import page_document, document_timeout, refresh_pages_for_artists
+from revisions import conditional_page, page_version, artist_revision, artists_revision
+from images import queue_images
+
+blueprint = Blueprint('artists', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Artists
+#  ----------------------------------------------------------------
+@blueprint.route('/artists')
+@conditional_page(artists_revision)
+def artists():
+  # DONE: replace with real data returned from querying the database
+  data = Artist.query.with_entities(Artist.id, Artist.name)
+
+  return render_template('pages/artists.html', artists=data)
+
+@blueprint.route('/artists/search', methods=['GET', 'POST'])
+def search_artists():
+  search_term = request.values.get('search_term', '')
+  page = request.values.get('page', 1, type=int)
+  search_result = find_artists(search_term, page)
+  # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+  # search for "band" should return "The Wild Sax Band".
+  response={
+    "count": search_result.total,
+    "data": search_result.items,
+    "pagination": search_result
+  }
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@blueprint.route('/artists/<int:artist_id>')
+@conditional_page(artist_revision)
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  # DONE: replace with real artist data from the artist table, using artist_id
+  cacheable = cacheable_page()
+  if cacheable:
+    html = page_cache.get('artist', artist_id, page_version())
+    if html is not None:
+      return html
+
+  # The default view is rendered from the artist's page document while it is
+  # fresh; paged views and artists without one query their shows.
+  if not request.args:
+    document = page_document('artist', artist_id)
+    if document is not None:
+      html = render_template('pages/show_artist.html', artist=document)
+      if cacheable:
+        page_cache.set('artist', artist_id, html, document_timeout(document), page_version())
+      return html
+
+  data = Artist.query.get_or_404(artist_id)
+  stats = ArtistStats.query.get(artist_id)
+
+  # Upcoming and past shows are paged separately, each with its own cursor.
+  artist_shows = Show.query.filter(Show.artist_id == artist_id).options(joinedload(Show.venue_shows))
+  upcoming_page = show_page(artist_shows, True, request.args.get('upcoming'))
+  past_page = show_page(artist_shows, False, request.args.get('past'))
+
+  html = render_detail('pages/show_artist.html', 'artist', data, stats, upcoming_page, past_page)
+  if cacheable:
+    page_cache.set('artist', artist_id, html, page_timeout(upcoming_page), page_version())
+  return html
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@blueprint.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@blueprint.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  form = ArtistForm()
+  if not form.validate_on_submit():
+    flash(form.errors)
+    return render_template('forms/new_artist.html', form=form)
+  try:
+    newArtist = Artist(
+      name = form.name.data, 
+      city = form.city.data, 
+      state = form.state.data,
+      phone = form.phone.data, 
+      genres = form.genres.data, 
+      facebook_link = form.facebook_link.data, 
+      image_link = form.image_link.data, 
+      website = form.website_link.data, 
+      seeking_description = form.seeking_description.data, 
+      seeking_venue = form.seeking_venue.data
+    )
+    db.session.add(newArtist)
+
+    # Using flush to preserve the Id created to be used in redirect
+    db.session.flush()
+    new_artist_id = newArtist.id
+    queue_images([form.image_link.data])
+
+    db.session.commit()
+    
+    flash('Artist ' + form.name.data + ' was successfully listed!')
+  except:
+    db.session.rollback()
+    flash('An error occurred. Artist ' + form.name.data + ' could not be listed.')
+  finally:
+    db.session.close()
+    return redirect(url_for('artists.show_artist', artist_id=new_artist_id))
+
+  # called upon submitting the new artist listing form
+  # DONE: insert form data as a new Venue record in the db, instead
+  # DONE: modify data to be the data object returned from db insertion
+
+  # on successful db insert, flash success
+  # flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  # DONE: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
+  return render_template('pages/home.html')
+
+#  Update
+#  ----------------------------------------------------------------
+@blueprint.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artist = Artist.query.get(artist_id)
+  form.name.default = artist.name
+  form.city.default = artist.city
+  form.state.default = artist.state
+  form.phone.default = artist.phone
+  form.genres.default = artist.genres
+  form.facebook_link.default = artist.facebook_link
+  form.image_link.default = artist.image_link
+  form.website_link.default = artist.website
+  form.seeking_venue.checked = artist.seeking_venue
+  form.seeking_description.default = artist.seeking_description
+  
+  form.process()
+  # DONE: populate form with fields from artist with ID <artist_id>
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@blueprint.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  artist = Artist.query.get(artist_id)
+  try:
+    form = ArtistForm()
+    artist.name = form.name.data
+    artist.city = form.city.data
+    artist.state = form.state.data
+    artist.phone = form.phone.data
+    artist.genres = form.genres.data
+    artist.facebook_link = form.facebook_link.data
+    artist.image_link = form.image_link.data
+    artist.website = form.website_link.data
+    artist.seeking_venue = form.seeking_venue.data
+    if form.seeking_venue.data:
+      artist.seeking_description = form.seeking_description.data
+    else:
+      artist.seeking_description = ''
+
+    refresh_pages_for_artists([artist_id])
+    queue_images([form.image_link.data])
+    db.session.commit()
+    invalidate_artists(artist_id)
+    flash(form.name.data + ' was successfully updated!')
+  except:
+    db.session.rollback()
+    flash('An error occurred. ' + form.name.data + ' could not be updated.')
+  finally:
+    db.session.close()
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+  # DONE: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
@@ -0,0 +1,264 @@
+import asyncio
+import contextvars
+import io
+import re
+import sys
+import time
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, render_template, request, session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import joinedload, sessionmaker
+from app import create_app
+from pages import render_detail, cacheable_page, page_timeout
+from revisions import detail_statement, detail_revision, not_modified, with_revision
+from cache import page_cache, FileBackend
+from documents import document_statement, load_page, document_timeout
+from models import Venue, Artist, Show, VenueStats, ArtistStats
+from queries import seek_shows, paged_shows
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   uvicorn asgi:application --workers 4
+#
+# Venue and artist pages are served natively on asyncio: the entity row,
+# the upcoming shows and the past shows are read concurrently, each on its
+# own asyncpg connection, so a page costs one round trip instead of three.
+# The page revision is read first, and a client holding the current version
+# gets a 304 without any further queries; the default view is then rendered
+# from the page document when there is a fresh one.
+# Every other request, and any detail page that needs the session written
+# back (pending flashes), is passed to the Flask app unchanged through
+# WsgiToAsgi, which runs it in a thread pool. Reads here always go to the
+# primary database. Requests served here are built from the ASGI scope and
+# still go through the app's before_request and after_request hooks (SQL
+# profile and Server-Timing, session cookie); errors get the app's 500 page.
+# A file-backed page cache is read and written off the event loop.
+#----------------------------------------------------------------------------#
+
+app = create_app(cli=False)
+
+DETAIL_PAGE = re.compile(r'^/(venues|artists)/(\d+)$')
+
+DETAILS = {
+    'venues': ('venue', Venue, VenueStats, Show.venue_id),
+    'artists': ('artist', Artist, ArtistStats, Show.artist_id),
+}
+
+
+def async_url(url):
+    return url.replace('postgresql://', 'postgresql+asyncpg://', 1).replace('postgres://', 'postgresql+asyncpg://', 1)
+
+
+def async_engine_options(options):
+    # The WSGI pool settings, except that asyncpg takes server settings where
+    # libpq takes an options string.
+    timeout = options['connect_args']['options'].rsplit('=', 1)[1]
+    return dict(options, connect_args={'server_settings': {'statement_timeout': timeout}})
+
+
+engine = create_async_engine(
+    app.config['ASYNC_DATABASE_URI'] or async_url(app.config['SQLALCHEMY_DATABASE_URI']),
+    **async_engine_options(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+)
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+wsgi_application = WsgiToAsgi(app)
+
+# Statements run for the page being served, for the SQL profiler. Flask's g
+# doesn't survive an await, so they are collected per task; the tasks of
+# asyncio.gather() get a copy of the context, and append to the same list.
+page_statements = contextvars.ContextVar('page_statements')
+
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('page_started', []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = (time.perf_counter() - conn.info['page_started'].pop()) * 1000
+    statements = page_statements.get(None)
+    if statements is not None:
+        statements.append((statement, elapsed))
+
+
+async def cached(method, *args):
+    # The file backend does blocking disk I/O; the in-process LRU doesn't.
+    if isinstance(page_cache.backend, FileBackend):
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+    return method(*args)
+
+
+async def fetch_revision(kind, entity_id):
+    async with Session() as session:
+        result = await session.execute(detail_statement(kind, entity_id))
+        return result.first()
+
+
+async def fetch_document(kind, entity_id):
+    async with Session() as session:
+        result = await session.execute(document_statement(kind, entity_id))
+        return result.first()
+
+
+async def fetch_entity(model, stats_model, entity_id):
+    async with Session() as session:
+        entity = await session.get(model, entity_id)
+        stats = await session.get(stats_model, entity_id) if entity is not None else None
+        return entity, stats
+
+
+async def fetch_shows(statement, upcoming, cursor):
+    statement, position, backwards = seek_shows(statement, upcoming, cursor)
+    async with Session() as session:
+        result = await session.execute(statement)
+        return paged_shows(result.scalars().unique().all(), position, backwards)
+
+
+def wsgi_environ(scope):
+    # The environ Flask would get for this request through WsgiToAsgi, so
+    # url_for(), request.host and remote_addr see the real scheme, host,
+    # mount point and client. Only GETs, without a body, are served here.
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if path.startswith(root_path):
+        path = path[len(root_path):]
+    host, port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': host,
+        'SERVER_PORT': str(port),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        key = {'content-length': 'CONTENT_LENGTH', 'content-type': 'CONTENT_TYPE'}.get(
+            name, 'HTTP_' + name.upper().replace('-', '_'))
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def request_context(environ):
+    # Flask's context locals are per thread, not per task, so a context is
+    # only ever held between two awaits, never across one.
+    return app.request_context(environ)
+
+
+def reply(response):
+    # Status, headers and body of a finished response, in the request context.
+    return response.status_code, response.get_wsgi_headers(request.environ), response.get_data()
+
+
+def finish(revision, html=None):
+    # A tagged response, after the app's after_request hooks, as Flask would
+    # send it.
+    if html is None:
+        response = with_revision(app.response_class(status=304), revision)
+    else:
+        response = with_revision(app.response_class(html), revision)
+    g.sql_profile = page_statements.get()
+    return reply(app.process_response(response))
+
+
+async def detail_page(environ, name, entity_id):
+    # Returns (status, headers, body), or None to let the Flask app handle the
+    # request.
+    kind, model, stats_model, show_key = DETAILS[name]
+    with request_context(environ):
+        if session.get('_flashes'):
+            return None
+    page_statements.set([])
+
+    row = await fetch_revision(kind, entity_id)
+    if row is None:
+        return None
+
+    with request_context(environ):
+        # The app's before_request hooks run once, here, now that the page is
+        # served natively; one that answers ends the request. What they put
+        # on g doesn't outlive this block.
+        response = app.preprocess_request()
+        if response is not None:
+            return reply(app.finalize_request(response))
+        revision = detail_revision(row)
+        if not_modified(revision):
+            return finish(revision)
+        cacheable = cacheable_page()
+        upcoming_cursor, past_cursor = request.args.get('upcoming'), request.args.get('past')
+        default_view = not request.args
+
+    if cacheable:
+        html = await cached(page_cache.get, kind, entity_id, revision.etag)
+        if html is not None:
+            with request_context(environ):
+                return finish(revision, html)
+
+    if default_view:
+        document = load_page(await fetch_document(kind, entity_id))
+        if document is not None:
+            with request_context(environ):
+                html = render_template('pages/show_%s.html' % kind, **{kind: document})
+                page = finish(revision, html)
+            if cacheable:
+                await cached(page_cache.set, kind, entity_id, html, document_timeout(document), revision.etag)
+            return page
+
+    # Both sides of each show are loaded: the page's own venue or artist is
+    # read on another session, so it can't be lazy-loaded from the identity
+    # map as in the Flask view.
+    shows = select(Show).where(show_key == entity_id) \
+        .options(joinedload(Show.venue_shows), joinedload(Show.artist_shows))
+    (entity, stats), upcoming_page, past_page = await asyncio.gather(
+        fetch_entity(model, stats_model, entity_id),
+        fetch_shows(shows, True, upcoming_cursor),
+        fetch_shows(shows, False, past_cursor),
+    )
+    if entity is None:
+        return None
+
+    with request_context(environ):
+        html = render_detail('pages/show_%s.html' % kind, kind, entity, stats, upcoming_page, past_page)
+        page = finish(revision, html)
+    if cacheable:
+        await cached(page_cache.set, kind, entity_id, html, page_timeout(upcoming_page), revision.etag)
+    return page
+
+
+async def application(scope, receive, send):
+    page = None
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        environ = wsgi_environ(scope)
+        match = DETAIL_PAGE.match(environ['PATH_INFO'])
+        if match:
+            try:
+                page = await detail_page(environ, match.group(1), int(match.group(2)))
+            except Exception as e:
+                # As for an error in a Flask view: logged to error.log and
+                # answered with the app's 500 page (re-raised in debug and
+                # testing, where exceptions propagate).
+                with request_context(environ):
+                    page = reply(app.handle_exception(e))
+    if page is None:
+        await wsgi_application(scope, receive, send)
+        return
+    status, headers, body = page
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
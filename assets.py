@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+from stat import S_ISREG
+from flask import current_app
+from werkzeug.security import safe_join
+
+#----------------------------------------------------------------------------#
+# Fingerprinted static files.
+#
+# url_for('static', filename='css/main.css') returns
+# /static/css/main.<digest>.css, where the digest is taken from the file's
+# contents. Fingerprinted URLs are served with a one year immutable
+# Cache-Control: a changed file gets a new URL instead of a stale copy.
+# Plain /static/... URLs keep working with the default max age.
+#----------------------------------------------------------------------------#
+
+FINGERPRINT = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)?$')
+ONE_YEAR = 365 * 24 * 3600
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+class Assets:
+
+    def __init__(self):
+        self.release = None
+        self._digests = {}
+        self._release = None
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        app.url_defaults(self.fingerprint_url)
+        app.view_functions['static'] = self.send_static
+        self.release = app.config.get('RELEASE')
+
+    def digest(self, filename):
+        # Keyed by mtime and size as well, so a file edited in development
+        # gets a new digest without a restart.
+        path = safe_join(current_app.static_folder, filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = _file_digest(path)[:12]
+        return digest
+
+    def fingerprint_url(self, endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        digest = self.digest(values['filename'])
+        if digest:
+            stem, ext = os.path.splitext(values['filename'])
+            values['filename'] = '%s.%s%s' % (stem, digest, ext)
+
+    def send_static(self, filename):
+        match = FINGERPRINT.match(filename)
+        if match:
+            original = match.group('stem') + (match.group('ext') or '')
+            digest = self.digest(original)
+            if digest is not None:
+                response = current_app.send_static_file(original)
+                # A URL from before a deploy still gets the current file, but
+                # only the matching digest may be cached for good.
+                if digest == match.group('digest'):
+                    response.cache_control.public = True
+                    response.cache_control.max_age = ONE_YEAR
+                    response.cache_control.immutable = True
+                return response
+        return current_app.send_static_file(filename)
+
+    def version(self):
+        # Identifies the deployed templates and static files, so page ETags
+        # change with a release. RELEASE (e.g. the git sha) can be set in the
+        # config; otherwise it is hashed from the files once per process, and
+        # on every call in debug mode.
+        if self.release:
+            return self.release
+        if self._release is None or current_app.debug:
+            digest = hashlib.sha1()
+            for folder in (os.path.join(current_app.root_path, current_app.template_folder), current_app.static_folder):
+                for root, dirs, files in os.walk(folder):
+                    dirs.sort()
+                    for name in sorted(files):
+                        path = os.path.join(root, name)
+                        digest.update(os.path.relpath(path, folder).encode())
+                        digest.update(_file_digest(path).encode())
+            self._release = digest.hexdigest()[:12]
+        return self._release
+
+
+assets = Assets()
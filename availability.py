@@ -0,0 +1,92 @@
+import datetime
+from itertools import groupby
+from sqlalchemy import and_, func, or_
+from models import db, Venue, Artist, Show, SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Availability.
+#
+# "Which venues in city X are free between Y and Z for artist W?" is
+# answered with one statement: the candidate venues (city/state equality and
+# a genres && overlap on the GIN index) LEFT JOINed to the shows whose slot
+# overlaps the window, each join a probe of the (venue_id, slot) GiST index.
+# The gaps between bookings are then computed in Python, one pass per venue.
+#----------------------------------------------------------------------------#
+
+DEFAULT_WINDOW = datetime.timedelta(days=7)
+MAX_WINDOW = datetime.timedelta(days=31)
+
+
+def window(start_date, end_date=None):
+    # Whole days, end date included, capped at MAX_WINDOW.
+    start = datetime.datetime.combine(start_date, datetime.time())
+    end = datetime.datetime.combine(end_date, datetime.time()) + datetime.timedelta(days=1) \
+        if end_date else start + DEFAULT_WINDOW
+    return start, min(end, start + MAX_WINDOW)
+
+
+def free_slots(bookings, start, end, min_length=SHOW_DURATION):
+    # bookings are (start_time, end_time) pairs ordered by start_time; they
+    # may overlap each other and stick out of the window.
+    slots, cursor = [], start
+    for booked_from, booked_until in bookings:
+        if booked_from - cursor >= min_length:
+            slots.append((cursor, booked_from))
+        cursor = max(cursor, booked_until)
+    if end - cursor >= min_length:
+        slots.append((cursor, end))
+    return slots
+
+
+def availability(start, end, city=None, state=None, genres=None, artist_id=None,
+                 venue_id=None, min_length=SHOW_DURATION):
+    # Venues with at least one free slot of min_length in [start, end). With
+    # an artist, the artist's own bookings count as busy too, and the venue
+    # genres must overlap the artist's unless genres are given.
+    busy = [Show.venue_id == Venue.id]
+    if artist_id is not None:
+        busy.append(Show.artist_id == artist_id)
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.genres,
+        Show.start_time, Show.end_time
+    ).outerjoin(Show, and_(or_(*busy), Show.start_time < end,
+                           Show.slot.overlaps(func.tsrange(start, end, '[)'))))
+
+    if venue_id is not None:
+        query = query.filter(Venue.id == venue_id)
+    if city:
+        query = query.filter(Venue.city == city)
+    if state:
+        query = query.filter(Venue.state == state)
+    if genres:
+        query = query.filter(Venue.genres.op('&&')(genres))
+    elif artist_id is not None:
+        artist_genres = db.session.query(Artist.genres).filter(Artist.id == artist_id).scalar_subquery()
+        query = query.filter(Venue.genres.op('&&')(artist_genres))
+
+    venues = []
+    rows = query.order_by(Venue.name, Venue.id, Show.start_time)
+    for venue, bookings in groupby(rows, key=lambda row: (row.id, row.name, row.city, row.state, row.genres)):
+        bookings = [(row.start_time, row.end_time) for row in bookings if row.start_time is not None]
+        slots = free_slots(bookings, start, end, min_length)
+        if slots:
+            venues.append(dict(
+                zip(('id', 'name', 'city', 'state', 'genres'), venue),
+                free_slots=[{'start': slot_start, 'end': slot_end} for slot_start, slot_end in slots]
+            ))
+    return venues
+
+
+def search(form):
+    # Runs a validated AvailabilityForm; shared by the page and the API.
+    start, end = window(form.start.data, form.end.data)
+    venues = availability(
+        start, end,
+        city=form.city.data or None,
+        state=form.state.data or None,
+        genres=form.genres.data or None,
+        artist_id=int(form.artist_id.data) if form.artist_id.data else None,
+        venue_id=int(form.venue_id.data) if form.venue_id.data else None,
+        min_length=datetime.timedelta(hours=form.min_hours.data) if form.min_hours.data else SHOW_DURATION,
+    )
+    return start, end, venues
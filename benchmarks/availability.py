@@ -0,0 +1,78 @@
+import argparse
+import datetime
+import random
+import time
+from sqlalchemy import text
+from forms import genres_choices
+from app import create_app
+from models import db, Artist
+from benchmarks.seed import seed, CITIES
+from availability import availability, window
+
+#----------------------------------------------------------------------------#
+# Availability benchmark.
+#
+#   python -m benchmarks.availability --venues 20000 --shows 1000000
+#
+# Seeds a large calendar and times availability searches (a city, a city and
+# genres, a city for a given artist) over one and four week windows. Prints
+# the plan of the largest search, which should probe ix_venues_genres and the
+# shows slot indexes rather than scan shows.
+#----------------------------------------------------------------------------#
+
+def searches(rng, artists):
+    genres = [genre for genre, _ in genres_choices]
+    today = datetime.date.today()
+    for days in (7, 28):
+        start, end = window(today + datetime.timedelta(days=rng.randint(0, 150)))
+        end = start + datetime.timedelta(days=days)
+        city = rng.choice(CITIES)
+        yield 'city, %d days' % days, dict(start=start, end=end, city=city)
+        yield 'city + genres, %d days' % days, dict(start=start, end=end, city=city,
+                                                    genres=rng.sample(genres, 2))
+        yield 'city + artist, %d days' % days, dict(start=start, end=end, city=city,
+                                                    artist_id=rng.randint(1, artists))
+
+
+def run(repeat, artists):
+    rng = random.Random(0)
+    for name, filters in searches(rng, artists):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            venues = availability(**filters)
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print('%s: %.3f ms, %d venues' % (name, elapsed, len(venues)))
+        db.session.commit()
+
+    plan = db.session.execute(text(
+        "EXPLAIN ANALYZE SELECT v.id, s.start_time FROM venues v "
+        "LEFT JOIN shows s ON (s.venue_id = v.id OR s.artist_id = :artist) "
+        "AND s.slot && tsrange(:start, :end, '[)') "
+        "WHERE v.city = :city AND v.genres && (SELECT genres FROM artists WHERE id = :artist)"
+    ), {
+        'artist': 1, 'city': CITIES[0],
+        'start': datetime.datetime.now(), 'end': datetime.datetime.now() + datetime.timedelta(days=28),
+    }).scalars().all()
+    for line in plan:
+        print('    ' + line)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+
+    with create_app(args.profile, cli=False).app_context():
+        if not args.no_seed:
+            seed(venues=args.venues, artists=args.artists, shows=args.shows, days=180)
+        run(args.repeat, db.session.query(Artist).count())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import datetime
+import random
+import timeit
+import babel.dates
+import dateutil.parser
+from filters import format_datetime
+
+#----------------------------------------------------------------------------#
+# Datetime formatting throughput.
+#
+#   python -m benchmarks.datetime_format --shows 10000
+#
+# Compares the old show listing path (str() -> dateutil parse -> babel, then
+# the same again in the template filter) with filters.format_datetime on
+# native datetimes.
+#----------------------------------------------------------------------------#
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def legacy(start_times):
+    for start_time in start_times:
+        # shows() formatted into the model, then shows.html re-parsed it.
+        legacy_format_datetime(legacy_format_datetime(str(start_time)), 'full')
+
+
+def cached(start_times):
+    for start_time in start_times:
+        format_datetime(start_time, 'full')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    start_times = [
+        now + datetime.timedelta(hours=rng.randint(-args.days * 24, args.days * 24))
+        for _ in range(args.shows)
+    ]
+
+    for name, func in (('legacy', legacy), ('cached', cached)):
+        best = min(timeit.repeat(lambda: func(start_times), number=1, repeat=args.repeat))
+        print('%-7s %8.1f ms  %10.0f shows/s' % (name, best * 1000, args.shows / best))
+
+
+if __name__ == '__main__':
+    main()
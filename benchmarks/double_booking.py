@@ -0,0 +1,78 @@
+import argparse
+import datetime
+import time
+from sqlalchemy import text
+from app import create_app
+from models import db, Show, SHOW_DURATION
+from benchmarks.seed import seed
+from booking import conflicts
+
+#----------------------------------------------------------------------------#
+# Double-booking check.
+#
+#   python -m benchmarks.double_booking --shows-per-venue 50000
+#
+# Books tens of thousands of back-to-back shows at one venue, then times
+# single inserts and conflict lookups against that venue and prints the
+# lookup's plan (a GiST index probe, not a scan). That concurrent bookings
+# of one slot can't both succeed is checked by tests/test_double_booking.py.
+#----------------------------------------------------------------------------#
+
+def book_back_to_back(venue_id, count, start):
+    # One show per slot, each with its own artist so only the venue side fills up.
+    rows = [{
+        'venue_id': venue_id,
+        'artist_id': 1 + i % 1000,
+        'start_time': start + i * SHOW_DURATION,
+        'end_time': start + (i + 1) * SHOW_DURATION,
+    } for i in range(count)]
+    for offset in range(0, count, 5000):
+        db.session.execute(Show.__table__.insert(), rows[offset:offset + 5000])
+    db.session.commit()
+    db.session.execute(text('ANALYZE shows'))
+    db.session.commit()
+    return start + count * SHOW_DURATION
+
+
+def time_inserts(venue_id, start, repeat):
+    # Alternates a clashing lookup and a free insert at the end of the calendar.
+    lookups = inserts = 0.0
+    for i in range(repeat):
+        slot = start + i * SHOW_DURATION
+        started = time.perf_counter()
+        conflicts(venue_id, 1, slot - SHOW_DURATION / 2)
+        lookups += time.perf_counter() - started
+        started = time.perf_counter()
+        db.session.execute(Show.__table__.insert(), [{
+            'venue_id': venue_id, 'artist_id': 1, 'start_time': slot, 'end_time': slot + SHOW_DURATION,
+        }])
+        db.session.commit()
+        inserts += time.perf_counter() - started
+    print('conflict lookup: %.3f ms, insert: %.3f ms' % (lookups / repeat * 1000, inserts / repeat * 1000))
+
+    plan = db.session.execute(text(
+        "EXPLAIN SELECT * FROM shows WHERE (venue_id = :venue OR artist_id = 1) "
+        "AND slot && tsrange(:start, :end, '[)')"
+    ), {'venue': venue_id, 'start': start, 'end': start + SHOW_DURATION}).scalars().all()
+    for line in plan:
+        print('    ' + line)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--shows-per-venue', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app(args.profile, cli=False)
+    with app.app_context():
+        seed(venues=10, artists=1000, shows=0)
+        start = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+        end = book_back_to_back(1, args.shows_per_venue, start)
+        time_inserts(1, end, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import tempfile
+from app import create_app
+from benchmarks.seed import seed, show_rows
+from importer import run_import
+
+#----------------------------------------------------------------------------#
+# Import throughput.
+#
+#   python -m benchmarks.import_throughput --shows 200000 --batch-size 5000
+#
+# Seeds venues and artists, writes a synthetic shows file and loads it with
+# the same pipeline as `flask import`, reporting rows per second.
+#----------------------------------------------------------------------------#
+
+def write_shows(path, format, count, venues, artists):
+    rng = random.Random(0)
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f) if format == 'csv' else None
+        if writer:
+            writer.writerow(['venue_id', 'artist_id', 'start_time'])
+        for show in show_rows(rng, now, venues, artists, count, 365):
+            row = [show['venue_id'], show['artist_id'], show['start_time'].isoformat()]
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(['venue_id', 'artist_id', 'start_time'], row))) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'shows.' + args.format)
+    write_shows(path, args.format, args.shows, args.venues, args.artists)
+
+    with create_app(args.profile, cli=False).app_context():
+        seed(venues=args.venues, artists=args.artists, shows=0)
+        result = run_import('shows', path, args.format, args.batch_size)
+    print('%d rows in %.2fs: %.0f rows/s (%d rejected, batch size %d)' % (
+        result['inserted'], result['seconds'], result['rows_per_second'],
+        result['rejected'], args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
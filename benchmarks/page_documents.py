@@ -0,0 +1,107 @@
+import argparse
+import datetime
+import statistics
+import time
+from sqlalchemy import func, select
+from app import create_app
+from models import db, Show, VenuePage, SHOW_DURATION
+from benchmarks.seed import seed
+from profiling import StatementCounter
+from documents import build_pages
+from stats import refresh_stats
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Detail pages: querying shows vs reading the page document.
+#
+#   python -m benchmarks.page_documents --shows 5000
+#
+# Seeds the test database (TEST_DATABASE_URL; the catalog is wiped) with one
+# venue holding --shows shows, half of them upcoming, each with a different
+# artist, and requests /venues/1 through the test client:
+#
+#   * query:     without a page document, as paged views are served,
+#   * document:  from the venue's page document,
+#
+# reporting latency and SQL statements per request, then how long rebuilding
+# that venue's document takes, as every write touching it does.
+#----------------------------------------------------------------------------#
+
+VENUE_ID = 1
+
+
+def seed_venue(shows):
+    seed(venues=1, artists=shows, shows=0)
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    first = now - datetime.timedelta(hours=3 * (shows // 2))
+    db.session.execute(Show.__table__.insert(), [{
+        'venue_id': VENUE_ID,
+        'artist_id': i,
+        'start_time': first + datetime.timedelta(hours=3 * i),
+        'end_time': first + datetime.timedelta(hours=3 * i) + SHOW_DURATION,
+    } for i in range(1, shows + 1)])
+    refresh_stats(full=True)
+    db.session.commit()
+
+
+def measure(client, repeat, warmup):
+    for _ in range(warmup):
+        client.get('/venues/%d' % VENUE_ID)
+    timings, statements = [], []
+    for _ in range(repeat):
+        with StatementCounter(db.engine) as counter:
+            started = time.perf_counter()
+            response = client.get('/venues/%d' % VENUE_ID)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError('/venues/%d failed with %d' % (VENUE_ID, response.status_code))
+        statements.append(counter.count)
+    return statistics.median(timings), max(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(args.profile, cli=False)
+    page_cache.timeout = 0
+    client = app.test_client(use_cookies=False)
+
+    with app.app_context():
+        seed_venue(args.shows)
+
+        db.session.execute(VenuePage.__table__.delete())
+        db.session.commit()
+        db.session.remove()
+        query = measure(client, args.repeat, args.warmup)
+
+        # Built here: refresh_pages() only queues the rebuild as a job.
+        build_pages('venue', [VENUE_ID])
+        db.session.commit()
+        if db.session.get(VenuePage, VENUE_ID) is None:
+            raise RuntimeError('venue %d has no page document' % VENUE_ID)
+        db.session.remove()
+        document = measure(client, args.repeat, args.warmup)
+
+        print('%-10s %9s %6s' % ('path', 'p50 ms', 'sql'))
+        for name, (p50, statements) in (('query', query), ('document', document)):
+            print('%-10s %9.2f %6d' % (name, p50, statements))
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            build_pages('venue', [VENUE_ID])
+            db.session.commit()
+            timings.append((time.perf_counter() - started) * 1000)
+        size = db.session.execute(select(func.pg_column_size(VenuePage.document))
+                                  .where(VenuePage.venue_id == VENUE_ID)).scalar()
+        print('rebuild venue %d (%d shows): %.2f ms, document %d bytes'
+              % (VENUE_ID, args.shows, statistics.median(timings), size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from flask import current_app
+from app import create_app
+from models import db, Venue, Artist, Show
+from benchmarks.seed import seed
+from profiling import StatementCounter
+from stats import refresh_stats
+from cache import page_cache
+
+#----------------------------------------------------------------------------#
+# Route benchmark suite.
+#
+#   python -m benchmarks.routes --shows 50000 --compare benchmarks/results/latest.json
+#
+# Seeds the test database (TEST_DATABASE_URL; the catalog is wiped) with a
+# reproducible dataset, then requests every page through the test client
+# and records, per route, the latency (p50/p95/mean), the number of SQL
+# statements and the peak Python memory allocated by one request. Results
+# are written to benchmarks/results/<commit>.json, and to latest.json when
+# there is no regression: with --compare, routes that got slower than
+# --tolerance or issue more statements than the given run are reported and
+# the exit status is 1.
+#----------------------------------------------------------------------------#
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Far from the seeded calendar, so created shows never clash with it.
+CREATED_SHOWS_FROM = datetime.datetime(2100, 1, 1)
+
+
+def venue_form(name):
+    return {
+        'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+        'phone': '555-555-0000', 'genres': ['Jazz', 'Folk'],
+        'facebook_link': 'https://www.facebook.com/benchmark', 'image_link': '', 'website_link': '',
+        'seeking_description': '',
+    }
+
+
+def artist_form(name):
+    return {
+        'name': name, 'city': 'San Francisco', 'state': 'CA', 'phone': '555-666-0000',
+        'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/benchmark', 'image_link': '',
+        'website_link': '', 'seeking_description': '',
+    }
+
+
+def ok(response):
+    return response.status_code == 200
+
+
+def flashed(response):
+    # Messages flashed by the request, read back from the session cookie it
+    # sets (the client keeps no cookies).
+    name = current_app.session_cookie_name + '='
+    for cookie in response.headers.getlist('Set-Cookie'):
+        if cookie.startswith(name):
+            session = current_app.session_interface.get_signing_serializer(current_app) \
+                .loads(cookie.split(';')[0][len(name):])
+            return [message for _, message in session.get('_flashes', [])]
+    return []
+
+
+def flashed_success(message):
+    # Create and edit views redirect whether or not the commit went through
+    # (the redirect is returned from a finally block); only the flashed
+    # message tells a save from a rollback. A form that fails validation is
+    # re-rendered with a 200.
+    def succeeded(response):
+        return response.status_code == 302 and any(message in text for text in flashed(response))
+    return succeeded
+
+
+saved = flashed_success(' was successfully listed!')
+updated = flashed_success(' was successfully updated!')
+
+
+def show_listed(response):
+    return b'Show was successfully listed!' in response.data
+
+
+def routes(venue_id, artist_id):
+    # name -> (method, path, form data for the i-th request, success check).
+    # POSTs change the data on every request, so edits always issue an UPDATE
+    # and new shows never overlap.
+    def show(i):
+        start = CREATED_SHOWS_FROM + datetime.timedelta(hours=3 * i)
+        return {'venue_id': str(venue_id), 'artist_id': str(artist_id),
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S'), 'end_time': ''}
+
+    return {
+        'venues': ('GET', '/venues', None, ok),
+        'search_venues': ('POST', '/venues/search', lambda i: {'search_term': 'venue 1'}, ok),
+        'show_venue': ('GET', '/venues/%d' % venue_id, None, ok),
+        'artists': ('GET', '/artists', None, ok),
+        'search_artists': ('POST', '/artists/search', lambda i: {'search_term': 'artist 1'}, ok),
+        'show_artist': ('GET', '/artists/%d' % artist_id, None, ok),
+        'shows': ('GET', '/shows', None, ok),
+        'create_venue': ('POST', '/venues/create', lambda i: venue_form('Benchmark venue %d' % i), saved),
+        'edit_venue': ('POST', '/venues/%d/edit' % venue_id, lambda i: venue_form('Edited venue %d' % i), updated),
+        'create_artist': ('POST', '/artists/create', lambda i: artist_form('Benchmark artist %d' % i), saved),
+        'edit_artist': ('POST', '/artists/%d/edit' % artist_id, lambda i: artist_form('Edited artist %d' % i), updated),
+        'create_show': ('POST', '/shows/create', show, show_listed),
+    }
+
+
+def measure(client, method, path, data, succeeded, repeat, warmup):
+    requests = iter(range(warmup + repeat + 1))
+
+    def request():
+        i = next(requests)
+        response = client.open(path, method=method, data=data(i) if data else None)
+        if not succeeded(response):
+            raise RuntimeError('%s %s failed with %d' % (method, path, response.status_code))
+
+    for _ in range(warmup):
+        request()
+
+    timings, statements = [], []
+    for _ in range(repeat):
+        with StatementCounter(db.engine) as counter:
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+        statements.append(counter.count)
+
+    # tracemalloc slows everything down, so memory gets a request of its own.
+    tracemalloc.start()
+    request()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'mean_ms': statistics.mean(timings),
+        'statements': max(statements),
+        'peak_kib': peak / 1024,
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline, tolerance):
+    # Latency has to be worse by more than the tolerance to count; statement
+    # counts are deterministic, so any increase does.
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            regressions.append('%s: p50 %.1f ms -> %.1f ms' % (name, previous['p50_ms'], current['p50_ms']))
+        if current['statements'] > previous['statements']:
+            regressions.append('%s: %d -> %d statements' % (name, previous['statements'], current['statements']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', nargs='*', help='route names to run')
+    parser.add_argument('--output', help='defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', help='results file of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    app = create_app(args.profile, cli=False)
+    # Every request renders: no page cache, and no cookies, so flashes left
+    # by the POSTs never reach the next request.
+    page_cache.timeout = 0
+    client = app.test_client(use_cookies=False)
+
+    with app.app_context():
+        if not args.no_seed:
+            seed(venues=args.venues, artists=args.artists, shows=args.shows)
+            refresh_stats(full=True)
+            db.session.commit()
+        venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+        artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+        # Shows created by an earlier --no-seed run would clash with this one's.
+        db.session.execute(Show.__table__.delete().where(Show.start_time >= CREATED_SHOWS_FROM))
+        refresh_stats(venue_ids=[venue_id], artist_ids=[artist_id])
+        db.session.commit()
+        dataset = {
+            'venues': Venue.query.count(),
+            'artists': Artist.query.count(),
+            'shows': db.session.execute(db.text('SELECT count(*) FROM shows')).scalar(),
+        }
+        db.session.remove()
+
+        results = {
+            'commit': commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'dataset': dataset,
+            'repeat': args.repeat,
+            'routes': {},
+        }
+        print('%-15s %9s %9s %9s %6s %10s' % ('route', 'p50 ms', 'p95 ms', 'mean ms', 'sql', 'peak KiB'))
+        for name, (method, path, data, succeeded) in routes(venue_id, artist_id).items():
+            if args.only and name not in args.only:
+                continue
+            result = results['routes'][name] = measure(client, method, path, data, succeeded,
+                                                       args.repeat, args.warmup)
+            print('%-15s %9.2f %9.2f %9.2f %6d %10.0f' % (
+                name, result['p50_ms'], result['p95_ms'], result['mean_ms'], result['statements'], result['peak_kib']))
+
+    regressions = []
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        print('\nCompared with %s (%s): %s' % (args.compare, baseline.get('commit'),
+                                            'no regressions' if not regressions else ''))
+        for regression in regressions:
+            print('  ' + regression)
+
+    # latest.json only moves on when nothing regressed, so a slow run can't
+    # become the baseline by being run twice.
+    os.makedirs(RESULTS, exist_ok=True)
+    paths = [args.output or os.path.join(RESULTS, '%s.json' % results['commit'])]
+    if not regressions:
+        paths.append(os.path.join(RESULTS, 'latest.json'))
+    for path in paths:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import datetime
+import random
+from sqlalchemy import text
+from forms import state_choices, genres_choices
+from models import db, Venue, Artist, Show, SHOW_DURATION
+from booking import lock_slots
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+CITIES = ['San Francisco', 'New York', 'Austin', 'Seattle', 'Chicago', 'Denver', 'Nashville', 'Portland']
+BATCH_SIZE = 5000
+
+
+def _genres(rng):
+    return rng.sample([genre for genre, _ in genres_choices], rng.randint(1, 3))
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def show_rows(rng, now, venues, artists, shows, days):
+    # Two hour shows on the hour, never double-booking a venue or an artist
+    # (the slot check on shows would reject the batch).
+    booked = set()
+    hours = SHOW_DURATION // datetime.timedelta(hours=1)
+    i = 0
+    while i < shows:
+        venue_id, artist_id = rng.randint(1, venues), rng.randint(1, artists)
+        hour = rng.randint(-days * 24, days * 24)
+        slots = [(kind, entity_id, hour + offset)
+                 for kind, entity_id in (('venue', venue_id), ('artist', artist_id))
+                 for offset in range(hours)]
+        if booked.intersection(slots):
+            continue
+        booked.update(slots)
+        i += 1
+        start_time = now + datetime.timedelta(hours=hour)
+        yield {
+            'id': i,
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'end_time': start_time + SHOW_DURATION,
+        }
+
+
+def seed(venues=1000, artists=1000, shows=100000, days=365, seed=0):
+    # Wipes the catalog and inserts a reproducible synthetic dataset. Shows
+    # are spread evenly around today so half of them are upcoming.
+    rng = random.Random(seed)
+    states = [state for state, _ in state_choices]
+
+    db.session.execute(Show.__table__.delete())
+    db.session.execute(Venue.__table__.delete())
+    db.session.execute(Artist.__table__.delete())
+
+    _insert(Venue.__table__, [{
+        'id': i,
+        'name': 'Venue %d' % i,
+        'city': rng.choice(CITIES),
+        'state': rng.choice(states),
+        'address': '%d Main St' % i,
+        'phone': '555-555-%04d' % (i % 10000),
+        'genres': _genres(rng),
+        'image_link': 'https://example.com/venues/%d.jpg' % i,
+        'seeking_talent': rng.random() < 0.5,
+    } for i in range(1, venues + 1)])
+
+    _insert(Artist.__table__, [{
+        'id': i,
+        'name': 'Artist %d' % i,
+        'city': rng.choice(CITIES),
+        'state': rng.choice(states),
+        'phone': '555-666-%04d' % (i % 10000),
+        'genres': _genres(rng),
+        'image_link': 'https://example.com/artists/%d.jpg' % i,
+        'seeking_venue': rng.random() < 0.5,
+    } for i in range(1, artists + 1)])
+
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    rows = list(show_rows(rng, now, venues, artists, shows, days))
+    # Several INSERTs in one transaction: lock every venue and artist first,
+    # in order, like the API and the importer (see booking.py).
+    lock_slots(rows)
+    _insert(Show.__table__, rows)
+
+    for table in ('venues', 'artists', 'shows'):
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('%s', 'id'), (SELECT max(id) FROM %s))" % (table, table)
+        ))
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
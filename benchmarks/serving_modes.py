@@ -0,0 +1,129 @@
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from app import create_app
+from models import db
+from benchmarks.seed import seed
+from stats import refresh_stats
+
+#----------------------------------------------------------------------------#
+# WSGI vs ASGI load test.
+#
+#   python -m benchmarks.serving_modes --concurrency 64 --duration 20
+#
+# Starts the app under uvicorn twice, once through the WSGI interface (the
+# Flask app as-is, one thread per request) and once through asgi.py, and
+# drives each with the same mix of venue and artist page requests over
+# keep-alive connections. Prints requests per second and p50/p99 latency.
+#----------------------------------------------------------------------------#
+
+MODES = {
+    'wsgi': ['wsgi:application', '--interface', 'wsgi'],
+    'asgi': ['asgi:application'],
+}
+
+
+def start_server(mode, port, workers, database_url):
+    command = [sys.executable, '-m', 'uvicorn'] + MODES[mode] + [
+        '--port', str(port), '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+    ]
+    # Production settings, on the database that was seeded.
+    server = subprocess.Popen(command, env=dict(os.environ, FYYUR_ENV='production', DATABASE_URL=database_url))
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('%s server did not start' % mode)
+
+
+def load(port, paths, concurrency, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        mine, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', rng.choice(paths))
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port)
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), sum(errors)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing', help='profile whose database is seeded and served')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    app = create_app(args.profile, cli=False)
+    if not args.no_seed:
+        with app.app_context():
+            seed(venues=args.venues, artists=args.artists, shows=args.shows)
+            refresh_stats(full=True)
+            db.session.commit()
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+
+    # The empty cursor keeps requests out of the page cache, so every one of
+    # them reaches the database.
+    paths = ['/venues/%d?upcoming=' % i for i in range(1, args.venues + 1)] + \
+            ['/artists/%d?upcoming=' % i for i in range(1, args.artists + 1)]
+
+    print('%-6s %10s %10s %10s %8s' % ('mode', 'req/s', 'p50 ms', 'p99 ms', 'errors'))
+    for mode in MODES:
+        server = start_server(mode, args.port, args.workers, database_url)
+        try:
+            load(args.port, paths, args.concurrency, 2)
+            latencies, errors = load(args.port, paths, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print('%-6s %10.0f %10.1f %10.1f %8d' % (
+            mode, len(latencies) / args.duration,
+            percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, errors))
+
+
+if __name__ == '__main__':
+    main()
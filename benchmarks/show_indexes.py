@@ -0,0 +1,78 @@
+import argparse
+import datetime
+import time
+from sqlalchemy import text
+from app import create_app
+from models import db, Show
+from benchmarks.seed import seed
+
+#----------------------------------------------------------------------------#
+# Show index benchmark.
+#
+#   python -m benchmarks.show_indexes --shows 1000000
+#
+# Runs the show lookups used by the venue/artist pages without and with the
+# (venue_id, start_time) / (artist_id, start_time) indexes and prints the
+# EXPLAIN plan and average latency of each.
+#----------------------------------------------------------------------------#
+
+BENCHMARKED = ('ix_shows_venue_id_start_time', 'ix_shows_artist_id_start_time')
+
+QUERIES = {
+    'upcoming count by venue':
+        'SELECT count(*) FROM shows WHERE venue_id = :id AND start_time > :now',
+    'upcoming shows by venue':
+        'SELECT * FROM shows WHERE venue_id = :id AND start_time > :now ORDER BY start_time',
+    'past shows by artist':
+        'SELECT * FROM shows WHERE artist_id = :id AND start_time <= :now ORDER BY start_time DESC',
+}
+
+
+def run(repeat):
+    params = {'id': 1, 'now': datetime.datetime.now()}
+    for name, sql in QUERIES.items():
+        plan = db.session.execute(text('EXPLAIN ANALYZE ' + sql), params).scalars().all()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.session.execute(text(sql), params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print('%s: %.3f ms' % (name, elapsed))
+        for line in plan:
+            print('    ' + line)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', default='testing')
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+
+    with create_app(args.profile, cli=False).app_context():
+        if not args.no_seed:
+            seed(venues=args.venues, artists=args.artists, shows=args.shows)
+        # Only the two indexes the migration added; the seek and slot indexes
+        # stay, and the pair is put back even if a run fails.
+        indexes = [index for index in Show.__table__.indexes if index.name in BENCHMARKED]
+
+        for index in indexes:
+            index.drop(db.engine, checkfirst=True)
+        try:
+            db.session.execute(text('ANALYZE shows'))
+            print('== before migration ==')
+            run(args.repeat)
+        finally:
+            db.session.rollback()
+            for index in indexes:
+                index.create(db.engine, checkfirst=True)
+        db.session.execute(text('ANALYZE shows'))
+        print('== after migration ==')
+        run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+#----------------------------------------------------------------------------#
+# Startup time.
+#
+#   python -m benchmarks.startup --workers 4
+#
+# Measures how long a fresh interpreter takes to import the WSGI entry point,
+# and how long gunicorn takes from launch to its first response, with and
+# without preload_app.
+#----------------------------------------------------------------------------#
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module, repeat):
+    # Wall time of `python -c "import <module>"`, so interpreter start is
+    # included the same way a worker pays for it.
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import ' + module], cwd=ROOT, check=True,
+                       env=dict(os.environ, FYYUR_ENV='production'))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def boot_time(workers, preload, port):
+    # From launch until a worker has served the home page (no database needed).
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD='1' if preload else '0',
+               BIND='127.0.0.1:%d' % port, GUNICORN_ACCESS_LOG='/dev/null')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application'],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                urllib.request.urlopen('http://127.0.0.1:%d/' % port, timeout=5).read()
+                return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError('gunicorn did not start')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    print('import wsgi: %.0f ms (median of %d)' % (import_time('wsgi', args.repeat) * 1000, args.repeat))
+    for preload in (False, True):
+        print('gunicorn preload=%s, %d workers: first response after %.0f ms' % (
+            preload, args.workers, boot_time(args.workers, preload, args.port) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import datetime
+import shutil
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+from flask import render_template
+from app import create_app
+from config import TestingConfig
+from queries import ShowPage
+
+#----------------------------------------------------------------------------#
+# Template compilation: cold vs warm renders.
+#
+#   python -m benchmarks.template_render --repeat 20
+#
+# Renders pages/show_venue.html and pages/shows.html with a full page of
+# synthetic shows (no database needed) and reports, per template:
+#
+#   * cold:      first render in a fresh app, compiling from source,
+#   * bytecode:  first render in a fresh app with a filled bytecode cache,
+#   * warm:      later renders, with the template already in memory,
+#
+# and how long precompiling every template at boot takes in either case.
+#----------------------------------------------------------------------------#
+
+SHOWS_PER_SECTION = 24
+
+
+def show(i, start_time):
+    return {
+        'venue_id': i, 'venue_name': 'Venue %d' % i,
+        'venue_image_link': 'https://example.com/venues/%d.jpg' % i,
+        'artist_id': i, 'artist_name': 'Artist %d' % i,
+        'artist_image_link': 'https://example.com/artists/%d.jpg' % i,
+        'start_time': start_time,
+    }
+
+
+def sections():
+    now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    upcoming = [show(i, now + datetime.timedelta(hours=3 * i)) for i in range(1, SHOWS_PER_SECTION + 1)]
+    past = [show(i, now - datetime.timedelta(hours=3 * i)) for i in range(1, SHOWS_PER_SECTION + 1)]
+    # Both pagers render links.
+    page = ShowPage([], 'next-cursor', 'prev-cursor')
+    return upcoming, past, page
+
+
+def render_venue():
+    upcoming, past, page = sections()
+    venue = SimpleNamespace(
+        id=1, name='The Musical Hop', genres=['Jazz', 'Reggae', 'Swing'], city='San Francisco',
+        state='CA', address='1015 Folsom Street', phone='123-123-1234', website='https://example.com',
+        facebook_link='https://www.facebook.com/TheMusicalHop', seeking_talent=True,
+        seeking_description='We are on the lookout for a local artist.',
+        image_link='https://example.com/venue.jpg', upcoming_shows=upcoming, past_shows=past,
+        upcoming_shows_count=len(upcoming), past_shows_count=len(past), upcoming_page=page, past_page=page,
+    )
+    return render_template('pages/show_venue.html', venue=venue)
+
+
+def render_shows():
+    upcoming, past, page = sections()
+    return render_template('pages/shows.html', shows=upcoming, past_shows=past,
+                           upcoming_page=page, past_page=page)
+
+
+PAGES = {
+    'pages/show_venue.html': ('/venues/1', render_venue),
+    'pages/shows.html': ('/shows', render_shows),
+}
+
+
+def fresh_app(cache_dir):
+    class Profile(TestingConfig):
+        TEMPLATE_CACHE_DIR = cache_dir
+    return create_app(Profile, cli=False)
+
+
+def timed(app, path, render):
+    with app.test_request_context(path):
+        started = time.perf_counter()
+        render()
+        return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='fyyur-templates-')
+    try:
+        # Fill the bytecode cache once.
+        app = fresh_app(cache_dir)
+        app.extensions['template_cache'].precompile(app)
+
+        print('%-24s %10s %10s %10s' % ('template', 'cold ms', 'bytecode ms', 'warm ms'))
+        for name, (path, render) in PAGES.items():
+            cold = statistics.median(timed(fresh_app(None), path, render) for _ in range(args.repeat))
+            bytecode = statistics.median(timed(fresh_app(cache_dir), path, render) for _ in range(args.repeat))
+            app = fresh_app(None)
+            timed(app, path, render)
+            warm = statistics.median(timed(app, path, render) for _ in range(args.repeat))
+            print('%-24s %10.2f %10.2f %10.2f' % (name, cold, bytecode, warm))
+
+        for label, directory in (('from source', None), ('from bytecode', cache_dir)):
+            timings, count = [], 0
+            for _ in range(args.repeat):
+                app = fresh_app(directory)
+                count, elapsed = app.extensions['template_cache'].precompile(app)
+                timings.append(elapsed)
+            print('precompile %d templates %s: %.1f ms' % (count, label, statistics.median(timings)))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from sqlalchemy import func, or_, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Show, SHOW_DURATION, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Double-booking.
+#
+# shows.slot is the [start_time, end_time) range of a show, and the
+# shows_check_slots triggers reject a show whose slot overlaps another one at
+# the same venue or with the same artist (exclusion constraints can't span
+# the partitions of shows). The triggers are what make concurrent bookings
+# safe: each statement first locks its venues and artists, so of two
+# transactions booking the same slot, the second one blocks on the first and
+# then fails. conflicts() only looks the clash up beforehand so the form can
+# say what it is.
+#
+# The locks are always taken in one order (venues, then artists, by id) so
+# that writes of many shows can't deadlock each other. That holds within a
+# statement; a transaction that writes shows with several statements calls
+# lock_slots() with all of its rows first.
+#----------------------------------------------------------------------------#
+
+EXCLUSION_VIOLATION = '23P01'
+DEADLOCK_DETECTED = '40P01'
+
+
+def end_time_for(start_time, end_time=None):
+    return end_time or start_time + SHOW_DURATION
+
+
+def conflicts(venue_id, artist_id, start_time, end_time=None):
+    # Shows at the venue or with the artist whose slot overlaps the given one.
+    # Each side is a probe of a GiST index on (id, slot); the bounds on
+    # start_time skip the partitions of later months, and of the months
+    # before any show still running at start_time could have begun.
+    end_time = end_time_for(start_time, end_time)
+    slot = func.tsrange(start_time, end_time, '[)')
+    return Show.query.filter(
+        or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+        Show.start_time < end_time,
+        Show.start_time > start_time - MAX_SHOW_DURATION,
+        Show.slot.overlaps(slot)
+    ).order_by(Show.start_time).all()
+
+
+def lock_slots(rows):
+    # Takes the slot-check locks of every venue and artist in rows, in order,
+    # up to the end of the transaction.
+    rows = list(rows)
+    if rows:
+        db.session.execute(text('SELECT shows_lock_slots(:venue_ids, :artist_ids)'), {
+            'venue_ids': [int(row['venue_id']) for row in rows],
+            'artist_ids': [int(row['artist_id']) for row in rows],
+        })
+
+
+def describe(show, venue_id):
+    side = 'Venue %s' % show.venue_id if show.venue_id == int(venue_id) else 'Artist %s' % show.artist_id
+    return '%s is already booked from %s to %s (show %s).' % (
+        side, show.start_time.strftime('%Y-%m-%d %H:%M'), show.end_time.strftime('%Y-%m-%d %H:%M'), show.id)
+
+
+def is_conflict(error):
+    # True for the IntegrityError raised when a write hits the slot check.
+    return isinstance(error, IntegrityError) and getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION
+
+
+def is_deadlock(error):
+    # True when Postgres broke a lock cycle by failing this transaction; the
+    # whole transaction can be run again.
+    return isinstance(error, OperationalError) and getattr(error.orig, 'pgcode', None) == DEADLOCK_DETECTED
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LRUBackend:
+    # In-process cache, private to each worker.
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FileBackend:
+    # One pickle per key in a local directory, shared by every worker on the
+    # host. Writes go through a temp file so readers never see a partial entry.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache:
+    # Time-limited cache for rendered detail pages, keyed by entity, e.g.
+    # ('venue', 1). Entries expire after their timeout and are deleted
+    # explicitly when the entity or its shows change.
+
+    def __init__(self, backend=None, timeout=300):
+        self.backend = backend if backend is not None else LRUBackend()
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        config = app.config
+        if config.get('PAGE_CACHE_BACKEND') == 'file':
+            self.backend = FileBackend(config['PAGE_CACHE_DIR'])
+        else:
+            self.backend = LRUBackend(config.get('PAGE_CACHE_SIZE', 1024))
+        self.timeout = config.get('PAGE_CACHE_TIMEOUT', 300)
+
+    @staticmethod
+    def key(kind, entity_id):
+        return '%s:%s' % (kind, entity_id)
+
+    def get(self, kind, entity_id, version=None):
+        # version is the page's current ETag. An entry stored under another
+        # one was rendered before a change that some other worker (or host)
+        # handled and invalidated only in its own cache; it counts as a miss.
+        entry = self.backend.get(self.key(kind, entity_id))
+        if entry is None or entry[0] < time.time() or entry[2:] != (version,):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, kind, entity_id, value, timeout=None, version=None):
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        if timeout > 0:
+            self.backend.set(self.key(kind, entity_id), (time.time() + timeout, value, version))
+
+    def invalidate(self, kind, *entity_ids):
+        for entity_id in entity_ids:
+            self.backend.delete(self.key(kind, entity_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+page_cache = PageCache()
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def invalidate_venues(*venue_ids):
+    # Artist pages show the venue name and image, so they go too.
+    if not venue_ids:
+        return
+    artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id.in_(venue_ids)).distinct()
+    page_cache.invalidate('venue', *venue_ids)
+    page_cache.invalidate('artist', *[row.artist_id for row in artist_ids])
+
+
+def invalidate_artists(*artist_ids):
+    if not artist_ids:
+        return
+    venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id.in_(artist_ids)).distinct()
+    page_cache.invalidate('artist', *artist_ids)
+    page_cache.invalidate('venue', *[row.venue_id for row in venue_ids])
+
+
+def invalidate_shows(venue_ids, artist_ids):
+    # A new or changed show only affects the pages of its own venue and artist.
+    page_cache.invalidate('venue', *set(venue_ids))
+    page_cache.invalidate('artist', *set(artist_ids))
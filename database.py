@@ -0,0 +1,141 @@
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that records how long checkouts wait for a free connection.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._wait_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_ms += waited
+                self.max_wait_ms = max(self.max_wait_ms, waited)
+
+    def metrics(self):
+        capacity = self.size() + self._max_overflow
+        checked_out = self.checkedout()
+        with self._wait_lock:
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': checked_out,
+                'overflow': max(self.overflow(), 0),
+                'saturation': checked_out / capacity if capacity > 0 else 0.0,
+                'checkouts': self.checkouts,
+                'avg_wait_ms': self.wait_ms / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': self.max_wait_ms,
+                'timeouts': self.timeouts
+            }
+
+#----------------------------------------------------------------------------#
+# Session routing.
+#----------------------------------------------------------------------------#
+
+# A client that has just written (create a venue, then get redirected to its
+# page) must not read from a replica that hasn't caught up yet. A write
+# request (not GET/HEAD) that commits sets this cookie to the time until which its client keeps
+# reading from the primary (REPLICA_STICKY_SECONDS).
+PRIMARY_COOKIE = 'read_primary_until'
+
+
+def reads_from_primary():
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def has_replica(app):
+    return 'replica' in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def stick_to_primary(response):
+    if g.pop('committed', False) and has_replica(current_app):
+        seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(PRIMARY_COOKIE, '%d' % (time.time() + seconds), max_age=seconds,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+class RoutingSession(SignallingSession):
+    # Sends reads made while handling GET/HEAD requests to the 'replica' bind
+    # when one is configured, unless the client wrote moments ago.
+    # Everything else, and any flush, uses the primary.
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            not self._flushing
+            and has_replica(self.app)
+            and has_request_context()
+            and request.method in ('GET', 'HEAD')
+            and not reads_from_primary()
+        ):
+            return self.db.get_engine(self.app, bind='replica')
+        return super().get_bind(mapper, clause)
+
+    def commit(self):
+        super().commit()
+        # Caches filled in by a GET are not the client's own writes.
+        if has_request_context() and request.method not in ('GET', 'HEAD'):
+            g.committed = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.after_request(stick_to_primary)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('postgresql'):
+            options.setdefault('poolclass', InstrumentedQueuePool)
+        return sa_url, options
+
+    def pool_metrics(self, app=None):
+        app = self.get_app(app)
+        metrics = {}
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+            pool = self.get_engine(app, bind).pool
+            if isinstance(pool, InstrumentedQueuePool):
+                metrics[bind or 'primary'] = pool.metrics()
+        return metrics
+
+    def dispose_engines(self, app=None):
+        # Drops every pooled connection. Called around forks so each worker
+        # opens its own connections instead of sharing the parent's sockets.
+        app = self.get_app(app)
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+            self.get_engine(app, bind).dispose()
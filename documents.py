@@ -0,0 +1,245 @@
+import datetime
+import click
+from types import SimpleNamespace
+from flask.cli import AppGroup
+from sqlalchemy import literal_column, select, true
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats, VenuePage, ArtistPage
+from queries import ShowPage, SHOWS_PAGE_SIZE, encode_cursor
+from jobs import job, enqueue_many
+
+#----------------------------------------------------------------------------#
+# Page documents.
+#
+# venue_pages and artist_pages hold, per venue and artist, one JSON document
+# with everything the default detail page shows: the entity's fields, the
+# first page of upcoming and past shows (with the other side's name and
+# image), the show counts and the cursors to the next pages. Rendering that
+# page is then a single primary key read.
+#
+#   * refresh_pages*() drop the documents in the transaction that changed
+#     their venues, artists or shows, and queue their rebuild as build_page
+#     jobs; until a worker has run them those pages are rendered from
+#     queries,
+#   * roll_pages() rebuilds documents whose first upcoming show has started,
+#     and builds missing ones; it runs with `flask stats roll`.
+#
+# Paged views (?upcoming=/?past= cursors) still query shows directly.
+#----------------------------------------------------------------------------#
+
+SIDES = {
+    # kind: (model, page model, page key, stats model, stats key, show key,
+    #        model on the other side, its show key, other kind)
+    'venue': (Venue, VenuePage, VenuePage.venue_id, VenueStats, VenueStats.venue_id, Show.venue_id,
+              Artist, Show.artist_id, 'artist'),
+    'artist': (Artist, ArtistPage, ArtistPage.artist_id, ArtistStats, ArtistStats.artist_id, Show.artist_id,
+               Venue, Show.venue_id, 'venue'),
+}
+# Columns that never appear on a page.
+INTERNAL = ('search_document', 'updated_at')
+ROLL_BATCH = 1000
+
+
+def _fields(model):
+    return [column for column in model.__table__.columns if column.key not in INTERNAL]
+
+
+def _first_pages(kind, ids, upcoming, now):
+    # The first SHOWS_PAGE_SIZE + 1 upcoming (soonest first) or past (latest
+    # first) shows of every entity in ids, as in seek_shows(), from one
+    # statement with a LATERAL subquery per entity.
+    model, _, _, _, _, show_key, other, other_key, _ = SIDES[kind]
+    shows = select(Show.id, Show.start_time, other_key.label('other_id'),
+                   other.name.label('other_name'), other.image_link.label('other_image_link')) \
+        .join(other, other.id == other_key) \
+        .where(show_key == model.id)
+    if upcoming:
+        shows = shows.where(Show.start_time > now).order_by(Show.start_time, Show.id)
+    else:
+        shows = shows.where(Show.start_time <= now).order_by(Show.start_time.desc(), Show.id.desc())
+    shows = shows.limit(SHOWS_PAGE_SIZE + 1).lateral()
+
+    pages = {}
+    for row in db.session.execute(
+        select(model.id.label('entity_id'), shows).join(shows, true()).where(model.id.in_(ids))
+    ):
+        pages.setdefault(row.entity_id, []).append(row)
+    return pages
+
+
+def _section(kind, rows, name):
+    # The shows of one section and the cursor to its second page.
+    other_kind = SIDES[kind][8]
+    shows = [{
+        other_kind + '_id': row.other_id,
+        other_kind + '_name': row.other_name,
+        other_kind + '_image_link': row.other_image_link,
+        'start_time': row.start_time.isoformat(),
+    } for row in rows[:SHOWS_PAGE_SIZE]]
+    next_cursor = encode_cursor('after', rows[SHOWS_PAGE_SIZE - 1]) if len(rows) > SHOWS_PAGE_SIZE else None
+    return {name + '_shows': shows, name + '_next_cursor': next_cursor}
+
+
+def build_pages(kind, ids):
+    # Rebuilds the documents of the given venues or artists in bulk: a
+    # handful of statements however many there are.
+    if not ids:
+        return 0
+    ids = sorted(set(ids))
+    model, page, page_key, stats, stats_key, _, _, _, _ = SIDES[kind]
+    now = datetime.datetime.now()
+
+    # Concurrent rebuilds of one document take turns on its row, so the
+    # last one to commit has read every show committed before it. Rows of
+    # new venues/artists are created first so there is something to lock;
+    # they are filled in below, before anyone can see them. Venue pages are
+    # always locked before artist pages, each in id order, so two rebuilds
+    # can't deadlock.
+    db.session.execute(insert(page).from_select(
+        [page_key.key, 'document', 'listed_ids'],
+        select(model.id, literal_column("'{}'::jsonb"), literal_column("'{}'::integer[]"))
+        .where(model.id.in_(ids)).order_by(model.id)
+    ).on_conflict_do_nothing())
+    db.session.query(page_key).filter(page_key.in_(ids)).order_by(page_key).with_for_update().all()
+
+    entities = db.session.query(*_fields(model)).filter(model.id.in_(ids)).all()
+    if not entities:
+        return 0
+    counts = {row[0]: row for row in db.session.query(stats_key, stats.upcoming_count, stats.past_count)
+              .filter(stats_key.in_(ids))}
+    upcoming = _first_pages(kind, ids, True, now)
+    past = _first_pages(kind, ids, False, now)
+
+    rows = []
+    for entity in entities:
+        entity_upcoming, entity_past = upcoming.get(entity.id, []), past.get(entity.id, [])
+        count = counts.get(entity.id)
+        document = dict(entity._asdict(),
+                        upcoming_shows_count=count.upcoming_count if count else 0,
+                        past_shows_count=count.past_count if count else 0,
+                        **_section(kind, entity_upcoming, 'upcoming'),
+                        **_section(kind, entity_past, 'past'))
+        rows.append({
+            page_key.key: entity.id,
+            'document': document,
+            'listed_ids': sorted({row.other_id for row in entity_upcoming[:SHOWS_PAGE_SIZE] + entity_past[:SHOWS_PAGE_SIZE]}),
+            'valid_until': entity_upcoming[0].start_time if entity_upcoming else None,
+        })
+
+    statement = insert(page).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[page_key.key],
+        set_={column: statement.excluded[column] for column in ('document', 'listed_ids', 'valid_until')}
+    ))
+    return len(rows)
+
+
+def listing_pages(kind, ids):
+    # The pages of the other side that show any of these venues or artists.
+    other_kind = SIDES[kind][8]
+    _, page, page_key, _, _, _, _, _, _ = SIDES[other_kind]
+    return [row[0] for row in db.session.query(page_key).filter(page.listed_ids.overlap(sorted(set(ids))))]
+
+
+@job('build_page')
+def build_page(kind, id):
+    build_pages(kind, [id])
+
+
+def refresh_pages(venue_ids=(), artist_ids=()):
+    # Venue pages first, in id order, like build_pages() locks them.
+    # Ids straight from a form are strings.
+    for kind, ids in (('venue', venue_ids), ('artist', artist_ids)):
+        ids = sorted({int(entity_id) for entity_id in ids})
+        if not ids:
+            continue
+        _, page, page_key, _, _, _, _, _, _ = SIDES[kind]
+        db.session.execute(page.__table__.delete().where(page_key.in_(ids)))
+        enqueue_many('build_page', [({'kind': kind, 'id': entity_id}, 'page:%s:%d' % (kind, entity_id))
+                                    for entity_id in ids])
+
+
+def refresh_pages_for_shows(rows):
+    # rows are show dicts with venue_id and artist_id; a show only appears on
+    # the pages of its own venue and artist.
+    refresh_pages([row['venue_id'] for row in rows], [row['artist_id'] for row in rows])
+
+
+def refresh_pages_for_venues(venue_ids):
+    # A venue's name and image also appear on the artist pages listing it.
+    refresh_pages(venue_ids, listing_pages('venue', venue_ids))
+
+
+def refresh_pages_for_artists(artist_ids):
+    refresh_pages(listing_pages('artist', artist_ids), artist_ids)
+
+
+def roll_pages(limit=ROLL_BATCH):
+    # Rebuilds up to limit stale and limit missing documents per side.
+    now = datetime.datetime.now()
+    built = 0
+    for kind in ('venue', 'artist'):
+        model, page, page_key, _, _, _, _, _, _ = SIDES[kind]
+        stale = db.session.query(page_key).filter(page.valid_until <= now).limit(limit)
+        missing = db.session.query(model.id).outerjoin(page, page_key == model.id) \
+            .filter(page_key.is_(None)).limit(limit)
+        built += build_pages(kind, [row[0] for row in stale] + [row[0] for row in missing])
+    db.session.commit()
+    return built
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def document_statement(kind, entity_id):
+    _, page, page_key, _, _, _, _, _, _ = SIDES[kind]
+    return select(page.document, page.valid_until).where(page_key == entity_id)
+
+
+def load_page(row, now=None):
+    # The template object for a document row, or None when there is none or
+    # its first upcoming show has started since it was built.
+    if row is None:
+        return None
+    now = now or datetime.datetime.now()
+    if row.valid_until is not None and row.valid_until <= now:
+        return None
+    document = dict(row.document)
+    for name in ('upcoming', 'past'):
+        shows = document[name + '_shows']
+        for show in shows:
+            show['start_time'] = datetime.datetime.fromisoformat(show['start_time'])
+        document[name + '_page'] = ShowPage(shows, document.pop(name + '_next_cursor'), None)
+    page = SimpleNamespace(**document)
+    page.valid_until = row.valid_until
+    return page
+
+
+def page_document(kind, entity_id):
+    return load_page(db.session.execute(document_statement(kind, entity_id)).first())
+
+
+def document_timeout(page):
+    # For the page cache: a rendered document goes stale with it.
+    if page.valid_until is None:
+        return None
+    return (page.valid_until - datetime.datetime.now()).total_seconds()
+
+#----------------------------------------------------------------------------#
+# CLI.
+#----------------------------------------------------------------------------#
+
+pages_cli = AppGroup('pages', help='Maintain the venue/artist page documents.')
+
+
+@pages_cli.command('rebuild')
+@click.option('--batch-size', type=int, default=ROLL_BATCH)
+def rebuild_command(batch_size):
+    """Rebuild every venue and artist page document."""
+    for kind in ('venue', 'artist'):
+        model = SIDES[kind][0]
+        ids = [row[0] for row in db.session.query(model.id).order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            build_pages(kind, ids[start:start + batch_size])
+            db.session.commit()
+        click.echo('Rebuilt %d %s pages.' % (len(ids), kind))
@@ -0,0 +1,119 @@
+import csv
+import datetime
+import io
+import json
+import click
+from flask.cli import with_appcontext
+from models import Venue, Artist, Show
+from resources import RESOURCES
+
+#----------------------------------------------------------------------------#
+# Streaming export.
+#
+#   flask export shows --format jsonl --since 2021-01-01 --state CA > shows.jsonl
+#
+# Rows are read through a server-side cursor and written out chunk by chunk,
+# so memory use is the same for a thousand rows or ten million. The same
+# generator backs GET /api/v1/<resource>/export.
+#----------------------------------------------------------------------------#
+
+CHUNK_SIZE = 1000
+
+
+def export_query(name, since=None, until=None, city=None, state=None, genre=None):
+    # Venues and artists are filtered on their own city, state and genres.
+    # Shows are filtered on start_time, their venue's city and state and
+    # their artist's genres.
+    resource = RESOURCES[name]
+    query = resource.model.query.with_entities(*resource.columns(resource.fields))
+    if name == 'shows':
+        if since:
+            query = query.filter(Show.start_time >= since)
+        if until:
+            query = query.filter(Show.start_time < until)
+        if city or state:
+            query = query.join(Venue, Venue.id == Show.venue_id)
+            if city:
+                query = query.filter(Venue.city == city)
+            if state:
+                query = query.filter(Venue.state == state)
+        if genre:
+            query = query.join(Artist, Artist.id == Show.artist_id).filter(Artist.genres.any(genre))
+    else:
+        model = resource.model
+        if city:
+            query = query.filter(model.city == city)
+        if state:
+            query = query.filter(model.state == state)
+        if genre:
+            query = query.filter(model.genres.any(genre))
+    return query.order_by(resource.model.id)
+
+
+def stream_rows(query):
+    # stream_results asks psycopg2 for a named (server-side) cursor and
+    # yield_per fetches it CHUNK_SIZE rows at a time.
+    return query.execution_options(stream_results=True).yield_per(CHUNK_SIZE)
+
+
+def _plain(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return _plain(value)
+
+
+def generate(name, format='jsonl', **filters):
+    # Yields the export as text chunks of about CHUNK_SIZE rows each.
+    fields = RESOURCES[name].fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == 'csv' else None
+    if writer:
+        writer.writerow(fields)
+
+    rows = 0
+    for row in stream_rows(export_query(name, **filters)):
+        if writer:
+            writer.writerow([_csv_cell(value) for value in row])
+        else:
+            buffer.write(json.dumps(dict(zip(fields, map(_plain, row)))) + '\n')
+        rows += 1
+        if rows % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def parse_date(ctx, param, value):
+    # --since and --until take any ISO 8601 date or date and time.
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise click.BadParameter('%r is not an ISO 8601 date or date and time.' % value)
+
+
+@click.command('export')
+@click.argument('name', type=click.Choice(sorted(RESOURCES)))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), default='jsonl', show_default=True)
+@click.option('--output', '-o', type=click.File('w'), default='-', help='Defaults to stdout.')
+@click.option('--since', callback=parse_date, help='Shows starting at or after this ISO date/time.')
+@click.option('--until', callback=parse_date, help='Shows starting before this ISO date/time.')
+@click.option('--city')
+@click.option('--state')
+@click.option('--genre')
+@with_appcontext
+def export_command(name, format, output, since, until, city, state, genre):
+    """Export venues, artists or shows as CSV or JSONL."""
+    for chunk in generate(name, format, since=since, until=until, city=city, state=state, genre=genre):
+        output.write(chunk)
@@ -5,9 +5,14 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # Runs the test suite (tests/), then seeds the test database
+    # (TEST_DATABASE_URL) and benchmarks every route. Fails when a test fails,
+    # when a route got slower or issues more SQL statements than in the last
+    # good run (benchmarks/results/latest.json).
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest -q && "
+            "python -m benchmarks.routes --compare benchmarks/results/latest.json"
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
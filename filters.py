@@ -0,0 +1,35 @@
+from functools import lru_cache
+import babel
+import babel.dates
+import dateutil.parser
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+LOCALE = babel.Locale.parse('en')
+
+
+@lru_cache(maxsize=None)
+def _pattern(format):
+    # Babel patterns are compiled once per format instead of on every call.
+    return babel.dates.parse_pattern(FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=4096)
+def _format(value, format):
+    # Show times repeat a lot across a listing (same evening, same hour), so
+    # recent results are kept as well.
+    return _pattern(format).apply(value, LOCALE)
+
+
+def format_datetime(value, format='medium'):
+    # Takes datetime objects as they come off the models. Strings are still
+    # accepted and parsed for callers that only have text.
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return _format(value, format)
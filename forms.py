@@ -7,9 +7,12 @@ from wtforms import (
     SelectField, 
     SelectMultipleField, 
     DateTimeField, 
+    DateField,
+    IntegerField,
     BooleanField
 )
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, Regexp, NumberRange
+from models import MAX_SHOW_DURATION
 
 state_choices = [
     ('AL', 'AL'),
@@ -97,16 +100,64 @@ class ShowForm(Form):
     class Meta:
         csrf = False
     artist_id = StringField(
-        'artist_id'
+        'artist_id', validators=[DataRequired(), Regexp(r'^\d+$', message='Must be a numeric ID.')]
     )
     venue_id = StringField(
-        'venue_id'
+        'venue_id', validators=[DataRequired(), Regexp(r'^\d+$', message='Must be a numeric ID.')]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # Blank means the default two hour slot.
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(form, field):
+        if field.data and form.start_time.data and field.data <= form.start_time.data:
+            raise ValidationError('End time must be after the start time.')
+        if field.data and form.start_time.data and field.data - form.start_time.data > MAX_SHOW_DURATION:
+            raise ValidationError('A show can run for at most 24 hours.')
+
+class AvailabilityForm(Form):
+    # Filters of the availability search, read from the query string.
+    class Meta:
+        csrf = False
+    city = StringField(
+        'city', validators=[Optional()]
+    )
+    state = SelectField(
+        'state', validators=[Optional()],
+        choices=[('', 'Any')] + state_choices
+    )
+    genres = SelectMultipleField(
+        'genres', validators=[Optional()],
+        choices=genres_choices
+    )
+    artist_id = StringField(
+        'artist_id', validators=[Optional(), Regexp(r'^\d+$', message='Must be a numeric ID.')]
+    )
+    venue_id = StringField(
+        'venue_id', validators=[Optional(), Regexp(r'^\d+$', message='Must be a numeric ID.')]
+    )
+    start = DateField(
+        'start', validators=[DataRequired()],
+        default=lambda: datetime.today().date()
+    )
+    end = DateField(
+        'end', validators=[Optional()]
+    )
+    min_hours = IntegerField(
+        'min_hours', validators=[Optional(), NumberRange(min=1, max=24)],
+        default=2
+    )
+
+    def validate_end(form, field):
+        if field.data and form.start.data and field.data < form.start.data:
+            raise ValidationError('End date must not be before the start date.')
 
 class VenueForm(Form):
     class Meta:
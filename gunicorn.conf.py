@@ -0,0 +1,52 @@
+import multiprocessing
+from config import env
+
+#----------------------------------------------------------------------------#
+# Gunicorn settings.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Every worker has its own connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections), so WEB_CONCURRENCY x that total must stay under Postgres'
+# max_connections, and GUNICORN_THREADS should not exceed it.
+#----------------------------------------------------------------------------#
+
+bind = env('BIND', '0.0.0.0:%s' % env('PORT', '8000'))
+workers = env('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1, int)
+# More than one thread switches the workers to gthread; requests mostly wait
+# on Postgres, so a few threads per worker use the cores better than more
+# processes would.
+threads = env('GUNICORN_THREADS', 4, int)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app once in the master and fork it, instead of importing it in
+# every worker: faster boot and copy-on-write shared memory.
+preload_app = env('GUNICORN_PRELOAD', True, bool)
+
+timeout = env('GUNICORN_TIMEOUT', 30, int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', 30, int)
+keepalive = env('GUNICORN_KEEPALIVE', 5, int)
+# Recycle workers now and then so slow leaks can't pile up.
+max_requests = env('GUNICORN_MAX_REQUESTS', 1000, int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', 100, int)
+
+accesslog = env('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def _dispose_engines(server):
+    from models import db
+    db.dispose_engines(server.app.callable)
+
+
+def pre_fork(server, worker):
+    # Anything the preloaded app connected to in the master is closed before
+    # forking, so no worker inherits a socket another process is using.
+    if server.cfg.preload_app:
+        _dispose_engines(server)
+
+
+def post_fork(server, worker):
+    # Start each worker with empty pools; connections are opened on demand.
+    if server.cfg.preload_app:
+        _dispose_engines(server)
@@ -0,0 +1,325 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import urllib.error
+import urllib.request
+import click
+from flask import current_app, redirect, request, send_file, url_for
+from flask.cli import AppGroup
+from sqlalchemy import func, select, union, update
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Venue, Artist, Image
+from jobs import job, enqueue_many
+
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#
+# Venue and artist image_links are fetched once, in the background, by
+# fetch_image jobs. Each one is resized to every size in SIZES and stored on
+# local disk under IMAGE_DIR, named by the sha256 of its bytes. Templates
+# link to /images/<size>/<key>.jpg through the |thumbnail filter, where key
+# is derived from the image_link itself. Rendering a page therefore needs
+# no lookups. That URL serves the stored thumbnail with a long max-age and
+# an ETag. Until the fetch has run, and for a dead link or anything that
+# isn't an image, it redirects to a placeholder.
+#
+# Links come from unauthenticated forms and the API, so fetches only
+# connect to public addresses: loopback, private, link-local (cloud
+# metadata) and other reserved addresses are refused, on every redirect
+# too, unless the host is in IMAGE_FETCH_ALLOWED_HOSTS.
+#----------------------------------------------------------------------------#
+
+SIZES = {
+    'tile': (320, 320),     # show tiles
+    'page': (720, 720),     # the venue or artist image on its page
+}
+USER_AGENT = 'fyyur-images/1.0'
+MAX_REDIRECTS = 5
+PLACEHOLDER = 'img/placeholder.svg'
+
+
+class BrokenImage(Exception):
+    # The link answered, but not with a usable image; fetching it again
+    # won't help. Network errors and 5xx answers are raised as they are and
+    # retried by the job queue.
+    pass
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def fetchable(url):
+    return bool(url) and url.lower().startswith(('http://', 'https://'))
+
+
+def is_public(address):
+    address = getattr(address, 'ipv4_mapped', None) or address
+    return address.is_global and not address.is_multicast
+
+
+def public_addresses(host, port, allowed_hosts=()):
+    # The addresses host resolves to, provided all of them are public.
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if host not in allowed_hosts:
+        for *_, sockaddr in addresses:
+            if not is_public(ipaddress.ip_address(sockaddr[0].split('%')[0])):
+                raise BrokenImage('%s resolves to a non-public address (%s).' % (host, sockaddr[0]))
+    return [sockaddr for *_, sockaddr in addresses]
+
+
+def public_connector(allowed_hosts):
+    # Replaces socket.create_connection in the connections below: the check
+    # happens on the address actually connected to, for the first request
+    # and every redirect alike.
+    def create_connection(address, timeout, source_address=None):
+        error = None
+        for sockaddr in public_addresses(*address, allowed_hosts):
+            try:
+                return socket.create_connection(sockaddr[:2], timeout, source_address)
+            except OSError as e:
+                error = e
+        raise error
+    return create_connection
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, *args, allowed_hosts=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connector(allowed_hosts)
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+
+    def __init__(self, *args, allowed_hosts=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = public_connector(allowed_hosts)
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+
+    def __init__(self, allowed_hosts):
+        super().__init__()
+        self.allowed_hosts = allowed_hosts
+
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req, allowed_hosts=self.allowed_hosts)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def __init__(self, allowed_hosts):
+        super().__init__()
+        self.allowed_hosts = allowed_hosts
+
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context, allowed_hosts=self.allowed_hosts)
+
+
+class RedirectHandler(urllib.request.HTTPRedirectHandler):
+    # urllib would also follow a redirect to ftp://.
+    max_redirections = MAX_REDIRECTS
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not fetchable(newurl):
+            raise BrokenImage('Redirected to a non-http(s) URL.')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def download(url, timeout, max_bytes, allowed_hosts=()):
+    # The body of url, at most max_bytes of it. Proxies from the environment
+    # are not used: the address check has to see the real host.
+    if not fetchable(url):
+        raise BrokenImage('Not an http(s) URL.')
+    opener = urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), PublicHTTPHandler(allowed_hosts), PublicHTTPSHandler(allowed_hosts),
+        RedirectHandler)
+    try:
+        with opener.open(urllib.request.Request(url, headers={'User-Agent': USER_AGENT}),
+                         timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    except urllib.error.HTTPError as e:
+        if e.code < 500 and e.code != 429:
+            raise BrokenImage('HTTP %d' % e.code)
+        raise
+    if len(data) > max_bytes:
+        raise BrokenImage('Larger than %d bytes.' % max_bytes)
+    return data
+
+
+def make_thumbnails(data):
+    # JPEG bytes for every size, fitted inside its box without cropping and
+    # never enlarged. Pillow is only needed where jobs run.
+    from PIL import Image as PILImage, ImageOps
+    try:
+        original = PILImage.open(io.BytesIO(data))
+        # Lets JPEG decode at a fraction of full size, much faster for photos.
+        original.draft('RGB', max(SIZES.values()))
+        original = ImageOps.exif_transpose(original).convert('RGB')
+    except (OSError, ValueError, PILImage.DecompressionBombError) as e:
+        raise BrokenImage('Not an image: %s' % e)
+    thumbnails = {}
+    for size, box in SIZES.items():
+        image = original.copy()
+        image.thumbnail(box, PILImage.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def image_path(directory, digest):
+    return os.path.join(directory, digest[:2], digest + '.jpg')
+
+
+def store(directory, data):
+    # Content-addressed: identical thumbnails are stored once, and a file
+    # that exists is already complete (written to a temp file, then renamed).
+    digest = hashlib.sha256(data).hexdigest()
+    path = image_path(directory, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    return digest
+
+
+@job('fetch_image', max_attempts=4)
+def fetch_image(key):
+    image = db.session.get(Image, key, with_for_update=True)
+    if image is None or image.status != 'pending':
+        return
+    config = current_app.config
+    try:
+        thumbnails = make_thumbnails(download(image.url, config['IMAGE_FETCH_TIMEOUT'], config['IMAGE_MAX_BYTES'],
+                                              config['IMAGE_FETCH_ALLOWED_HOSTS']))
+    except BrokenImage as e:
+        image.status, image.error = 'broken', str(e)
+    else:
+        image.status, image.error = 'ok', None
+        image.thumbnails = {size: store(config['IMAGE_DIR'], data) for size, data in thumbnails.items()}
+    image.fetched_at = func.now()
+
+
+def register_images(urls):
+    # Adds the image links not seen before as pending; returns their keys.
+    urls = {url_key(url): url for url in urls if fetchable(url)}
+    if not urls:
+        return []
+    return db.session.execute(
+        insert(Image).values([{'key': key, 'url': url} for key, url in sorted(urls.items())])
+        .on_conflict_do_nothing().returning(Image.key)
+    ).scalars().all()
+
+
+def queue_fetches(keys):
+    enqueue_many('fetch_image', [({'key': key}, 'image:' + key) for key in keys])
+
+
+def queue_images(urls):
+    # Registers new image links and queues their fetch, in the caller's
+    # transaction. Links already known keep their thumbnails.
+    queue_fetches(register_images(urls))
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+def thumbnail_url(url, size='tile'):
+    # Template filter: {{ venue.image_link|thumbnail('page') }}.
+    if not url:
+        return url_for('static', filename=PLACEHOLDER)
+    return url_for('thumbnail', size=size, key=url_key(url))
+
+
+def placeholder():
+    # Not cached, so the thumbnail is served as soon as it exists.
+    response = redirect(url_for('static', filename=PLACEHOLDER))
+    response.cache_control.no_cache = True
+    return response
+
+
+def send_thumbnail(size, key):
+    if size not in SIZES:
+        return redirect(url_for('static', filename=PLACEHOLDER))
+    row = db.session.execute(select(Image.status, Image.thumbnails).where(Image.key == key)).first()
+    if row is None or row.status != 'ok':
+        # Not fetched yet, or broken (until `flask images fetch --broken`).
+        return placeholder()
+
+    # A size added since the fetch has no thumbnail yet, and IMAGE_DIR is
+    # local to each host: the file may have been written on another one by
+    # the worker, or cleaned up.
+    digest = (row.thumbnails or {}).get(size)
+    if digest is None:
+        return placeholder()
+    max_age = current_app.config['IMAGE_MAX_AGE']
+    try:
+        response = send_file(image_path(current_app.config['IMAGE_DIR'], digest), mimetype='image/jpeg',
+                             add_etags=False, cache_timeout=max_age)
+    except FileNotFoundError:
+        current_app.logger.warning('Thumbnail %s of image %s is missing from IMAGE_DIR', digest, key)
+        return placeholder()
+    response.set_etag(digest)
+    response.cache_control.public = True
+    return response.make_conditional(request)
+
+
+class Images:
+
+    def init_app(self, app):
+        app.extensions['images'] = self
+        app.jinja_env.filters['thumbnail'] = thumbnail_url
+        app.add_url_rule('/images/<size>/<key>.jpg', 'thumbnail', send_thumbnail)
+
+
+images = Images()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+images_cli = AppGroup('images', help='Fetch and inspect image thumbnails.')
+
+
+@images_cli.command('fetch')
+@click.option('--broken', is_flag=True, help='Also try broken links again.')
+def fetch_command(broken):
+    """Queue a fetch for every image link that has no thumbnails yet."""
+    links = union(
+        select(Venue.image_link.label('url')).where(Venue.image_link.isnot(None)),
+        select(Artist.image_link.label('url')).where(Artist.image_link.isnot(None)),
+    )
+    register_images([row.url for row in db.session.execute(links)])
+    if broken:
+        db.session.execute(update(Image).where(Image.status == 'broken').values(status='pending', error=None))
+    keys = db.session.execute(select(Image.key).where(Image.status == 'pending').order_by(Image.key)).scalars().all()
+    queue_fetches(keys)
+    db.session.commit()
+    click.echo('Queued %d image fetches.' % len(keys))
+
+
+@images_cli.command('stats')
+def stats_command():
+    """Count image links by status, and the disk used by thumbnails."""
+    for status, count in db.session.execute(
+        select(Image.status, func.count()).group_by(Image.status).order_by(Image.status)
+    ):
+        click.echo('%-8s %d' % (status, count))
+    files, size = 0, 0
+    for root, _, names in os.walk(current_app.config['IMAGE_DIR']):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    click.echo('%d thumbnails, %.1f MB in %s' % (files, size / 2 ** 20, current_app.config['IMAGE_DIR']))
@@ -0,0 +1,220 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import ARRAY, Boolean
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+from models import db, ImportCheckpoint
+from resources import RESOURCES
+from stats import refresh_for_shows
+from images import queue_images
+from booking import is_deadlock, lock_slots
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+#   flask import venues venues.csv
+#   flask import shows shows.jsonl --batch-size 5000 --errors shows.errors.jsonl
+#
+# Rows are streamed from the file, validated with the same rules as the
+# HTML forms, and inserted in batches, one transaction per batch. Each
+# batch's transaction also moves the import's checkpoint (import_checkpoints)
+# past its last line, so an interrupted import picks up where it stopped when
+# run again, and never inserts or counts a row twice. Rejected rows are
+# written to the errors file once their batch has committed.
+#----------------------------------------------------------------------------#
+
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'on')
+# Errors that reject a row rather than the import: constraints, and values
+# the forms let through but the columns don't take (a name longer than
+# varchar(120)).
+ROW_ERRORS = (IntegrityError, DataError)
+# Times a batch is run again after Postgres failed it to break a deadlock.
+DEADLOCK_RETRIES = 3
+
+
+def read_rows(path, format):
+    # Yields (line number, row dict) without loading the file into memory.
+    with open(path, newline='') as f:
+        if format == 'csv':
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(f, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    yield line, json.loads(text)
+                except ValueError:
+                    yield line, None
+
+
+def coerce_csv(resource, row):
+    # CSV cells are all text: blank cells are missing values, boolean columns
+    # take the usual spellings and array columns (genres) are comma separated.
+    values = {}
+    for field, value in row.items():
+        if field is None or value is None or value.strip() == '':
+            continue
+        value = value.strip()
+        column = resource.model.__table__.c.get(field)
+        if column is not None and isinstance(column.type, Boolean):
+            value = value.lower() in TRUE_VALUES
+        elif column is not None and isinstance(column.type, ARRAY):
+            value = [item.strip() for item in value.split(',') if item.strip()]
+        values[field] = value
+    return values
+
+
+def validated(resource, rows, format):
+    # Yields (line, values, None) for a valid row and (line, row, errors) for
+    # a rejected one; rejected rows stay in their batch, to be reported with it.
+    for line, row in rows:
+        if not isinstance(row, dict):
+            yield line, row, {'row': ['Not a JSON object.']}
+            continue
+        if format == 'csv':
+            row = coerce_csv(resource, row)
+        values, errors = resource.validate(row)
+        yield (line, row, errors) if errors else (line, values, None)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_batch(name, resource, batch, checkpoint):
+    # Inserts a batch and moves the checkpoint past it in one transaction;
+    # returns (inserted values, rejected (line, row, errors)). A batch that
+    # loses a deadlock is rolled back and run again.
+    for attempt in range(DEADLOCK_RETRIES + 1):
+        try:
+            return try_batch(name, resource, batch, checkpoint)
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_deadlock(e) or attempt == DEADLOCK_RETRIES:
+                raise
+
+
+def try_batch(name, resource, batch, checkpoint):
+    rejected = [(line, row, errors) for line, row, errors in batch if errors]
+    inserted = insert_rows(resource.model.__table__, [(line, values) for line, values, errors in batch
+                                                      if not errors], rejected)
+    if name == 'shows':
+        # New venues and artists have no cached pages yet.
+        refresh_for_shows(inserted)
+        resource.refresh(inserted)
+    elif inserted:
+        queue_images([values.get('image_link') for values in inserted])
+    save_checkpoint(dict(checkpoint, line=batch[-1][0], inserted=checkpoint['inserted'] + len(inserted),
+                         rejected=checkpoint['rejected'] + len(rejected)))
+    db.session.commit()
+    return inserted, sorted(rejected, key=lambda reject: reject[0])
+
+
+def insert_rows(table, rows, rejected):
+    # One executemany INSERT for the rows. If it hits a constraint (for
+    # example a show pointing at a missing venue) or a value too long for its
+    # column, the rows are retried one by one inside savepoints so only the
+    # offending rows are rejected. Shows take their slot locks up front, in
+    # order (see booking.py).
+    if not rows:
+        return []
+    if table.name == 'shows':
+        lock_slots(values for _, values in rows)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert(), [values for _, values in rows])
+        return [values for _, values in rows]
+    except ROW_ERRORS:
+        pass
+
+    inserted = []
+    for line, values in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), [values])
+            inserted.append(values)
+        except ROW_ERRORS as e:
+            rejected.append((line, values, {'row': [str(e.orig).strip()]}))
+    return inserted
+
+
+def read_checkpoint(key):
+    row = db.session.get(ImportCheckpoint, key)
+    if row is None:
+        return {'key': key, 'line': 0, 'inserted': 0, 'rejected': 0}
+    return {'key': key, 'line': row.line, 'inserted': row.inserted, 'rejected': row.rejected}
+
+
+def save_checkpoint(checkpoint):
+    table = ImportCheckpoint.__table__
+    statement = insert(table).values(**checkpoint)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={key: statement.excluded[key] for key in ('line', 'inserted', 'rejected')}
+    ))
+
+
+def run_import(name, path, format=None, batch_size=1000, checkpoint_key=None,
+               errors_path=None, progress=None):
+    resource = RESOURCES[name]
+    format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+    checkpoint_key = checkpoint_key or os.path.abspath(path)
+    errors_path = errors_path or path + '.errors.jsonl'
+
+    checkpoint = read_checkpoint(checkpoint_key)
+    db.session.commit()
+    resume_after = checkpoint['line']
+    started = time.perf_counter()
+    inserted_now = 0
+
+    with open(errors_path, 'a') as errors_file:
+        rows = ((line, row) for line, row in read_rows(path, format) if line > resume_after)
+        for batch in batches(validated(resource, rows, format), batch_size):
+            inserted, rejected = write_batch(name, resource, batch, checkpoint)
+            if name == 'shows':
+                resource.invalidate(inserted)
+            for line, row, errors in rejected:
+                errors_file.write(json.dumps({'line': line, 'errors': errors, 'row': row}, default=str) + '\n')
+            errors_file.flush()
+            inserted_now += len(inserted)
+            checkpoint.update(line=batch[-1][0], inserted=checkpoint['inserted'] + len(inserted),
+                              rejected=checkpoint['rejected'] + len(rejected))
+            if progress:
+                progress(checkpoint, inserted_now / (time.perf_counter() - started))
+
+    elapsed = time.perf_counter() - started
+    # Finished cleanly; the next run of the same file starts from the top.
+    db.session.query(ImportCheckpoint).filter(ImportCheckpoint.key == checkpoint_key).delete()
+    db.session.commit()
+    result = {key: checkpoint[key] for key in ('line', 'inserted', 'rejected')}
+    return dict(result, seconds=elapsed, rows_per_second=inserted_now / elapsed if elapsed else 0.0)
+
+
+@click.command('import')
+@click.argument('name', type=click.Choice(sorted(RESOURCES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--checkpoint', 'checkpoint_key', help='Name of the checkpoint. Defaults to the absolute PATH.')
+@click.option('--errors', 'errors_path', help='Rejected rows are appended here. Defaults to PATH.errors.jsonl.')
+@with_appcontext
+def import_command(name, path, format, batch_size, checkpoint_key, errors_path):
+    """Bulk import venues, artists or shows from a CSV or JSONL file."""
+    def progress(checkpoint, rate):
+        click.echo('line %d: %d inserted, %d rejected (%.0f rows/s)' % (
+            checkpoint['line'], checkpoint['inserted'], checkpoint['rejected'], rate))
+
+    result = run_import(name, path, format, batch_size, checkpoint_key, errors_path, progress)
+    click.echo('Done: %d inserted, %d rejected in %.1fs (%.0f rows/s).' % (
+        result['inserted'], result['rejected'], result['seconds'], result['rows_per_second']))
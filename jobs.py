@@ -0,0 +1,244 @@
+import datetime
+import signal
+import threading
+import traceback
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, case, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, Job
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Slow side effects of a write are queued as rows in the jobs table, in the
+# transaction of the write itself: they are queued exactly when the write
+# commits, and never for one that rolled back. `flask jobs work` runs them:
+#
+#   * a job is claimed with FOR UPDATE SKIP LOCKED, so any number of
+#     workers (and --concurrency threads in each) share the queue,
+#   * a job's own writes commit together with it being marked done,
+#   * a failed job is retried with exponential backoff up to max_attempts,
+#     then kept as failed with its last error,
+#   * jobs with the same key are deduplicated while queued, so a burst of
+#     edits to one venue rebuilds its page once,
+#   * a job whose worker died is queued again once its lease runs out.
+#
+# Jobs are plain functions registered with @job('name') and called with the
+# keyword arguments they were queued with, which must be JSON.
+#----------------------------------------------------------------------------#
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 5  # seconds, doubled after every failed attempt
+POLL_INTERVAL = 0.5
+
+HANDLERS = {}
+
+
+def job(name, max_attempts=MAX_ATTEMPTS):
+    def register(handler):
+        HANDLERS[name] = (handler, max_attempts)
+        return handler
+    return register
+
+
+def enqueue_many(name, jobs):
+    # jobs are (args, key) pairs. Runs in the caller's transaction; a job
+    # whose key is already queued is dropped.
+    if not jobs:
+        return
+    handler, max_attempts = HANDLERS[name]
+    if current_app.config.get('JOBS_EAGER'):
+        # Each in a savepoint: like a queued job, a failing one is logged
+        # and doesn't take the caller's transaction down with it.
+        for args, _ in jobs:
+            try:
+                with db.session.begin_nested():
+                    handler(**args)
+            except Exception:
+                current_app.logger.warning('Job %s%r failed:\n%s', name, args, traceback.format_exc())
+        return
+    db.session.execute(insert(Job).values([
+        {'name': name, 'args': args, 'key': key, 'max_attempts': max_attempts} for args, key in jobs
+    ]).on_conflict_do_nothing(index_elements=['key'], index_where=text("status = 'queued'")))
+
+
+def enqueue(name, key=None, **args):
+    enqueue_many(name, [(args, key)])
+
+#----------------------------------------------------------------------------#
+# Worker.
+#----------------------------------------------------------------------------#
+
+def claim(lease):
+    # Takes the next due job, or returns None when there is none.
+    due = select(Job.id) \
+        .where(Job.status == 'queued', Job.run_at <= func.now()) \
+        .order_by(Job.run_at, Job.id) \
+        .limit(1) \
+        .with_for_update(skip_locked=True) \
+        .scalar_subquery()
+    claimed = db.session.execute(
+        update(Job)
+        .where(Job.id == due)
+        .values(status='running', attempts=Job.attempts + 1, started_at=func.now(),
+                locked_until=func.now() + datetime.timedelta(seconds=lease))
+        .returning(Job.id, Job.name, Job.args, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    return claimed
+
+
+def requeue(job_id, **values):
+    # Back to queued, unless a job with the same key was queued in the
+    # meantime: that one does the same work, so this one is superseded.
+    try:
+        db.session.execute(update(Job).where(Job.id == job_id).values(status='queued', **values))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        db.session.execute(update(Job).where(Job.id == job_id).values(status='superseded', finished_at=func.now()))
+        db.session.commit()
+
+
+def fail(job_id, error):
+    db.session.execute(update(Job).where(Job.id == job_id).values(
+        status='failed', finished_at=func.now(), last_error=error, locked_until=None))
+    db.session.commit()
+
+
+def run(claimed):
+    handler, _ = HANDLERS.get(claimed.name, (None, None))
+    try:
+        if handler is None:
+            raise LookupError('No handler registered for job %r.' % claimed.name)
+        handler(**claimed.args)
+        db.session.execute(update(Job).where(Job.id == claimed.id)
+                           .values(status='done', finished_at=func.now(), locked_until=None))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        current_app.logger.warning('Job %s (%s) failed, attempt %d of %d:\n%s', claimed.id, claimed.name,
+                                   claimed.attempts, claimed.max_attempts, error)
+        if claimed.attempts < claimed.max_attempts:
+            delay = datetime.timedelta(seconds=RETRY_DELAY * 2 ** (claimed.attempts - 1))
+            requeue(claimed.id, run_at=func.now() + delay, last_error=error, locked_until=None)
+        else:
+            fail(claimed.id, error)
+
+
+def requeue_abandoned():
+    # Running jobs whose lease ran out: their worker is gone. A job that has
+    # used up its attempts fails instead, as it may be what killed the worker
+    # (out of memory, a crash in native code) every time.
+    for job_id, attempts, max_attempts in db.session.execute(
+        select(Job.id, Job.attempts, Job.max_attempts).where(Job.status == 'running', Job.locked_until < func.now())
+    ).all():
+        if attempts < max_attempts:
+            requeue(job_id, run_at=func.now(), locked_until=None)
+        else:
+            fail(job_id, 'Abandoned by its worker on attempt %d of %d.' % (attempts, max_attempts))
+
+
+def work(app, stop, lease, poll):
+    # One worker thread: runs jobs until stop is set, finishing the current one.
+    with app.app_context():
+        try:
+            while not stop.is_set():
+                claimed = claim(lease)
+                if claimed is None:
+                    requeue_abandoned()
+                    stop.wait(poll)
+                    continue
+                run(claimed)
+        finally:
+            db.session.remove()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--concurrency', type=int, default=2, help='Jobs run at the same time by this worker.')
+@click.option('--poll', type=float, default=POLL_INTERVAL, help='Seconds to wait when the queue is empty.')
+def work_command(concurrency, poll):
+    """Run queued jobs until interrupted."""
+    app = current_app._get_current_object()
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    threads = [threading.Thread(target=work, args=(app, stop, app.config['JOB_LEASE'], poll), daemon=True)
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    click.echo('Working with %d threads; Ctrl-C to stop after the running jobs.' % concurrency)
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+@jobs_cli.command('stats')
+@click.option('--since', type=int, default=60, help='Minutes of finished jobs to measure latency over.')
+def stats_command(since):
+    """Show queue depth and job latency per job name."""
+    window = func.now() - datetime.timedelta(minutes=since)
+    queued = Job.status == 'queued'
+    finished = and_(Job.status == 'done', Job.finished_at >= window)
+    # Percentiles skip NULLs, so only recently finished jobs are measured.
+    wait = case((finished, func.extract('epoch', Job.started_at - Job.queued_at)))
+    runtime = case((finished, func.extract('epoch', Job.finished_at - Job.started_at)))
+    rows = db.session.query(
+        Job.name,
+        func.count().filter(and_(queued, Job.run_at <= func.now())),
+        func.count().filter(and_(queued, Job.run_at > func.now())),
+        func.count().filter(Job.status == 'running'),
+        func.count().filter(Job.status == 'failed'),
+        func.count().filter(finished),
+        func.percentile_cont(0.5).within_group(wait),
+        func.percentile_cont(0.95).within_group(wait),
+        func.percentile_cont(0.5).within_group(runtime),
+        func.percentile_cont(0.95).within_group(runtime),
+    ).filter(Job.status != 'superseded').group_by(Job.name).order_by(Job.name).all()
+
+    click.echo('%-12s %7s %7s %7s %7s %7s %11s %11s' % (
+        'job', 'ready', 'delayed', 'running', 'failed', 'done', 'wait p50/95', 'run p50/95'))
+    for name, ready, delayed, running, failed, done, wait50, wait95, run50, run95 in rows:
+        click.echo('%-12s %7d %7d %7d %7d %7d %11s %11s' % (
+            name, ready, delayed, running, failed, done,
+            '%.1f/%.1fs' % (wait50, wait95) if done else '-',
+            '%.0f/%.0fms' % (run50 * 1000, run95 * 1000) if done else '-'))
+    oldest = db.session.query(func.min(Job.run_at)).filter(queued, Job.run_at <= func.now()).scalar()
+    if oldest is not None:
+        click.echo('Oldest ready job has waited %s.' % (datetime.datetime.now(oldest.tzinfo) - oldest))
+
+
+@jobs_cli.command('retry')
+@click.argument('ids', type=int, nargs=-1)
+def retry_command(ids):
+    """Queue failed jobs again (all of them without IDS)."""
+    query = select(Job.id).where(Job.status == 'failed')
+    if ids:
+        query = query.where(Job.id.in_(ids))
+    failed = [row[0] for row in db.session.execute(query)]
+    for job_id in failed:
+        requeue(job_id, attempts=0, run_at=func.now(), finished_at=None)
+    click.echo('Queued %d failed jobs again.' % len(failed))
+
+
+@jobs_cli.command('prune')
+@click.option('--days', type=int, default=7, help='Keep finished jobs this many days.')
+def prune_command(days):
+    """Delete finished jobs older than --days."""
+    deleted = db.session.execute(Job.__table__.delete().where(
+        Job.status.in_(('done', 'superseded')),
+        Job.finished_at < func.now() - datetime.timedelta(days=days)
+    )).rowcount
+    db.session.commit()
+    click.echo('Deleted %d finished jobs.' % deleted)
@@ -0,0 +1,57 @@
+"""empty message
+
+Revision ID: 4f9a2d61c8b5
+Revises: e7b3c05d9a14
+Create Date: 2021-05-29 16:03:21.547190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4f9a2d61c8b5'
+down_revision = 'e7b3c05d9a14'
+branch_labels = None
+depends_on = None
+
+
+OVERLAPS = """
+SELECT a.id, b.id FROM shows a JOIN shows b
+  ON a.id < b.id AND (a.venue_id = b.venue_id OR a.artist_id = b.artist_id)
+ AND a.slot && b.slot
+LIMIT 20
+"""
+
+
+def upgrade():
+    # btree_gist provides the = operator class for the integer ids.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # Existing shows get the default two hour slot.
+    op.execute("UPDATE shows SET end_time = start_time + interval '2 hours'")
+    op.alter_column('shows', 'end_time', nullable=False)
+    op.create_check_constraint('shows_end_after_start', 'shows', 'end_time > start_time')
+    op.add_column('shows', sa.Column('slot', postgresql.TSRANGE(),
+                                     sa.Computed("tsrange(start_time, end_time, '[)')", persisted=True),
+                                     nullable=True))
+
+    clashes = op.get_bind().execute(sa.text(OVERLAPS)).fetchall()
+    if clashes:
+        raise RuntimeError(
+            'Existing shows are double-booked; move or delete one of each pair and run the '
+            'upgrade again: ' + ', '.join('%s/%s' % pair for pair in clashes)
+        )
+    op.create_exclude_constraint('shows_venue_slot_excl', 'shows',
+                                 ('venue_id', '='), ('slot', '&&'), using='gist')
+    op.create_exclude_constraint('shows_artist_slot_excl', 'shows',
+                                 ('artist_id', '='), ('slot', '&&'), using='gist')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_slot_excl', 'shows')
+    op.drop_constraint('shows_venue_slot_excl', 'shows')
+    op.drop_column('shows', 'slot')
+    op.drop_constraint('shows_end_after_start', 'shows')
+    op.drop_column('shows', 'end_time')
@@ -0,0 +1,129 @@
+"""empty message
+
+Revision ID: 6a3f1d8c2e90
+Revises: 9e4b7c2d5a18
+Create Date: 2021-06-19 10:42:17.903215
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3f1d8c2e90'
+down_revision = '9e4b7c2d5a18'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = 'id, venue_id, artist_id, start_time, end_time, updated_at'
+# Monthly partitions are created from the first show up to this many months
+# ahead; `flask shows partitions` keeps adding them from there.
+MONTHS_AHEAD = 12
+
+# Exclusion constraints can't span the partitions of a table, so overlapping
+# bookings are rejected by a trigger instead. The advisory locks serialize
+# bookings of the same venue and of the same artist, so of two transactions
+# booking overlapping slots the second one waits for the first and then sees
+# its show. The error is the one the constraints raised (23P01), under the
+# same constraint names.
+CHECK_SLOT = """
+CREATE FUNCTION shows_check_slot() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  clash record;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('shows.venue_id'), NEW.venue_id);
+  PERFORM pg_advisory_xact_lock(hashtext('shows.artist_id'), NEW.artist_id);
+  SELECT id, venue_id INTO clash FROM shows
+   WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id)
+     AND start_time < NEW.end_time
+     AND slot && tsrange(NEW.start_time, NEW.end_time, '[)')
+     AND id <> NEW.id
+   LIMIT 1;
+  IF FOUND THEN
+    RAISE exclusion_violation USING
+      MESSAGE = format('show %s overlaps show %s', NEW.id, clash.id),
+      CONSTRAINT = CASE WHEN clash.venue_id = NEW.venue_id
+                        THEN 'shows_venue_slot_excl' ELSE 'shows_artist_slot_excl' END;
+  END IF;
+  RETURN NEW;
+END
+$$
+"""
+
+
+def columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('shows_id_seq'::regclass)"), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('slot', postgresql.TSRANGE(), sa.Computed("tsrange(start_time, end_time, '[)')", persisted=True),
+                  nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    ]
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def swap_in(name):
+    # Copies shows into the new table, drops the old one and takes its name;
+    # the id sequence moves along with the rows.
+    op.execute('INSERT INTO %s (%s) SELECT %s FROM shows' % (name, COLUMNS, COLUMNS))
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+    op.drop_table('shows')
+    op.rename_table(name, 'shows')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'])
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'])
+    op.create_check_constraint('shows_end_after_start', 'shows', 'end_time > start_time')
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index(op.f('ix_shows_updated_at'), 'shows', ['updated_at'], unique=False)
+
+
+def upgrade():
+    op.create_table('shows_partitioned', *columns(),
+                    postgresql_partition_by='RANGE (start_time)')
+
+    first = op.get_bind().execute(sa.text('SELECT min(start_time) FROM shows')).scalar()
+    month = datetime.datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    until = month
+    for _ in range(MONTHS_AHEAD + 1):
+        until = next_month(until)
+    if first is not None and first < month:
+        month = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month < until:
+        op.execute("CREATE TABLE shows_%04d_%02d PARTITION OF shows_partitioned FOR VALUES FROM ('%s') TO ('%s')"
+                   % (month.year, month.month, month.isoformat(), next_month(month).isoformat()))
+        month = next_month(month)
+    # Shows further ahead than that, until their month is created.
+    op.execute('CREATE TABLE shows_default PARTITION OF shows_partitioned DEFAULT')
+
+    swap_in('shows_partitioned')
+    op.create_primary_key('shows_pkey', 'shows', ['id', 'start_time'])
+    op.create_index('ix_shows_venue_id_slot', 'shows', ['venue_id', 'slot'], unique=False, postgresql_using='gist')
+    op.create_index('ix_shows_artist_id_slot', 'shows', ['artist_id', 'slot'], unique=False, postgresql_using='gist')
+    op.execute(CHECK_SLOT)
+    op.execute('CREATE TRIGGER shows_check_slot BEFORE INSERT OR UPDATE OF venue_id, artist_id, start_time, end_time '
+               'ON shows FOR EACH ROW EXECUTE FUNCTION shows_check_slot()')
+
+
+def downgrade():
+    # Back to a single table. Shows in archived (dropped) partitions are not
+    # restored; detached ones are left where they are.
+    op.create_table('shows_unpartitioned', *columns())
+    op.execute('DROP TRIGGER shows_check_slot ON shows')
+    op.execute('DROP FUNCTION shows_check_slot()')
+    swap_in('shows_unpartitioned')
+    op.create_primary_key('shows_pkey', 'shows', ['id'])
+    op.create_exclude_constraint('shows_venue_slot_excl', 'shows',
+                                 ('venue_id', '='), ('slot', '&&'), using='gist')
+    op.create_exclude_constraint('shows_artist_slot_excl', 'shows',
+                                 ('artist_id', '='), ('slot', '&&'), using='gist')
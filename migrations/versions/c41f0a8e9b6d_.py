@@ -0,0 +1,58 @@
+"""empty message
+
+Revision ID: c41f0a8e9b6d
+Revises: 5b1e9d3c7a20
+Create Date: 2021-05-14 21:07:12.338590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f0a8e9b6d'
+down_revision = '5b1e9d3c7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('venues', sa.Column('search_document', sa.Text(), nullable=True))
+    op.add_column('artists', sa.Column('search_document', sa.Text(), nullable=True))
+
+    # venues and artists share name, city, state and genres, so one trigger
+    # function keeps search_document current on both tables.
+    op.execute("""
+        CREATE FUNCTION search_document_update() RETURNS trigger AS $$
+        BEGIN
+          NEW.search_document := lower(concat_ws(' ', NEW.name, NEW.city, NEW.state, array_to_string(NEW.genres, ' ')));
+          RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('venues', 'artists'):
+        op.execute("""
+            CREATE TRIGGER {0}_search_document
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {0}
+            FOR EACH ROW EXECUTE PROCEDURE search_document_update()
+        """.format(table))
+        op.execute("""
+            UPDATE {0}
+            SET search_document = lower(concat_ws(' ', name, city, state, array_to_string(genres, ' ')))
+        """.format(table))
+
+    op.create_index('ix_venues_search_document', 'venues', ['search_document'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'})
+    op.create_index('ix_artists_search_document', 'artists', ['search_document'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artists_search_document', table_name='artists')
+    op.drop_index('ix_venues_search_document', table_name='venues')
+    for table in ('venues', 'artists'):
+        op.execute('DROP TRIGGER {0}_search_document ON {0}'.format(table))
+    op.execute('DROP FUNCTION search_document_update()')
+    op.drop_column('artists', 'search_document')
+    op.drop_column('venues', 'search_document')
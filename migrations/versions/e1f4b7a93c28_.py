@@ -0,0 +1,117 @@
+"""empty message
+
+Revision ID: e1f4b7a93c28
+Revises: 7d2a9f4c1b36
+Create Date: 2021-07-10 15:21:08.664120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f4b7a93c28'
+down_revision = '7d2a9f4c1b36'
+branch_labels = None
+depends_on = None
+
+
+# The row trigger of 6a3f1d8c2e90 took the venue and artist locks of each
+# row as it was inserted, so two multi-row writes could take them in
+# opposite orders and deadlock. Locks are now always taken in one order --
+# venues, then artists, each by ascending id -- by shows_lock_slots(), once
+# per statement for all of its rows. Writes that span several statements
+# call it themselves first (booking.lock_slots()).
+LOCK_SLOTS = """
+CREATE FUNCTION shows_lock_slots(venue_ids integer[], artist_ids integer[]) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+  entity_id integer;
+BEGIN
+  FOR entity_id IN SELECT DISTINCT unnest(venue_ids) ORDER BY 1 LOOP
+    PERFORM pg_advisory_xact_lock(hashtext('shows.venue_id'), entity_id);
+  END LOOP;
+  FOR entity_id IN SELECT DISTINCT unnest(artist_ids) ORDER BY 1 LOOP
+    PERFORM pg_advisory_xact_lock(hashtext('shows.artist_id'), entity_id);
+  END LOOP;
+END
+$$
+"""
+
+# Runs after each INSERT or UPDATE statement on shows, with its rows in
+# new_shows. Once the locks are held, shows committed by other bookings of
+# the same venues and artists are visible, so an overlap with any of them,
+# or between the statement's own rows, is found. The error is the one the
+# exclusion constraints raised (23P01), under the same constraint names.
+CHECK_SLOTS = """
+CREATE FUNCTION shows_check_slots() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  clash record;
+BEGIN
+  PERFORM shows_lock_slots(
+    (SELECT array_agg(venue_id) FROM new_shows), (SELECT array_agg(artist_id) FROM new_shows));
+  SELECT * INTO clash FROM (
+    SELECT n.id, s.id AS other, 'shows_venue_slot_excl' AS constraint_name
+      FROM new_shows n JOIN shows s ON s.venue_id = n.venue_id
+       AND s.start_time < n.end_time AND s.slot && n.slot AND s.id <> n.id
+    UNION ALL
+    SELECT n.id, s.id, 'shows_artist_slot_excl'
+      FROM new_shows n JOIN shows s ON s.artist_id = n.artist_id
+       AND s.start_time < n.end_time AND s.slot && n.slot AND s.id <> n.id
+  ) clashes LIMIT 1;
+  IF FOUND THEN
+    RAISE exclusion_violation USING
+      MESSAGE = format('show %s overlaps show %s', clash.id, clash.other),
+      CONSTRAINT = clash.constraint_name;
+  END IF;
+  RETURN NULL;
+END
+$$
+"""
+
+# 6a3f1d8c2e90's row trigger, for the downgrade.
+CHECK_SLOT = """
+CREATE FUNCTION shows_check_slot() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  clash record;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('shows.venue_id'), NEW.venue_id);
+  PERFORM pg_advisory_xact_lock(hashtext('shows.artist_id'), NEW.artist_id);
+  SELECT id, venue_id INTO clash FROM shows
+   WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id)
+     AND start_time < NEW.end_time
+     AND slot && tsrange(NEW.start_time, NEW.end_time, '[)')
+     AND id <> NEW.id
+   LIMIT 1;
+  IF FOUND THEN
+    RAISE exclusion_violation USING
+      MESSAGE = format('show %s overlaps show %s', NEW.id, clash.id),
+      CONSTRAINT = CASE WHEN clash.venue_id = NEW.venue_id
+                        THEN 'shows_venue_slot_excl' ELSE 'shows_artist_slot_excl' END;
+  END IF;
+  RETURN NEW;
+END
+$$
+"""
+
+
+def upgrade():
+    op.execute('DROP TRIGGER shows_check_slot ON shows')
+    op.execute('DROP FUNCTION shows_check_slot()')
+    op.execute(LOCK_SLOTS)
+    op.execute(CHECK_SLOTS)
+    # A trigger with a transition table takes a single event, and an UPDATE
+    # one can't be limited to columns.
+    for event in ('INSERT', 'UPDATE'):
+        op.execute('CREATE TRIGGER shows_check_slots_%s AFTER %s ON shows REFERENCING NEW TABLE AS new_shows '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION shows_check_slots()' % (event.lower(), event))
+
+
+def downgrade():
+    op.execute('DROP TRIGGER shows_check_slots_insert ON shows')
+    op.execute('DROP TRIGGER shows_check_slots_update ON shows')
+    op.execute('DROP FUNCTION shows_check_slots()')
+    op.execute('DROP FUNCTION shows_lock_slots(integer[], integer[])')
+    op.execute(CHECK_SLOT)
+    op.execute('CREATE TRIGGER shows_check_slot BEFORE INSERT OR UPDATE OF venue_id, artist_id, start_time, end_time '
+               'ON shows FOR EACH ROW EXECUTE FUNCTION shows_check_slot()')
@@ -0,0 +1,87 @@
+"""empty message
+
+Revision ID: f3a8c6d2b917
+Revises: e1f4b7a93c28
+Create Date: 2021-07-14 10:42:37.219405
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c6d2b917'
+down_revision = 'e1f4b7a93c28'
+branch_labels = None
+depends_on = None
+
+
+# shows_check_slots() only bounded start_time from above, so every booking
+# probed the partitions of every earlier month. With shows capped at 24
+# hours, a show overlapping one that starts at t must start after t - 24
+# hours, and the lookups are pruned to the months around the new rows.
+CHECK_SLOTS = """
+CREATE OR REPLACE FUNCTION shows_check_slots() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  clash record;
+BEGIN
+  PERFORM shows_lock_slots(
+    (SELECT array_agg(venue_id) FROM new_shows), (SELECT array_agg(artist_id) FROM new_shows));
+  SELECT * INTO clash FROM (
+    SELECT n.id, s.id AS other, 'shows_venue_slot_excl' AS constraint_name
+      FROM new_shows n JOIN shows s ON s.venue_id = n.venue_id
+       AND s.start_time < n.end_time AND s.start_time > n.start_time - interval '24 hours'
+       AND s.slot && n.slot AND s.id <> n.id
+    UNION ALL
+    SELECT n.id, s.id, 'shows_artist_slot_excl'
+      FROM new_shows n JOIN shows s ON s.artist_id = n.artist_id
+       AND s.start_time < n.end_time AND s.start_time > n.start_time - interval '24 hours'
+       AND s.slot && n.slot AND s.id <> n.id
+  ) clashes LIMIT 1;
+  IF FOUND THEN
+    RAISE exclusion_violation USING
+      MESSAGE = format('show %s overlaps show %s', clash.id, clash.other),
+      CONSTRAINT = clash.constraint_name;
+  END IF;
+  RETURN NULL;
+END
+$$
+"""
+
+# e1f4b7a93c28's function, for the downgrade.
+PREVIOUS_CHECK_SLOTS = """
+CREATE OR REPLACE FUNCTION shows_check_slots() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  clash record;
+BEGIN
+  PERFORM shows_lock_slots(
+    (SELECT array_agg(venue_id) FROM new_shows), (SELECT array_agg(artist_id) FROM new_shows));
+  SELECT * INTO clash FROM (
+    SELECT n.id, s.id AS other, 'shows_venue_slot_excl' AS constraint_name
+      FROM new_shows n JOIN shows s ON s.venue_id = n.venue_id
+       AND s.start_time < n.end_time AND s.slot && n.slot AND s.id <> n.id
+    UNION ALL
+    SELECT n.id, s.id, 'shows_artist_slot_excl'
+      FROM new_shows n JOIN shows s ON s.artist_id = n.artist_id
+       AND s.start_time < n.end_time AND s.slot && n.slot AND s.id <> n.id
+  ) clashes LIMIT 1;
+  IF FOUND THEN
+    RAISE exclusion_violation USING
+      MESSAGE = format('show %s overlaps show %s', clash.id, clash.other),
+      CONSTRAINT = clash.constraint_name;
+  END IF;
+  RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade():
+    # Added to every partition, and copied to new months by create_partition().
+    op.create_check_constraint('shows_max_duration', 'shows', "end_time <= start_time + interval '24 hours'")
+    op.execute(CHECK_SLOTS)
+
+
+def downgrade():
+    op.execute(PREVIOUS_CHECK_SLOTS)
+    op.drop_constraint('shows_max_duration', 'shows', type_='check')
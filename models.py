@@ -1,22 +1,14 @@
-from flask import Flask
-from flask_migrate import Migrate
-from flask_moment import Moment 
-from flask_sqlalchemy import SQLAlchemy
+from database import RoutingSQLAlchemy
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSRANGE
 import datetime
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Database.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-db = SQLAlchemy(app)
-
-migrate = Migrate(app, db)
-
-# DONE: connect to a local postgresql database
+# Bound to an application by create_app() in app.py; importing the models
+# doesn't build an app or read any configuration.
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -37,7 +29,23 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
     genres = db.Column('genres', db.ARRAY(db.String(20)))
-    shows = db.relationship('Show', backref='venue_shows', lazy='joined')
+    # Lowercased name, city, state and genres, kept up to date by the
+    # search_document_update() trigger and indexed with pg_trgm for search.
+    search_document = db.deferred(db.Column(db.Text))
+    # Set on insert and on every UPDATE issued through SQLAlchemy; page
+    # revisions (revisions.py) are built from it.
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+                           server_default=db.func.now(), onupdate=db.func.now())
+    # Loaded lazily by default; views that render shows opt in to eager
+    # loading with selectinload()/joinedload() in their own queries.
+    shows = db.relationship('Show', backref=db.backref('venue_shows', lazy='select'), lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_venues_search_document', 'search_document',
+                 postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}),
+        # genres && ARRAY[...] lookups of the availability search.
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+    )
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
@@ -55,16 +63,167 @@ class Artist(db.Model):
     website = db.Column(db.String(100))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
-    shows = db.relationship('Show', backref='artist_shows', lazy='joined')
+    search_document = db.deferred(db.Column(db.Text))
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+                           server_default=db.func.now(), onupdate=db.func.now())
+    shows = db.relationship('Show', backref=db.backref('artist_shows', lazy='select'), lazy='select')
+
+    __table_args__ = (
+        db.Index('ix_artists_search_document', 'search_document',
+                 postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+    )
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
+SHOW_DURATION = datetime.timedelta(hours=2)
+# The longest a show can run. The slot check relies on it: a show that
+# overlaps one starting at t must itself start after t - MAX_SHOW_DURATION,
+# which bounds its lookups on both sides and prunes the partitions before.
+MAX_SHOW_DURATION = datetime.timedelta(hours=24)
+
+def default_end_time(context):
+  return context.get_current_parameters()['start_time'] + SHOW_DURATION
+
 class Show(db.Model):
   __tablename__ = 'shows'
+  # Range-partitioned by month of start_time (see partitions.py), so
+  # lookups on one side of now() are pruned to the partitions they can
+  # match. Postgres wants the partition key in the primary key.
+  # Upcoming/past lookups always filter on one side of the relationship
+  # and compare start_time, so index both pairs together.
+  __table_args__ = (
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    # Seek index for the keyset-paginated /shows listing.
+    db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    # A venue or an artist can't be booked twice for overlapping slots.
+    # Exclusion constraints don't span partitions, so the shows_check_slots
+    # triggers enforce it; these GiST indexes serve their lookups and those in
+    # booking.py (needs the btree_gist extension for the = on ids).
+    db.Index('ix_shows_venue_id_slot', 'venue_id', 'slot', postgresql_using='gist'),
+    db.Index('ix_shows_artist_id_slot', 'artist_id', 'slot', postgresql_using='gist'),
+    db.CheckConstraint('end_time > start_time', name='shows_end_after_start'),
+    db.CheckConstraint("end_time <= start_time + interval '24 hours'", name='shows_max_duration'),
+    {'postgresql_partition_by': 'RANGE (start_time)'},
+  )
 
-  id = db.Column(db.Integer, primary_key=True)
+  id = db.Column(db.Integer, primary_key=True, autoincrement=True)
   venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
   artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
-  start_time = db.Column(db.DateTime, nullable=False)
+  start_time = db.Column(db.DateTime, primary_key=True)
+  end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+  # [start_time, end_time), maintained by Postgres.
+  slot = db.deferred(db.Column(TSRANGE, db.Computed("tsrange(start_time, end_time, '[)')", persisted=True)))
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+                         server_default=db.func.now(), onupdate=db.func.now())
+
+class VenueStats(db.Model):
+    # Show counts per venue, maintained by stats.py so listings can read them
+    # without counting shows. Upcoming shows become past ones as time passes;
+    # next_show_at tells the roll job which rows are due.
+    __tablename__ = 'venue_stats'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0)
+    past_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    last_show_at = db.Column(db.DateTime)
+
+class ArtistStats(db.Model):
+    __tablename__ = 'artist_stats'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0)
+    past_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    last_show_at = db.Column(db.DateTime)
+
+class VenuePage(db.Model):
+    # Everything the default venue page shows, as one JSON document built by
+    # documents.py, so the page is rendered from a primary key read.
+    # listed_ids are the artists on the page (to rebuild it when one of them
+    # changes); valid_until is the start of its first upcoming show, when the
+    # document goes stale.
+    __tablename__ = 'venue_pages'
+
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True)
+    document = db.Column(JSONB, nullable=False)
+    listed_ids = db.Column(ARRAY(db.Integer), nullable=False)
+    valid_until = db.Column(db.DateTime, index=True)
+
+    __table_args__ = (
+        db.Index('ix_venue_pages_listed_ids', 'listed_ids', postgresql_using='gin'),
+    )
+
+class ArtistPage(db.Model):
+    __tablename__ = 'artist_pages'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True)
+    document = db.Column(JSONB, nullable=False)
+    listed_ids = db.Column(ARRAY(db.Integer), nullable=False)
+    valid_until = db.Column(db.DateTime, index=True)
+
+    __table_args__ = (
+        db.Index('ix_artist_pages_listed_ids', 'listed_ids', postgresql_using='gin'),
+    )
+
+class Job(db.Model):
+    # Background work queued by requests and run by `flask jobs work`; see
+    # jobs.py. status goes queued -> running -> done, or back to queued for a
+    # retry, and ends as failed when attempts run out.
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    args = db.Column(JSONB, nullable=False)
+    # Jobs with the same key do the same work: only one of them is queued
+    # at a time.
+    key = db.Column(db.String(255))
+    status = db.Column(db.String(16), nullable=False, server_default='queued')
+    attempts = db.Column(db.Integer, nullable=False, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.Text)
+    queued_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    run_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+    started_at = db.Column(db.DateTime(timezone=True))
+    finished_at = db.Column(db.DateTime(timezone=True), index=True)
+    # A running job whose worker died is queued again after this.
+    locked_until = db.Column(db.DateTime(timezone=True))
+
+    __table_args__ = (
+        db.Index('ux_jobs_key_queued', 'key', unique=True, postgresql_where=db.text("status = 'queued'")),
+        # The workers' claim query: the next queued job that is due.
+        db.Index('ix_jobs_queued_run_at', 'run_at', 'id', postgresql_where=db.text("status = 'queued'")),
+        db.Index('ix_jobs_running_locked_until', 'locked_until', postgresql_where=db.text("status = 'running'")),
+    )
+
+class Image(db.Model):
+    # A venue or artist image_link and its thumbnails, fetched by a
+    # fetch_image job (images.py). key is derived from the url, so templates
+    # can link to a thumbnail without looking it up. status is pending until
+    # the fetch, then ok, or broken when the link doesn't give an image.
+    __tablename__ = 'images'
+
+    key = db.Column(db.String(32), primary_key=True)
+    url = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, server_default='pending')
+    # Size name -> sha256 of the stored JPEG.
+    thumbnails = db.Column(JSONB)
+    error = db.Column(db.Text)
+    fetched_at = db.Column(db.DateTime(timezone=True))
+
+class ImportCheckpoint(db.Model):
+    # Progress of a `flask import` run (importer.py), keyed by the absolute
+    # path of the file. Written in the transaction of each batch, so it never
+    # disagrees with the rows that batch committed.
+    __tablename__ = 'import_checkpoints'
+
+    key = db.Column(db.Text, primary_key=True)
+    line = db.Column(db.Integer, nullable=False)
+    inserted = db.Column(db.Integer, nullable=False)
+    rejected = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False,
+                           server_default=db.func.now(), onupdate=db.func.now())
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -0,0 +1,51 @@
+import datetime
+from types import SimpleNamespace
+from flask import render_template, request, session
+from sqlalchemy import inspect
+
+#----------------------------------------------------------------------------#
+# Page helpers shared by the blueprints and asgi.py.
+#----------------------------------------------------------------------------#
+
+
+def show_summary(show):
+  # Plain dict for the show tiles, so templates never write to ORM objects.
+  # start_time stays a datetime and is formatted once by the datetime filter.
+  return {
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_shows.name,
+    "venue_image_link": show.venue_shows.image_link,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_shows.name,
+    "artist_image_link": show.artist_shows.image_link,
+    "start_time": show.start_time
+  }
+
+def render_detail(template, name, data, stats, upcoming_page, past_page):
+  # Renders a venue or artist page; shared with the async detail pages in asgi.py.
+  # The template gets a plain object of the entity's loaded columns and its
+  # shows, as load_page() builds from a document, so nothing is written to
+  # the ORM instance. Counts come from the maintained venue_stats/artist_stats
+  # row rather than COUNT queries.
+  unloaded = inspect(data).unloaded
+  page = SimpleNamespace(
+    **{column.key: getattr(data, column.key) for column in data.__table__.columns if column.key not in unloaded},
+    upcoming_shows=[show_summary(show) for show in upcoming_page.items],
+    past_shows=[show_summary(show) for show in past_page.items],
+    upcoming_shows_count=stats.upcoming_count if stats else 0,
+    past_shows_count=stats.past_count if stats else 0,
+    upcoming_page=upcoming_page,
+    past_page=past_page
+  )
+  return render_template(template, **{name: page})
+
+def cacheable_page():
+  # Only the default view of a detail page is cached; paged views and
+  # responses that will show flashed messages are always rendered.
+  return not request.args and not session.get('_flashes')
+
+def page_timeout(upcoming_page):
+  # A cached page goes stale when its next upcoming show moves into the past.
+  if not upcoming_page.items:
+    return None
+  return (upcoming_page.items[0].start_time - datetime.datetime.now()).total_seconds()
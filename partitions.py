@@ -0,0 +1,178 @@
+import datetime
+import gzip
+import os
+import re
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+from models import db
+from stats import refresh_stats
+from documents import refresh_pages
+from cache import invalidate_shows
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#
+# shows is range-partitioned by start_time, one partition per calendar month
+# (shows_2021_06 holds June 2021), plus shows_default for shows outside all
+# of them. Queries comparing start_time with now() -- upcoming and past
+# pages, the /shows listing, the stats roll -- only scan the months they can
+# match.
+#
+#   * ensure_partitions() creates the months up to PARTITIONS_AHEAD ahead,
+#     and the months of earlier shows that landed in shows_default,
+#   * archive_partitions() detaches the months that ended before a cutoff,
+#     writes each one to a gzipped CSV file and drops it.
+#----------------------------------------------------------------------------#
+
+PARTITIONS_AHEAD = 12
+PARTITION_NAME = re.compile(r'^shows_(\d{4})_(\d{2})$')
+COLUMNS = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time', 'updated_at')
+
+
+def month_of(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month):
+    return 'shows_%04d_%02d' % (month.year, month.month)
+
+
+def partitions():
+    # (name, month, attached) of every monthly table, oldest first; months
+    # detached with --detach-only are still around until they are archived.
+    months = []
+    for name, attached in db.session.execute(text(
+        "SELECT relname, relispartition FROM pg_class "
+        "WHERE relkind = 'r' AND relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'shows'::regclass)"
+    )):
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append((name, datetime.datetime(int(match.group(1)), int(match.group(2)), 1), attached))
+    return sorted(months, key=lambda partition: partition[1])
+
+
+def create_partition(month):
+    # Postgres won't attach a partition while shows_default holds rows that
+    # belong in it, so the month is built as a plain table, those rows are
+    # moved over, and then it is attached. Indexes and the slot trigger are
+    # added to it by the attach.
+    name, until = partition_name(month), next_month(month)
+    columns = ', '.join(COLUMNS)
+    db.session.execute(text('CREATE TABLE %s (LIKE shows INCLUDING DEFAULTS INCLUDING GENERATED '
+                            'INCLUDING CONSTRAINTS)' % name))
+    db.session.execute(text(
+        'WITH moved AS (DELETE FROM shows_default WHERE start_time >= :month AND start_time < :until '
+        'RETURNING %s) INSERT INTO %s (%s) SELECT %s FROM moved' % (columns, name, columns, columns)
+    ), {'month': month, 'until': until})
+    db.session.execute(text("ALTER TABLE shows ATTACH PARTITION %s FOR VALUES FROM ('%s') TO ('%s')"
+                            % (name, month.isoformat(), until.isoformat())))
+    return name
+
+
+def ensure_partitions(ahead=PARTITIONS_AHEAD):
+    # Creates the missing months from the earliest show in shows_default (or
+    # this month) up to `ahead` months from now; returns their names.
+    month = month_of(datetime.datetime.now())
+    earliest = db.session.execute(text('SELECT min(start_time) FROM shows_default')).scalar()
+    if earliest is not None and earliest < month:
+        month = month_of(earliest)
+    until = month_of(datetime.datetime.now())
+    for _ in range(ahead + 1):
+        until = next_month(until)
+
+    existing = {partition_month for _, partition_month, _ in partitions()}
+    created = []
+    while month < until:
+        if month not in existing:
+            created.append(create_partition(month))
+        month = next_month(month)
+    db.session.commit()
+    return created
+
+
+def write_archive(name, path):
+    # COPY straight from Postgres into a gzipped CSV; written to a temporary
+    # name first, so a file at `path` is always complete.
+    tmp = path + '.tmp'
+    cursor = db.session.connection().connection.cursor()
+    try:
+        with gzip.open(tmp, 'wt') as f:
+            cursor.copy_expert('COPY %s (%s) TO STDOUT WITH (FORMAT csv, HEADER)' % (name, ', '.join(COLUMNS)), f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    finally:
+        cursor.close()
+
+
+def archive_partitions(before, directory=None):
+    # Takes every monthly partition that ended by `before` out of shows. The
+    # counts and page documents of its venues and artists are recomputed in
+    # the same short transaction as the detach. With a directory, each month
+    # (including ones detached earlier) is then written to
+    # <directory>/<name>.csv.gz and dropped; without one it stays around as a
+    # table of its own. Returns (name, shows, path) per month.
+    archived = []
+    for name, month, attached in partitions():
+        if next_month(month) > before:
+            break
+        if not attached and not directory:
+            continue
+        venue_ids, artist_ids, count = db.session.execute(text(
+            'SELECT array_agg(DISTINCT venue_id), array_agg(DISTINCT artist_id), count(*) FROM %s' % name
+        )).first()
+        if attached:
+            db.session.execute(text('ALTER TABLE shows DETACH PARTITION %s' % name))
+            refresh_stats(venue_ids or [], artist_ids or [])
+            refresh_pages(venue_ids or [], artist_ids or [])
+            db.session.commit()
+            invalidate_shows(venue_ids or [], artist_ids or [])
+
+        path = None
+        if directory:
+            path = os.path.join(directory, name + '.csv.gz')
+            write_archive(name, path)
+            db.session.execute(text('DROP TABLE %s' % name))
+            db.session.commit()
+        archived.append((name, count, path))
+    return archived
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+shows_cli = AppGroup('shows', help='Maintain the monthly partitions of the shows table.')
+
+
+@shows_cli.command('partitions')
+@click.option('--ahead', type=int, default=PARTITIONS_AHEAD, help='Months ahead of this one to create.')
+def partitions_command(ahead):
+    """Create the monthly partitions that are missing."""
+    created = ensure_partitions(ahead)
+    click.echo('Created %d partitions%s' % (len(created), (': ' + ', '.join(created)) if created else '.'))
+
+
+@shows_cli.command('archive')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m']), required=True,
+              help='Archive the months before this one (YYYY-MM).')
+@click.option('--to', 'directory', type=click.Path(file_okay=False, writable=True),
+              help='Write each month to DIRECTORY/<partition>.csv.gz and drop it.')
+@click.option('--detach-only', is_flag=True, help='Only detach the months, keeping them as tables.')
+def archive_command(before, directory, detach_only):
+    """Take past months out of the shows table."""
+    if bool(directory) == detach_only:
+        raise click.UsageError('Give either --to DIRECTORY or --detach-only.')
+    if before > month_of(datetime.datetime.now()):
+        raise click.UsageError('Only months that have already ended can be archived.')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    for name, count, path in archive_partitions(before, directory):
+        click.echo('%s: %d shows %s' % (name, count, 'written to %s' % path if path else 'detached'))
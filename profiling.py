@@ -0,0 +1,157 @@
+import hmac
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL profiling.
+#----------------------------------------------------------------------------#
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r'%\(\w+\)s')
+_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACE = re.compile(r'\s+')
+UNMATCHED = '<unmatched>'
+
+
+def statement_shape(statement):
+    # Reduces a statement to its shape so that the same query issued with
+    # different parameters counts as a repeat.
+    shape = _PARAMS.sub('?', statement)
+    shape = _LITERALS.sub('?', shape)
+    shape = _LISTS.sub('(?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def has_debug_token():
+    # True when the request sends DEBUG_STATS_TOKEN as its X-Debug-Token.
+    token = current_app.config.get('DEBUG_STATS_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token)
+
+
+class StatementCounter:
+    # Counts the statements an engine runs inside the with block, for tests
+    # and benchmarks.
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class SQLProfiler:
+    # Times every statement run through any SQLAlchemy engine while a request
+    # is being handled, and keeps running totals per endpoint. The request's
+    # own numbers go out in a Server-Timing header only in debug mode or to
+    # requests carrying the debug token.
+
+    def __init__(self, app=None):
+        self.endpoints = defaultdict(lambda: {
+            'requests': 0, 'statements': 0, 'db_ms': 0.0, 'max_db_ms': 0.0, 'repeated': 0
+        })
+        self.slowest = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['sql_profiler'] = self
+        app.config.setdefault('SQL_PROFILE', True)
+        app.config.setdefault('SQL_SLOW_REQUEST_MS', 200)
+        app.config.setdefault('SQL_REPEATED_STATEMENT_THRESHOLD', 10)
+        app.config.setdefault('SQL_SLOWEST_KEPT', 10)
+        if not app.config['SQL_PROFILE']:
+            return
+        # The listeners are global; a second app (tests, CLI) must not add them again.
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+        app.after_request(self._after_request)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or not conn.info.get('profile_started'):
+            return
+        elapsed = (time.perf_counter() - conn.info['profile_started'].pop()) * 1000
+        if 'sql_profile' not in g:
+            g.sql_profile = []
+        g.sql_profile.append((statement, elapsed))
+
+    def _handle_error(self, context):
+        # A statement that raised never reaches _after_cursor_execute; drop
+        # its start time so the next statement on the connection is not
+        # timed from it.
+        if context.connection is not None and context.connection.info.get('profile_started'):
+            context.connection.info['profile_started'].pop()
+
+    def _after_request(self, response):
+        statements = g.pop('sql_profile', [])
+        count = len(statements)
+        total = sum(elapsed for _, elapsed in statements)
+        threshold = current_app.config['SQL_REPEATED_STATEMENT_THRESHOLD']
+        repeated = [
+            (shape, times) for shape, times
+            in Counter(statement_shape(statement) for statement, _ in statements).most_common()
+            if times > threshold
+        ]
+
+        # URLs that match no route (scanners, typos) share one entry, so
+        # they can't grow the totals without bound.
+        endpoint = request.endpoint or UNMATCHED
+        with self._lock:
+            totals = self.endpoints[endpoint]
+            totals['requests'] += 1
+            totals['statements'] += count
+            totals['db_ms'] += total
+            totals['max_db_ms'] = max(totals['max_db_ms'], total)
+            totals['repeated'] += len(repeated)
+            for statement, elapsed in statements:
+                self.slowest.append((elapsed, endpoint, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[current_app.config['SQL_SLOWEST_KEPT']:]
+
+        if total > current_app.config['SQL_SLOW_REQUEST_MS']:
+            current_app.logger.warning('Slow request %s %s: %d statements, %.1f ms in the database',
+                                    request.method, request.full_path, count, total)
+        for shape, times in repeated:
+            current_app.logger.warning('Possible N+1 in %s %s: statement repeated %d times: %s',
+                                    request.method, request.full_path, times, shape)
+
+        if current_app.debug or has_debug_token():
+            response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d statements"' % (total, count))
+            # Shared caches must not hand this response to other clients.
+            response.vary.add('X-Debug-Token')
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'endpoints': {
+                    endpoint: dict(totals,
+                                   avg_statements=totals['statements'] / totals['requests'],
+                                   avg_db_ms=totals['db_ms'] / totals['requests'])
+                    for endpoint, totals in self.endpoints.items()
+                },
+                'slowest': [
+                    {'ms': elapsed, 'endpoint': endpoint, 'statement': statement}
+                    for elapsed, endpoint, statement in self.slowest
+                ]
+            }
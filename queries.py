@@ -0,0 +1,143 @@
+import base64
+import datetime
+import json
+from collections import namedtuple
+from itertools import groupby
+from sqlalchemy import func, tuple_
+from models import db, Venue, Artist, Show, VenueStats
+
+SEARCH_PAGE_SIZE = 20
+SHOWS_PAGE_SIZE = 24
+
+#----------------------------------------------------------------------------#
+# Venue queries.
+#----------------------------------------------------------------------------#
+
+def venues_with_upcoming_counts(*criteria):
+    # One row per venue with its number of upcoming shows, read from
+    # venue_stats (see stats.py) instead of counting shows per request.
+    # Venues without a stats row yet count as having none.
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        func.coalesce(VenueStats.upcoming_count, 0).label('num_upcoming_shows')
+    ).outerjoin(VenueStats, VenueStats.venue_id == Venue.id) \
+     .filter(*criteria)
+
+
+def venue_areas():
+    # Builds the area -> venues -> num_upcoming_shows tree for /venues from a
+    # single statement, grouping by (state, city) in Python.
+    rows = venues_with_upcoming_counts().order_by(Venue.state, Venue.city, Venue.id)
+
+    areas = []
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [
+                {"id": venue.id, "name": venue.name, "num_upcoming_shows": venue.num_upcoming_shows}
+                for venue in venues
+            ]
+        })
+    return areas
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def _search_criteria(model, search_term):
+    # Every word of the term has to appear somewhere in the name, city, state
+    # or genres. Each ILIKE is answered by the trigram index on search_document,
+    # so "San Francisco, CA" matches without scanning the table.
+    criteria = []
+    for word in search_term.replace(',', ' ').split():
+        word = word.replace('/', '//').replace('%', '/%').replace('_', '/_')
+        criteria.append(model.search_document.ilike('%' + word + '%', escape='/'))
+    return criteria
+
+
+def find_venues(search_term, page=1, per_page=SEARCH_PAGE_SIZE):
+    rank = func.word_similarity(search_term, Venue.search_document)
+    return venues_with_upcoming_counts(*_search_criteria(Venue, search_term)) \
+        .order_by(rank.desc(), Venue.name) \
+        .paginate(page, per_page, error_out=False)
+
+
+def find_artists(search_term, page=1, per_page=SEARCH_PAGE_SIZE):
+    rank = func.word_similarity(search_term, Artist.search_document)
+    return Artist.query.with_entities(Artist.id, Artist.name) \
+        .filter(*_search_criteria(Artist, search_term)) \
+        .order_by(rank.desc(), Artist.name) \
+        .paginate(page, per_page, error_out=False)
+
+
+#----------------------------------------------------------------------------#
+# Show pagination.
+#----------------------------------------------------------------------------#
+
+ShowPage = namedtuple('ShowPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(direction, show):
+    position = [direction, show.start_time.isoformat(), show.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Cursors come from the query string, so anything unreadable simply
+    # starts from the first page.
+    try:
+        direction, start_time, show_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return direction, (datetime.datetime.fromisoformat(start_time), int(show_id))
+    except (AttributeError, TypeError, ValueError):
+        return None, None
+
+
+def seek_shows(query, upcoming, cursor=None, per_page=SHOWS_PAGE_SIZE):
+    # Keyset pagination over (start_time, id). Upcoming shows are listed
+    # soonest first and past shows latest first; a cursor seeks straight to
+    # its position, so deep pages cost the same as the first one. Works on
+    # ORM queries and on select() statements; returns the limited query and
+    # what paged_shows() needs to build the page from its rows.
+    now = datetime.datetime.now()
+    if upcoming:
+        query = query.filter(Show.start_time > now)
+    else:
+        query = query.filter(Show.start_time <= now)
+
+    direction, position = decode_cursor(cursor)
+    backwards = direction == 'before'
+    ascending = upcoming != backwards
+
+    key = tuple_(Show.start_time, Show.id)
+    if position:
+        query = query.filter(key > position if ascending else key < position)
+    if ascending:
+        query = query.order_by(Show.start_time, Show.id)
+    else:
+        query = query.order_by(Show.start_time.desc(), Show.id.desc())
+    return query.limit(per_page + 1), position, backwards
+
+
+def paged_shows(shows, position, backwards, per_page=SHOWS_PAGE_SIZE):
+    has_more = len(shows) > per_page
+    shows = shows[:per_page]
+    if backwards:
+        shows.reverse()
+
+    has_next = has_more if not backwards else position is not None
+    has_prev = has_more if backwards else position is not None
+    return ShowPage(
+        shows,
+        encode_cursor('after', shows[-1]) if shows and has_next else None,
+        encode_cursor('before', shows[0]) if shows and has_prev else None
+    )
+
+
+def show_page(query, upcoming, cursor=None, per_page=SHOWS_PAGE_SIZE):
+    query, position, backwards = seek_shows(query, upcoming, cursor, per_page)
+    return paged_shows(query.all(), position, backwards, per_page)
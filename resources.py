@@ -0,0 +1,124 @@
+import datetime
+from forms import VenueForm, ArtistForm
+from models import Venue, Artist, Show, MAX_SHOW_DURATION
+from cache import invalidate_venues, invalidate_artists, invalidate_shows
+from documents import refresh_pages_for_venues, refresh_pages_for_artists, refresh_pages_for_shows
+from booking import end_time_for
+from images import queue_images
+
+#----------------------------------------------------------------------------#
+# Resources.
+#----------------------------------------------------------------------------#
+
+class Resource:
+    # Describes how one model is exposed: which columns can be read and
+    # written, and how incoming rows are validated.
+
+    def __init__(self, model, fields, form=None, form_names=None, invalidate=None,
+                 refresh=None):
+        self.model = model
+        self.fields = fields
+        self.form = form
+        # API field -> form field, where the two differ.
+        self.form_names = form_names or {}
+        self.invalidate = invalidate
+        # Rebuilds the page documents showing the rows, and queues the
+        # thumbnails of their images, in their transaction.
+        self.refresh = refresh
+
+    def columns(self, fields):
+        return [getattr(self.model, field) for field in fields]
+
+    def validate(self, row, only=None):
+        # Runs a complete row through the same form the HTML pages use, so
+        # the API accepts exactly what the create/edit forms accept. With
+        # only (the fields a PATCH changes), errors on the other fields are
+        # ignored: stored values the form wouldn't take, such as an empty
+        # facebook_link, must not block an unrelated change.
+        unknown = set(row) - set(self.fields) - {'id'}
+        if unknown:
+            return None, {field: ['Unknown field.'] for field in unknown}
+        data = {self.form_names.get(field, field): value for field, value in row.items()}
+        form = self.form(formdata=None, data=data)
+        if not form.validate():
+            names = None if only is None else {self.form_names.get(field, field) for field in only}
+            errors = {name: messages for name, messages in form.errors.items() if names is None or name in names}
+            if errors:
+                return None, errors
+        values = {field: form[self.form_names.get(field, field)].data
+                  for field in self.fields if field != 'id' and self.form_names.get(field, field) in form}
+        return values, None
+
+
+class ShowResource(Resource):
+
+    def validate(self, row, only=None):
+        values, errors = {}, {}
+        for field in set(row) - {'id'}:
+            if field not in self.fields:
+                errors[field] = ['Unknown field.']
+        for field in ('venue_id', 'artist_id'):
+            try:
+                values[field] = int(row[field])
+            except (KeyError, TypeError, ValueError):
+                errors[field] = ['Must be an integer id.']
+        try:
+            values['start_time'] = datetime.datetime.fromisoformat(row['start_time'])
+        except (KeyError, TypeError, ValueError):
+            errors['start_time'] = ['Must be an ISO 8601 date and time.']
+        try:
+            if row.get('end_time') is not None:
+                values['end_time'] = datetime.datetime.fromisoformat(row['end_time'])
+        except (TypeError, ValueError):
+            errors['end_time'] = ['Must be an ISO 8601 date and time.']
+        if errors:
+            return None, errors
+        # Every row gets an explicit end_time so bulk inserts share one shape.
+        values['end_time'] = end_time_for(values['start_time'], values.get('end_time'))
+        if values['end_time'] <= values['start_time']:
+            return None, {'end_time': ['Must be after start_time.']}
+        if values['end_time'] - values['start_time'] > MAX_SHOW_DURATION:
+            return None, {'end_time': ['Must be at most 24 hours after start_time.']}
+        return values, None
+
+
+def _refresh_venues(rows):
+    refresh_pages_for_venues([row['id'] for row in rows])
+    queue_images([row.get('image_link') for row in rows])
+
+
+def _refresh_artists(rows):
+    refresh_pages_for_artists([row['id'] for row in rows])
+    queue_images([row.get('image_link') for row in rows])
+
+
+def _invalidate_shows(rows):
+    invalidate_shows([row['venue_id'] for row in rows], [row['artist_id'] for row in rows])
+
+
+RESOURCES = {
+    'venues': Resource(
+        Venue,
+        ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+         'facebook_link', 'website', 'seeking_talent', 'seeking_description'),
+        form=VenueForm,
+        form_names={'website': 'website_link'},
+        invalidate=lambda rows: invalidate_venues(*[row['id'] for row in rows]),
+        refresh=_refresh_venues
+    ),
+    'artists': Resource(
+        Artist,
+        ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+         'facebook_link', 'website', 'seeking_venue', 'seeking_description'),
+        form=ArtistForm,
+        form_names={'website': 'website_link'},
+        invalidate=lambda rows: invalidate_artists(*[row['id'] for row in rows]),
+        refresh=_refresh_artists
+    ),
+    'shows': ShowResource(
+        Show,
+        ('id', 'venue_id', 'artist_id', 'start_time', 'end_time'),
+        invalidate=_invalidate_shows,
+        refresh=refresh_pages_for_shows
+    ),
+}
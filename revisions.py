@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, g, make_response, request, session
+from sqlalchemy import func, select, true
+from werkzeug.http import is_resource_modified
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats
+from assets import assets
+
+#----------------------------------------------------------------------------#
+# Page revisions.
+#
+# A revision is a weak ETag and a Last-Modified date for a page, computed
+# from updated_at columns, counts and the next show start with one small
+# query. conditional_page() answers If-None-Match/If-Modified-Since with a
+# 304 before the view runs, so an unchanged page is never rendered.
+#----------------------------------------------------------------------------#
+
+Revision = namedtuple('Revision', ['etag', 'last_modified'])
+
+DETAILS = {
+    # kind: (model, stats model, stats key, show key, model on the other side, its show key)
+    'venue': (Venue, VenueStats, VenueStats.venue_id, Show.venue_id, Artist, Show.artist_id),
+    'artist': (Artist, ArtistStats, ArtistStats.artist_id, Show.artist_id, Venue, Show.venue_id),
+}
+
+
+def _utc(value):
+    # HTTP dates are naive UTC in werkzeug. Show times are naive local time.
+    if value is None:
+        return None
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def revision(parts, changes):
+    # parts is everything the page shows that can change; changes are the
+    # times it last changed. The release is mixed in so a deploy with new
+    # templates or assets changes every ETag.
+    etag = hashlib.sha1(repr((assets.version(),) + tuple(parts)).encode()).hexdigest()[:20]
+    changes = [_utc(change) for change in changes if change is not None]
+    return Revision(etag, max(changes) if changes else None)
+
+
+def detail_statement(kind, entity_id):
+    # The entity's own revision, its stats row, and over its shows: how many,
+    # when a show or the act/venue it lists last changed, and when the next
+    # upcoming show starts (the page changes when it moves into the past).
+    model, stats, stats_key, show_key, other, other_key = DETAILS[kind]
+    now = datetime.datetime.now()
+    shows = select(
+        func.count(Show.id).label('count'),
+        func.max(func.greatest(Show.updated_at, other.updated_at)).label('shows_updated_at'),
+        func.min(Show.start_time).filter(Show.start_time > now).label('next_start'),
+        func.max(Show.start_time).filter(Show.start_time <= now).label('last_start'),
+    ).join(other, other.id == other_key).where(show_key == entity_id).subquery()
+    return select(
+        model.updated_at, stats.upcoming_count, stats.past_count,
+        shows.c.count, shows.c.shows_updated_at, shows.c.next_start, shows.c.last_start,
+    ).outerjoin(stats, stats_key == model.id) \
+     .join(shows, true()) \
+     .where(model.id == entity_id)
+
+
+def detail_revision(row):
+    # Stats counts change when `flask stats roll` runs, a little after the
+    # show that moved; the ETag covers that, Last-Modified alone doesn't.
+    if row is None:
+        return None
+    return revision(row, [row.updated_at, row.shows_updated_at, row.last_start])
+
+
+def venue_revision(venue_id):
+    return detail_revision(db.session.execute(detail_statement('venue', venue_id)).first())
+
+
+def artist_revision(artist_id):
+    return detail_revision(db.session.execute(detail_statement('artist', artist_id)).first())
+
+
+def venues_revision():
+    # /venues lists every venue with its upcoming show count.
+    row = db.session.query(
+        func.count(Venue.id),
+        func.max(Venue.updated_at),
+        select(func.sum(VenueStats.upcoming_count)).scalar_subquery(),
+        select(func.max(Show.updated_at)).scalar_subquery(),
+    ).one()
+    return revision(row, [row[1], row[3]])
+
+
+def artists_revision():
+    row = db.session.query(func.count(Artist.id), func.max(Artist.updated_at)).one()
+    return revision(row, [row[1]])
+
+
+#----------------------------------------------------------------------------#
+# Conditional responses.
+#----------------------------------------------------------------------------#
+
+def with_revision(response, revision):
+    response.set_etag(revision.etag, weak=True)
+    if revision.last_modified is not None:
+        response.last_modified = revision.last_modified
+    # Browsers and the CDN may keep the page, but revalidate it after
+    # PAGE_MAX_AGE seconds (every time, by default).
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('PAGE_MAX_AGE', 0)
+    response.cache_control.must_revalidate = True
+    # Flashed messages from the session would change the page.
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(revision):
+    return not is_resource_modified(request.environ, revision.etag, last_modified=revision.last_modified)
+
+
+def page_version():
+    # ETag of the page being rendered by a conditional_page view, if any.
+    revision = g.get('page_revision')
+    return revision.etag if revision is not None else None
+
+
+def conditional_page(revision_of):
+    # Decorates a GET view. revision_of takes the view's arguments and returns
+    # a Revision, or None to let the view handle the request (e.g. a 404).
+    # Pages that will show flashed messages are always rendered and never
+    # tagged.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if session.get('_flashes'):
+                return view(**kwargs)
+            revision = revision_of(**kwargs)
+            if revision is None:
+                return view(**kwargs)
+            if not_modified(revision):
+                return with_revision(current_app.response_class(status=304), revision)
+            # The view keys its page cache entry on it (see page_version()).
+            g.page_revision = revision
+            response = make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
+            return with_revision(response, revision)
+        return wrapper
+    return decorator
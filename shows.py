@@ -0,0 +1,94 @@
+from flask import Blueprint, render_template, request, flash
+from sqlalchemy.orm import joinedload
+from forms import ShowForm
+from models import db, Show
+from queries import show_page
+from cache import invalidate_shows
+from stats import record_show
+from documents import refresh_pages
+from booking import conflicts, describe, end_time_for, is_conflict
+from pages import show_summary
+
+blueprint = Blueprint('shows', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@blueprint.route('/shows')
+def shows():
+  # displays list of shows at /shows
+  # DONE: replace with real venues data.
+  #       num_shows should be aggregated based on number of upcoming shows per venue.
+  # Both sections are filtered and paged in SQL with keyset cursors, so the
+  # page size stays fixed however much history piles up.
+  shows = Show.query.options(
+    joinedload(Show.venue_shows),
+    joinedload(Show.artist_shows)
+  )
+  upcoming_page = show_page(shows, True, request.args.get('upcoming'))
+  past_page = show_page(shows, False, request.args.get('past'))
+
+  return render_template('pages/shows.html',
+    shows=[show_summary(show) for show in upcoming_page.items],
+    past_shows=[show_summary(show) for show in past_page.items],
+    upcoming_page=upcoming_page, past_page=past_page)
+
+@blueprint.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@blueprint.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  form = ShowForm()
+  if not form.validate_on_submit():
+    flash(form.errors)
+    return render_template('forms/new_show.html', form=form)
+  venue_id, artist_id = form.venue_id.data, form.artist_id.data
+  start_time = form.start_time.data
+  end_time = end_time_for(start_time, form.end_time.data)
+
+  # Checked up front to say which booking is in the way; the slot check on
+  # shows still catches a clash committed in the meantime.
+  clashes = conflicts(venue_id, artist_id, start_time, end_time)
+  if clashes:
+    for show in clashes:
+      flash(describe(show, venue_id))
+    return render_template('forms/new_show.html', form=form)
+  try:
+    newShow = Show(
+      artist_id = artist_id,
+      venue_id = venue_id,
+      start_time = start_time,
+      end_time = end_time
+    )
+    db.session.add(newShow)
+    db.session.flush()
+    # Same transaction as the show, so the counts can't drift from it.
+    record_show(newShow.venue_id, newShow.artist_id, newShow.start_time)
+    refresh_pages([newShow.venue_id], [newShow.artist_id])
+    db.session.commit()
+    invalidate_shows([venue_id], [artist_id])
+    flash('Show was successfully listed!')
+  except Exception as e:
+    db.session.rollback()
+    if is_conflict(e):
+      flash('The venue or the artist was booked for this slot in the meantime. Show could not be listed.')
+    else:
+      flash('An error occurred. Show could not be listed.')
+  finally:
+    db.session.close()
+  return render_template('pages/home.html')
+  # called to create new shows in the db, upon submitting new show listing form
+  # DONE: insert form data as a new Show record in the db, instead
+
+  # on successful db insert, flash success
+  
+  # DONE: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Show could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
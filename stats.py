@@ -0,0 +1,128 @@
+import datetime
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from models import db, Venue, Artist, Show, VenueStats, ArtistStats
+from documents import roll_pages
+
+#----------------------------------------------------------------------------#
+# Show statistics.
+#
+# venue_stats and artist_stats hold upcoming/past show counts and the
+# next/last show time per venue and artist:
+#
+#   * record_show() adjusts the two rows touched by a new show,
+#   * refresh_stats() recomputes the rows of the given venues/artists,
+#   * roll_stats() recomputes only the rows whose next show has started,
+#     and is run periodically with `flask stats roll --every 60`.
+#----------------------------------------------------------------------------#
+
+SIDES = (
+    (VenueStats, VenueStats.venue_id, Venue, Show.venue_id),
+    (ArtistStats, ArtistStats.artist_id, Artist, Show.artist_id),
+)
+
+
+def record_show(venue_id, artist_id, start_time):
+    # Incremental upsert for one new show, meant to run in the transaction
+    # that inserts it.
+    upcoming = start_time > datetime.datetime.now()
+    for (stats, key, _, _), entity_id in zip(SIDES, (venue_id, artist_id)):
+        statement = insert(stats).values({
+            key.key: entity_id,
+            'upcoming_count': 1 if upcoming else 0,
+            'past_count': 0 if upcoming else 1,
+            'next_show_at': start_time if upcoming else None,
+            'last_show_at': None if upcoming else start_time,
+        })
+        # LEAST/GREATEST skip NULLs, so an empty side keeps the other value.
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[key.key],
+            set_={
+                'upcoming_count': stats.upcoming_count + statement.excluded.upcoming_count,
+                'past_count': stats.past_count + statement.excluded.past_count,
+                'next_show_at': func.least(stats.next_show_at, statement.excluded.next_show_at),
+                'last_show_at': func.greatest(stats.last_show_at, statement.excluded.last_show_at),
+            }
+        ))
+
+
+def _refresh(stats, key, entity, show_key, ids=None):
+    now = datetime.datetime.now()
+    upcoming = Show.start_time > now
+    past = Show.start_time <= now
+    rows = select(
+        entity.id,
+        func.count(Show.id).filter(upcoming),
+        func.count(Show.id).filter(past),
+        func.min(Show.start_time).filter(upcoming),
+        func.max(Show.start_time).filter(past),
+    ).select_from(entity).outerjoin(Show, show_key == entity.id).group_by(entity.id)
+    if ids is not None:
+        rows = rows.where(entity.id.in_(ids))
+
+    columns = [key.key, 'upcoming_count', 'past_count', 'next_show_at', 'last_show_at']
+    statement = insert(stats).from_select(columns, rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[key.key],
+        set_={column: statement.excluded[column] for column in columns[1:]}
+    ))
+
+
+def refresh_stats(venue_ids=None, artist_ids=None, full=False):
+    # Recomputes the rows of the given venues and artists from their shows
+    # (index range scans on shows), or every row when full=True.
+    for (stats, key, entity, show_key), ids in zip(SIDES, (venue_ids, artist_ids)):
+        if full:
+            _refresh(stats, key, entity, show_key)
+        elif ids:
+            _refresh(stats, key, entity, show_key, list(set(ids)))
+
+
+def refresh_for_shows(rows):
+    # rows are show dicts with venue_id and artist_id, as handled by the API
+    # and the importer.
+    refresh_stats([row['venue_id'] for row in rows], [row['artist_id'] for row in rows])
+
+
+def roll_stats():
+    # Shows that have started since the last run move from upcoming to past.
+    now = datetime.datetime.now()
+    due = []
+    for stats, key, entity, show_key in SIDES:
+        ids = [row[0] for row in db.session.query(key).filter(stats.next_show_at <= now)]
+        if ids:
+            _refresh(stats, key, entity, show_key, ids)
+        due.append(len(ids))
+    db.session.commit()
+    return due
+
+#----------------------------------------------------------------------------#
+# CLI.
+#----------------------------------------------------------------------------#
+
+stats_cli = AppGroup('stats', help='Maintain the venue/artist show statistics.')
+
+
+@stats_cli.command('refresh')
+def refresh_command():
+    """Recompute every venue and artist row."""
+    refresh_stats(full=True)
+    db.session.commit()
+    click.echo('Show statistics rebuilt.')
+
+
+@stats_cli.command('roll')
+@click.option('--every', type=int, help='Keep running, rolling every N seconds.')
+def roll_command(every):
+    """Move started shows from upcoming to past, and rebuild their page documents."""
+    while True:
+        venues, artists = roll_stats()
+        pages = roll_pages()
+        click.echo('Rolled %d venues and %d artists; rebuilt %d pages.' % (venues, artists, pages))
+        if not every:
+            return
+        db.session.remove()
+        time.sleep(every)
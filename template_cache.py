@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Compiled templates.
+#
+# With TEMPLATE_CACHE_DIR set, compiled templates are kept on local disk as
+# Jinja bytecode, so a restarted worker loads them instead of compiling the
+# sources again. Each entry records the checksum of its template source, so
+# an edited template is recompiled rather than served from stale bytecode. With
+# TEMPLATE_PRECOMPILE, create_app() loads every template up front; under
+# gunicorn's preload_app the workers inherit them already compiled.
+#----------------------------------------------------------------------------#
+
+
+class AtomicBytecodeCache(FileSystemBytecodeCache):
+    # Jinja's own cache writes in place. Several workers fill the same
+    # directory, so entries go through a temp file and are renamed into
+    # place, and a reader never sees a partial entry.
+
+    def dump_bytecode(self, bucket):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(tmp, os.path.join(self.directory, self.pattern % bucket.key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class TemplateCache:
+
+    def init_app(self, app):
+        app.extensions['template_cache'] = self
+        directory = app.config.get('TEMPLATE_CACHE_DIR')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = AtomicBytecodeCache(directory)
+        if app.config.get('TEMPLATE_PRECOMPILE'):
+            self.precompile(app)
+
+    def precompile(self, app):
+        # Loads every .html template into the environment (and the bytecode
+        # cache); returns how many and how long it took in milliseconds.
+        started = time.perf_counter()
+        names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+        for name in names:
+            app.jinja_env.get_template(name)
+        return len(names), (time.perf_counter() - started) * 1000
+
+
+template_cache = TemplateCache()
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+templates_cli = AppGroup('templates', help='Compiled template cache.')
+
+
+@templates_cli.command('precompile')
+@with_appcontext
+def precompile_command():
+    """Compile every template into TEMPLATE_CACHE_DIR, e.g. during a deploy."""
+    if not current_app.config.get('TEMPLATE_CACHE_DIR'):
+        raise click.UsageError('TEMPLATE_CACHE_DIR is not set for this profile.')
+    count, elapsed = template_cache.precompile(current_app)
+    click.echo('Compiled %d templates in %.0f ms into %s' % (count, elapsed, current_app.config['TEMPLATE_CACHE_DIR']))
@@ -0,0 +1,39 @@
+import os
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from models import db
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#
+# Tests needing Postgres use the `database` fixture: the testing profile's
+# database (TEST_DATABASE_URL), migrated to the latest revision. Tests wipe
+# and seed the catalog there as they need. They are skipped when the
+# database can't be reached.
+#----------------------------------------------------------------------------#
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app('testing')
+
+
+@pytest.fixture(scope='session')
+def database(app):
+    from flask_migrate import upgrade
+    with app.app_context():
+        try:
+            db.engine.connect().close()
+        except OperationalError as e:
+            pytest.skip('Test database unavailable: %s' % str(e.orig).strip())
+        upgrade(directory=MIGRATIONS)
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client(use_cookies=False)
@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import event
+from models import db, Venue, Artist, Show
+from benchmarks.seed import seed
+
+
+def venue(name):
+    return {'name': name, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St', 'phone': '555-555-0101',
+            'genres': ['Jazz', 'Folk'], 'facebook_link': 'https://www.facebook.com/venue'}
+
+
+@pytest.fixture
+def inserts(database):
+    # The INSERT statements run while the test does.
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_post_creates_every_row_with_one_insert(database, client, inserts):
+    seed(venues=0, artists=0, shows=0)
+    del inserts[:]
+
+    response = client.post('/api/v1/venues', json=[venue('First'), venue('Second'), venue('Third')])
+
+    assert response.status_code == 201, response.get_json()
+    ids = response.get_json()['ids']
+    assert len(ids) == 3
+    assert sorted(name for name, in db.session.query(Venue.name).filter(Venue.id.in_(ids))) == \
+        ['First', 'Second', 'Third']
+    assert len([statement for statement in inserts if statement.startswith('INSERT INTO venues ')]) == 1
+
+
+def test_post_rejects_the_whole_batch_on_validation_errors(database, client):
+    seed(venues=0, artists=0, shows=0)
+
+    response = client.post('/api/v1/venues', json={'data': [venue('Fine'), dict(venue('Bad'), state='XX')]})
+
+    assert response.status_code == 400
+    assert list(response.get_json()['rows']) == ['1']
+    assert db.session.query(Venue).count() == 0
+
+
+def test_post_answers_409_for_a_double_booking(database, client):
+    seed(venues=1, artists=2, shows=0)
+    show = {'venue_id': 1, 'artist_id': 1, 'start_time': '2030-01-01T20:00:00'}
+    assert client.post('/api/v1/shows', json=[show]).status_code == 201
+
+    response = client.post('/api/v1/shows', json=[dict(show, artist_id=2, start_time='2030-01-01T21:00:00'),
+                                                  dict(show, start_time='2030-01-02T20:00:00')])
+
+    assert response.status_code == 409
+    assert 'overlaps' in response.get_json()['error']
+    assert db.session.query(Show).count() == 1
+
+
+def test_list_pages_with_after_and_limit(database, client):
+    seed(venues=5, artists=0, shows=0)
+
+    first = client.get('/api/v1/venues?limit=2').get_json()
+    assert [row['id'] for row in first['data']] == [1, 2]
+    second = client.get(first['next']).get_json()
+    assert [row['id'] for row in second['data']] == [3, 4]
+    last = client.get('/api/v1/venues?limit=2&after=4').get_json()
+    assert [row['id'] for row in last['data']] == [5] and last['next'] is None
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues?fields=name,city', '/api/v1/venues/1?fields=name,city'])
+def test_fields_selects_columns(database, client, path):
+    seed(venues=2, artists=0, shows=0)
+
+    data = client.get(path).get_json()['data']
+
+    for row in data if isinstance(data, list) else [data]:
+        assert set(row) == {'id', 'name', 'city'}
+    response = client.get(path.replace('city', 'nope'))
+    assert response.status_code == 400 and response.get_json()['fields'] == ['nope']
+
+
+@pytest.mark.parametrize('path', ['/api/v1/venues', '/api/v1/venues/1'])
+def test_strong_etag_gets_a_304(database, client, path):
+    seed(venues=2, artists=0, shows=0)
+
+    response = client.get(path)
+    etag, weak = response.get_etag()
+    assert response.status_code == 200 and not weak
+
+    response = client.get(path, headers={'If-None-Match': '"%s"' % etag})
+    assert response.status_code == 304 and not response.data
+
+    client.patch('/api/v1/venues', json=[{'id': 1, 'name': 'Renamed'}])
+    assert client.get(path, headers={'If-None-Match': '"%s"' % etag}).status_code == 200
+
+
+@pytest.mark.parametrize('model, name', [(Venue, 'venues'), (Artist, 'artists')])
+@pytest.mark.parametrize('stored', [None, ''])
+def test_patch_ignores_stored_values_it_does_not_change(database, client, model, name, stored):
+    # The forms require a facebook_link URL, but older rows have none. A
+    # PATCH that leaves it alone must still go through.
+    seed(venues=1, artists=1, shows=0)
+    db.session.query(model).update({'facebook_link': stored})
+    db.session.commit()
+
+    response = client.patch('/api/v1/%s' % name, json=[{'id': 1, 'name': 'Renamed'}])
+
+    assert response.status_code == 200, response.get_json()
+    row = db.session.get(model, 1, populate_existing=True)
+    assert (row.name, row.facebook_link) == ('Renamed', stored)
+
+
+def test_patch_still_validates_the_fields_it_changes(database, client):
+    seed(venues=1, artists=0, shows=0)
+
+    response = client.patch('/api/v1/venues', json=[{'id': 1, 'facebook_link': 'not a url'}])
+
+    assert response.status_code == 400
+    assert list(response.get_json()['rows']['0']) == ['facebook_link']
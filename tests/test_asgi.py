@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import os
+import pytest
+from flask import request
+from cache import FileBackend, page_cache
+from benchmarks.seed import seed
+
+TOKEN = 'secret-token'
+
+
+@pytest.fixture(scope='module')
+def asgi(database):
+    # asgi.py builds its app from FYYUR_ENV when imported.
+    previous = os.environ.get('FYYUR_ENV')
+    os.environ['FYYUR_ENV'] = 'testing'
+    try:
+        module = importlib.import_module('asgi')
+    finally:
+        if previous is None:
+            del os.environ['FYYUR_ENV']
+        else:
+            os.environ['FYYUR_ENV'] = previous
+    module.app.config['DEBUG_STATS_TOKEN'] = TOKEN
+    return module
+
+
+def get(asgi, paths, headers=(), **overrides):
+    # Serves paths in turn on one event loop; returns (status, headers) of each.
+    scope = {
+        'type': 'http', 'method': 'GET', 'query_string': b'', 'root_path': '', 'scheme': 'http',
+        'http_version': '1.1', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    scope.update(overrides)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def serve():
+        responses = []
+        try:
+            for path in paths:
+                messages = []
+
+                async def send(message):
+                    messages.append(message)
+                await asgi.application(dict(scope, path=path), receive, send)
+                start = messages[0]
+                responses.append((start['status'], {name.decode(): value.decode() for name, value in start['headers']}))
+        finally:
+            await asgi.engine.dispose()
+        return responses
+
+    return asyncio.run(serve())
+
+
+def test_detail_pages_go_through_after_request_hooks(asgi):
+    seed(venues=2, artists=2, shows=20)
+
+    (status, headers), = get(asgi, ['/venues/1'], headers=[('X-Debug-Token', TOKEN)])
+    assert status == 200
+    assert headers['server-timing'].startswith('db;dur=')
+    assert int(headers['server-timing'].split('"')[1].split()[0]) > 0
+    assert 'X-Debug-Token' in headers['vary']
+
+    (status, headers), = get(asgi, ['/artists/1'])
+    assert status == 200 and 'server-timing' not in headers
+
+
+def test_file_page_cache(asgi, tmp_path, monkeypatch):
+    seed(venues=2, artists=2, shows=20)
+    monkeypatch.setattr(page_cache, 'backend', FileBackend(str(tmp_path)))
+    monkeypatch.setattr(page_cache, 'timeout', 300)
+    hits = page_cache.hits
+
+    responses = get(asgi, ['/venues/2', '/venues/2'])
+
+    assert [status for status, _ in responses] == [200, 200]
+    assert page_cache.hits == hits + 1
+    assert os.listdir(str(tmp_path))
+
+
+@pytest.fixture
+def before_request(asgi):
+    # Registers a before_request hook on the ASGI app for one test.
+    hooks = []
+
+    def register(hook):
+        asgi.app.before_request_funcs.setdefault(None, []).append(hook)
+        hooks.append(hook)
+    yield register
+    for hook in hooks:
+        asgi.app.before_request_funcs[None].remove(hook)
+
+
+def test_detail_pages_see_the_real_request(asgi, before_request):
+    seed(venues=2, artists=2, shows=20)
+    seen = []
+    before_request(lambda: seen.append((request.url, request.remote_addr, request.script_root)))
+
+    (status, _), = get(asgi, ['/fyyur/venues/1'], headers=[('Host', 'fyyur.example.com')], scheme='https',
+                        server=('10.0.0.5', 8000), client=('203.0.113.9', 5555), root_path='/fyyur')
+
+    assert status == 200
+    assert seen == [('https://fyyur.example.com/fyyur/venues/1', '203.0.113.9', '/fyyur')]
+
+
+def test_before_request_hook_can_answer(asgi, before_request):
+    seed(venues=2, artists=2, shows=20)
+    before_request(lambda: ('Forbidden', 403))
+
+    (status, _), = get(asgi, ['/venues/1'])
+    assert status == 403
+
+
+def test_errors_get_the_500_page(asgi, monkeypatch):
+    seed(venues=2, artists=2, shows=20)
+
+    async def fail(kind, entity_id):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(asgi, 'fetch_revision', fail)
+    monkeypatch.setitem(asgi.app.config, 'PROPAGATE_EXCEPTIONS', False)
+
+    (status, headers), = get(asgi, ['/venues/1'])
+    assert status == 500 and headers['content-type'].startswith('text/html')
@@ -0,0 +1,88 @@
+import datetime
+import threading
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Show, SHOW_DURATION
+from benchmarks.seed import seed
+from booking import is_conflict, lock_slots
+
+START = datetime.datetime(2100, 1, 1, 20)
+
+
+def book(connection, venue_id, artist_id, start_time):
+    connection.execute(Show.__table__.insert(), [{
+        'venue_id': venue_id, 'artist_id': artist_id,
+        'start_time': start_time, 'end_time': start_time + SHOW_DURATION,
+    }])
+
+
+@pytest.mark.parametrize('side, second', [('venue', (1, 2)), ('artist', (2, 1))])
+def test_concurrent_overlapping_bookings(database, side, second):
+    # The first booking is still uncommitted when the second one, an hour
+    # later at the same venue (or with the same artist), is inserted on
+    # another connection. The second has to wait for the first, then fail
+    # with the exclusion violation booking.is_conflict() looks for.
+    seed(venues=2, artists=2, shows=0)
+    outcome = {}
+
+    with db.engine.connect() as first, db.engine.connect() as other:
+        def book_second():
+            transaction = other.begin()
+            try:
+                book(other, *second, START + datetime.timedelta(hours=1))
+                transaction.commit()
+                outcome['booked'] = True
+            except IntegrityError as e:
+                transaction.rollback()
+                outcome['error'] = e
+
+        transaction = first.begin()
+        book(first, 1, 1, START)
+        thread = threading.Thread(target=book_second)
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive(), 'the second booking did not wait for the first'
+        transaction.commit()
+        thread.join(10)
+
+    assert 'booked' not in outcome
+    assert is_conflict(outcome['error'])
+    assert outcome['error'].orig.diag.constraint_name == 'shows_%s_slot_excl' % side
+    assert db.session.execute(select(func.count()).select_from(Show).where(Show.start_time >= START)).scalar() == 1
+
+
+def test_writes_of_several_statements_do_not_deadlock(database, app):
+    # Two transactions each book venue 1 / artist 1 and venue 2 / artist 2
+    # with one INSERT per show, in opposite orders. Taking the locks of each
+    # INSERT as it runs, they would wait on each other; with lock_slots()
+    # first, the second waits for the first to commit and then goes through.
+    seed(venues=2, artists=2, shows=0)
+    pairs = [(1, 1), (2, 2)]
+    outcome = {}
+
+    def book_reversed():
+        with app.app_context():
+            try:
+                lock_slots({'venue_id': venue_id, 'artist_id': artist_id} for venue_id, artist_id in pairs)
+                for day, (venue_id, artist_id) in enumerate(reversed(pairs), start=1):
+                    book(db.session, venue_id, artist_id, START + datetime.timedelta(days=day))
+                db.session.commit()
+                outcome['booked'] = True
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                db.session.remove()
+
+    lock_slots({'venue_id': venue_id, 'artist_id': artist_id} for venue_id, artist_id in pairs)
+    book(db.session, *pairs[0], START)
+    thread = threading.Thread(target=book_reversed)
+    thread.start()
+    thread.join(0.5)
+    assert thread.is_alive(), 'the second transaction did not wait for the first'
+    book(db.session, *pairs[1], START)
+    db.session.commit()
+    thread.join(10)
+
+    assert outcome == {'booked': True}
+    assert db.session.execute(select(func.count()).select_from(Show).where(Show.start_time >= START)).scalar() == 4
@@ -0,0 +1,30 @@
+import json
+import pytest
+from benchmarks.seed import seed
+from exporter import export_command
+
+
+@pytest.fixture
+def catalog(database):
+    seed(venues=2, artists=2, shows=20)
+
+
+@pytest.mark.parametrize('option', ['--since', '--until'])
+def test_cli_rejects_malformed_dates(catalog, app, option):
+    result = app.test_cli_runner().invoke(export_command, ['shows', option, '2021-13-45'])
+    assert result.exit_code == 2
+    assert "'2021-13-45' is not an ISO 8601 date" in result.output
+
+
+def test_cli_filters_on_dates(catalog, app):
+    result = app.test_cli_runner().invoke(export_command, ['shows', '--since', '2000-01-01', '--until', '2000-01-02'])
+    assert result.exit_code == 0 and result.output == ''
+    result = app.test_cli_runner().invoke(export_command, ['shows', '--since', '2000-01-01T00:00'])
+    assert result.exit_code == 0 and len([json.loads(line) for line in result.output.splitlines()]) == 20
+
+
+@pytest.mark.parametrize('query', ['since=2021-13-45', 'until=yesterday', 'since=2021-01-01T25:00'])
+def test_http_export_rejects_malformed_dates(catalog, client, query):
+    response = client.get('/api/v1/shows/export?' + query)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'since and until must be ISO 8601 dates.'
@@ -0,0 +1,244 @@
+import io
+import ipaddress
+import os
+import threading
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from PIL import Image as PILImage
+from models import db, Image, Job
+from images import (BrokenImage, SIZES, download, fetch_image, image_path, is_public, make_thumbnails,
+                    queue_fetches, register_images, thumbnail_url, url_key)
+from jobs import claim, run
+
+MAX_BYTES = 512 * 1024
+STAND_IN = ('127.0.0.1',)
+
+
+def encode(width, height, format):
+    image = PILImage.linear_gradient('L').resize((width, height)).convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format)
+    return out.getvalue()
+
+
+@pytest.fixture(scope='module')
+def stand_in():
+    # A local image host: path -> (status, headers, body). Returns its base URL.
+    photo = encode(1200, 800, 'JPEG')
+    files = {
+        '/photo.jpg': (200, {'Content-Type': 'image/jpeg'}, photo),
+        '/drawing.png': (200, {'Content-Type': 'image/png'}, encode(600, 400, 'PNG')),
+        '/small.jpg': (200, {'Content-Type': 'image/jpeg'}, encode(100, 80, 'JPEG')),
+        '/missing.jpg': (404, {'Content-Type': 'text/html'}, b'<h1>Not Found</h1>'),
+        '/page.html': (200, {'Content-Type': 'text/html'}, b'<html><body>Not an image</body></html>'),
+        '/huge.jpg': (200, {'Content-Type': 'image/jpeg'}, photo + b'\0' * MAX_BYTES),
+        '/error.jpg': (503, {'Content-Type': 'text/plain'}, b'Try again later'),
+        '/moved.jpg': (302, {'Location': '/photo.jpg'}, b''),
+        '/to-private.jpg': (302, {'Location': 'http://10.255.0.1/photo.jpg'}, b''),
+        '/to-metadata.jpg': (302, {'Location': 'http://169.254.169.254/latest/meta-data/'}, b''),
+        '/to-ftp.jpg': (302, {'Location': 'ftp://127.0.0.1/photo.jpg'}, b''),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, body = files.get(self.path, (404, {}, b''))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%d' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def outcome(url, allowed_hosts=STAND_IN):
+    try:
+        make_thumbnails(download(url, timeout=5, max_bytes=MAX_BYTES, allowed_hosts=allowed_hosts))
+    except BrokenImage:
+        return 'broken'
+    except urllib.error.URLError:
+        return 'retry'
+    return 'ok'
+
+#----------------------------------------------------------------------------#
+# Fetching.
+#----------------------------------------------------------------------------#
+
+@pytest.mark.parametrize('path, expected', [
+    ('/photo.jpg', 'ok'),
+    ('/drawing.png', 'ok'),
+    ('/small.jpg', 'ok'),
+    ('/moved.jpg', 'ok'),
+    ('/missing.jpg', 'broken'),
+    ('/page.html', 'broken'),
+    ('/huge.jpg', 'broken'),
+    ('/to-private.jpg', 'broken'),
+    ('/to-metadata.jpg', 'broken'),
+    ('/to-ftp.jpg', 'broken'),
+    ('/error.jpg', 'retry'),
+])
+def test_download(stand_in, path, expected):
+    assert outcome(stand_in + path) == expected
+
+
+def test_download_refuses_local_hosts(stand_in):
+    # The stand-in itself, unless it is allowed.
+    assert outcome(stand_in + '/photo.jpg', allowed_hosts=()) == 'broken'
+    assert outcome(stand_in.replace('127.0.0.1', 'localhost') + '/photo.jpg') == 'broken'
+
+
+@pytest.mark.parametrize('address, public', [
+    ('93.184.216.34', True),
+    ('2606:2800:220:1:248:1893:25c8:1946', True),
+    ('127.0.0.1', False),
+    ('10.1.2.3', False),
+    ('172.16.0.1', False),
+    ('192.168.1.1', False),
+    ('169.254.169.254', False),
+    ('100.64.0.1', False),
+    ('0.0.0.0', False),
+    ('224.0.0.1', False),
+    ('::1', False),
+    ('fe80::1', False),
+    ('fd00::1', False),
+    ('::ffff:127.0.0.1', False),
+])
+def test_is_public(address, public):
+    assert is_public(ipaddress.ip_address(address)) == public
+
+
+def test_make_thumbnails_fit_without_enlarging():
+    thumbnails = make_thumbnails(encode(1200, 800, 'PNG'))
+    assert set(thumbnails) == set(SIZES)
+    for size, (width, height) in SIZES.items():
+        image = PILImage.open(io.BytesIO(thumbnails[size]))
+        assert image.format == 'JPEG'
+        assert image.size[0] == width and image.size[1] <= height
+    small = make_thumbnails(encode(100, 80, 'JPEG'))
+    assert PILImage.open(io.BytesIO(small['page'])).size == (100, 80)
+
+
+def test_thumbnail_filter(app):
+    with app.test_request_context():
+        url = 'https://example.com/venue.jpg'
+        assert thumbnail_url(url) == '/images/tile/%s.jpg' % url_key(url)
+        assert thumbnail_url(url, 'page') == '/images/page/%s.jpg' % url_key(url)
+        assert thumbnail_url(None).startswith('/static/img/placeholder.')
+        rendered = app.jinja_env.from_string("{{ link|thumbnail('page') }}").render(link=url)
+        assert rendered == '/images/page/%s.jpg' % url_key(url)
+
+#----------------------------------------------------------------------------#
+# The fetch_image job and the thumbnail route.
+#----------------------------------------------------------------------------#
+
+@pytest.fixture
+def images(database, app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'IMAGE_FETCH_ALLOWED_HOSTS', STAND_IN)
+    monkeypatch.setitem(app.config, 'JOBS_EAGER', False)
+    db.session.execute(Image.__table__.delete())
+    db.session.execute(Job.__table__.delete())
+    db.session.commit()
+    yield tmp_path
+    db.session.rollback()
+
+
+def pending(url):
+    key, = register_images([url])
+    db.session.commit()
+    return key
+
+
+def fetched(url):
+    key = pending(url)
+    fetch_image(key)
+    db.session.commit()
+    return db.session.get(Image, key, populate_existing=True)
+
+
+def test_fetch_image_stores_thumbnails(images, stand_in):
+    image = fetched(stand_in + '/photo.jpg')
+    assert image.status == 'ok' and image.error is None and image.fetched_at is not None
+    assert set(image.thumbnails) == set(SIZES)
+    for digest in image.thumbnails.values():
+        assert os.path.exists(image_path(str(images), digest))
+
+
+@pytest.mark.parametrize('path', ['/missing.jpg', '/page.html', '/huge.jpg', '/to-metadata.jpg'])
+def test_fetch_image_marks_broken(images, stand_in, path, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMAGE_MAX_BYTES', MAX_BYTES)
+    image = fetched(stand_in + path)
+    assert image.status == 'broken' and image.error and image.thumbnails is None
+
+
+def test_fetch_image_is_retried(images, stand_in):
+    # A 503 fails the job, which goes back to the queue with a delay; the
+    # image stays pending.
+    key = pending(stand_in + '/error.jpg')
+    queue_fetches([key])
+    db.session.commit()
+    claimed = claim(lease=60)
+    assert claimed.name == 'fetch_image' and claimed.args == {'key': key}
+    run(claimed)
+    job = db.session.get(Job, claimed.id, populate_existing=True)
+    assert job.status == 'queued' and job.attempts == 1 and 'HTTP Error 503' in job.last_error
+    assert job.run_at > job.queued_at
+    assert db.session.get(Image, key, populate_existing=True).status == 'pending'
+
+
+def placeholder(response):
+    return (response.status_code == 302 and '/static/img/placeholder.' in response.headers['Location']
+            and 'no-cache' in response.headers['Cache-Control'])
+
+
+def test_send_thumbnail(images, stand_in, client, app):
+    url = stand_in + '/photo.jpg'
+    with app.test_request_context():
+        tile, page = thumbnail_url(url), thumbnail_url(url, 'page')
+
+    # Never redirects to the link itself.
+    assert placeholder(client.get(tile))
+    pending(url)
+    assert placeholder(client.get(tile))
+
+    fetch_image(url_key(url))
+    db.session.commit()
+    response = client.get(page)
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    etag, _ = response.get_etag()
+    assert etag == db.session.get(Image, url_key(url), populate_existing=True).thumbnails['page']
+    assert response.cache_control.public and response.cache_control.max_age == app.config['IMAGE_MAX_AGE']
+    assert PILImage.open(io.BytesIO(response.data)).size == (720, 480)
+    assert client.get(page, headers={'If-None-Match': '"%s"' % etag}).status_code == 304
+
+
+def test_send_thumbnail_broken(images, stand_in, client, app):
+    url = stand_in + '/missing.jpg'
+    assert fetched(url).status == 'broken'
+    with app.test_request_context():
+        assert placeholder(client.get(thumbnail_url(url)))
+
+
+def test_send_thumbnail_without_its_file(images, stand_in, client, app, monkeypatch):
+    # The row says ok, but the file was written on another host, or a size
+    # was added after the fetch.
+    url = stand_in + '/photo.jpg'
+    image = fetched(url)
+    assert image.status == 'ok'
+    with app.test_request_context():
+        tile = thumbnail_url(url)
+    os.remove(image_path(str(images), image.thumbnails['tile']))
+    assert placeholder(client.get(tile))
+
+    monkeypatch.setitem(SIZES, 'poster', (1080, 1620))
+    with app.test_request_context():
+        assert placeholder(client.get(thumbnail_url(url, 'poster')))
@@ -0,0 +1,59 @@
+import csv
+import json
+import pytest
+from models import db, Venue, ImportCheckpoint
+from benchmarks.seed import seed
+from importer import run_import
+
+FIELDS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'facebook_link')
+
+
+def venue(name, city='Austin'):
+    return {'name': name, 'city': city, 'state': 'TX', 'address': '1 Main St', 'phone': '555-555-0101',
+            'genres': 'Jazz,Folk', 'facebook_link': 'https://www.facebook.com/venue'}
+
+
+def test_rows_too_long_for_their_column_are_rejected(database, tmp_path):
+    # The forms have no length limits; varchar(120) does. The bad row goes to
+    # the error report and the rest of its batch is imported.
+    seed(venues=0, artists=0, shows=0)
+    path = tmp_path / 'venues.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerow(venue('First'))
+        writer.writerow(venue('Too long', city='x' * 200))
+        writer.writerow(venue('Third'))
+
+    result = run_import('venues', str(path), batch_size=10)
+
+    assert (result['inserted'], result['rejected']) == (2, 1)
+    assert sorted(name for name, in db.session.query(Venue.name)) == ['First', 'Third']
+    with open(str(path) + '.errors.jsonl') as f:
+        errors = [json.loads(line) for line in f]
+    assert [error['line'] for error in errors] == [3]
+    assert 'too long' in errors[0]['errors']['row'][0]
+
+
+def test_resumed_import_inserts_and_reports_each_row_once(database, tmp_path):
+    # The run dies right after its first batch commits. The checkpoint moved
+    # with that batch, so the second run starts at the next one, and the row
+    # rejected in the first batch is neither reported nor counted again.
+    seed(venues=0, artists=0, shows=0)
+    path = tmp_path / 'venues.jsonl'
+    rows = [venue('First'), dict(venue('Bad'), state='XX'), venue('Third'), venue('Fourth'), venue('Fifth')]
+    path.write_text(''.join(json.dumps(dict(row, genres=['Jazz'])) + '\n' for row in rows))
+
+    def crash(checkpoint, rate):
+        raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        run_import('venues', str(path), batch_size=3, progress=crash)
+    assert db.session.query(Venue).count() == 2
+
+    result = run_import('venues', str(path), batch_size=3)
+
+    assert (result['inserted'], result['rejected']) == (4, 1)
+    assert sorted(name for name, in db.session.query(Venue.name)) == ['Fifth', 'First', 'Fourth', 'Third']
+    with open(str(path) + '.errors.jsonl') as f:
+        assert [json.loads(line)['line'] for line in f] == [2]
+    assert db.session.get(ImportCheckpoint, str(path)) is None
@@ -0,0 +1,73 @@
+import datetime
+import pytest
+from sqlalchemy import func
+from models import db, Job
+from jobs import job, enqueue, claim, run, requeue_abandoned
+
+CALLS = []
+
+
+@job('test_record')
+def record(value):
+    CALLS.append(value)
+
+
+@job('test_fail', max_attempts=2)
+def always_fail():
+    raise RuntimeError('broken job')
+
+
+@pytest.fixture
+def queue(database, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'JOBS_EAGER', False)
+    db.session.execute(Job.__table__.delete())
+    db.session.commit()
+    CALLS.clear()
+    yield
+    db.session.rollback()
+
+
+def reload(job_id):
+    return db.session.get(Job, job_id, populate_existing=True)
+
+
+def test_claim_and_run(queue):
+    enqueue('test_record', key='record:1', value=1)
+    enqueue('test_record', key='record:1', value=1)
+    db.session.commit()
+    claimed = claim(lease=60)
+    assert claimed.name == 'test_record' and claimed.attempts == 1
+    assert claim(lease=60) is None, 'a queued job with the same key was not deduplicated'
+    run(claimed)
+    assert CALLS == [1]
+    assert reload(claimed.id).status == 'done'
+
+
+def test_failed_job_is_retried_then_failed(queue):
+    enqueue('test_fail')
+    db.session.commit()
+    claimed = claim(lease=60)
+    run(claimed)
+    retried = reload(claimed.id)
+    assert retried.status == 'queued' and retried.run_at > retried.queued_at
+
+    db.session.execute(Job.__table__.update().values(run_at=func.now()))
+    db.session.commit()
+    run(claim(lease=60))
+    failed = reload(claimed.id)
+    assert failed.status == 'failed' and failed.attempts == 2 and 'broken job' in failed.last_error
+
+
+@pytest.mark.parametrize('attempts, status', [(1, 'queued'), (2, 'failed')])
+def test_abandoned_job(queue, attempts, status):
+    # A job whose worker died is queued again, until its attempts run out.
+    expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    job_id = db.session.execute(Job.__table__.insert().returning(Job.id).values(
+        name='test_fail', args={}, status='running', attempts=attempts, max_attempts=2,
+        started_at=expired, locked_until=expired)).scalar()
+    db.session.commit()
+    requeue_abandoned()
+    abandoned = reload(job_id)
+    assert abandoned.status == status and abandoned.locked_until is None
+    if status == 'failed':
+        assert 'Abandoned' in abandoned.last_error and abandoned.finished_at is not None
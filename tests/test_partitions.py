@@ -0,0 +1,48 @@
+import csv
+import datetime
+import gzip
+from sqlalchemy import func, text
+from models import db, Show, VenueStats, ArtistStats, VenuePage, ArtistPage
+from benchmarks.seed import seed
+from stats import refresh_stats
+from documents import build_pages
+from partitions import COLUMNS, archive_partitions, ensure_partitions, month_of
+
+
+def past_counts(key):
+    now = datetime.datetime.now()
+    return dict(db.session.query(key, func.count()).filter(Show.start_time < now).group_by(key))
+
+
+def test_past_months_are_partitioned_then_archived(database, tmp_path):
+    # Seeded shows before this month land in shows_default.
+    seed(venues=3, artists=3, shows=40, days=60)
+    refresh_stats(full=True)
+    build_pages('venue', [1, 2, 3])
+    build_pages('artist', [1, 2, 3])
+    db.session.commit()
+    total = db.session.query(Show).count()
+    assert db.session.execute(text('SELECT count(*) FROM shows_default')).scalar() > 0
+
+    created = ensure_partitions()
+    assert created
+    assert db.session.execute(text('SELECT count(*) FROM shows_default')).scalar() == 0
+    assert db.session.query(Show).count() == total
+
+    archived = archive_partitions(month_of(datetime.datetime.now()), str(tmp_path))
+    assert [name for name, _, _ in archived] == created
+    for name, count, path in archived:
+        with gzip.open(path, 'rt') as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == list(COLUMNS) and len(rows) == count + 1
+        assert db.session.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar() is None
+    assert db.session.query(Show).count() == total - sum(count for _, count, _ in archived)
+
+    # Archived shows no longer count, on the listings or on the pages.
+    for stats, page, key, show_key in ((VenueStats, VenuePage, VenueStats.venue_id, Show.venue_id),
+                                       (ArtistStats, ArtistPage, ArtistStats.artist_id, Show.artist_id)):
+        expected = past_counts(show_key)
+        assert {entity_id: count for entity_id, count in db.session.query(key, stats.past_count)} == \
+            {entity_id: expected.get(entity_id, 0) for entity_id in (1, 2, 3)}
+        for row in db.session.query(page):
+            assert row.document['past_shows_count'] == expected.get(row.document['id'], 0)
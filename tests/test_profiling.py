@@ -0,0 +1,51 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from models import db
+from benchmarks.seed import seed
+from profiling import UNMATCHED
+
+TOKEN = 'secret-token'
+
+
+@pytest.fixture
+def catalog(database, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'DEBUG_STATS_TOKEN', TOKEN)
+    seed(venues=2, artists=2, shows=0)
+
+
+@pytest.mark.parametrize('headers, timed', [
+    ({}, False),
+    ({'X-Debug-Token': 'wrong'}, False),
+    ({'X-Debug-Token': TOKEN}, True),
+])
+def test_server_timing_only_for_the_debug_token(catalog, client, headers, timed):
+    response = client.get('/venues', headers=headers)
+    assert response.status_code == 200
+    assert ('Server-Timing' in response.headers) == timed
+    if timed:
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+        assert 'X-Debug-Token' in response.vary
+
+
+@pytest.mark.parametrize('headers, status', [({}, 404), ({'X-Debug-Token': 'wrong'}, 404), ({'X-Debug-Token': TOKEN}, 200)])
+def test_debug_stats_needs_the_token(catalog, client, headers, status):
+    assert client.get('/_debug/stats', headers=headers).status_code == status
+
+
+def test_unmatched_urls_share_one_entry(catalog, app, client):
+    profiler = app.extensions['sql_profiler']
+    for path in ('/wp-login.php', '/.env', '/admin/%d' % id(profiler)):
+        assert client.get(path).status_code == 404
+    assert UNMATCHED in profiler.endpoints
+    assert not [endpoint for endpoint in profiler.endpoints if endpoint.startswith('/')]
+
+
+def test_failed_statement_leaves_no_start_time(database, app):
+    with app.test_request_context(), db.engine.connect() as connection:
+        with pytest.raises(DBAPIError):
+            connection.execute(text('SELECT 1 / 0'))
+        assert not connection.info.get('profile_started')
+        connection.execute(text('SELECT 1'))
+        assert g.sql_profile[-1][0] == 'SELECT 1'
@@ -0,0 +1,45 @@
+import time
+import pytest
+from models import db
+from benchmarks.seed import seed
+from database import PRIMARY_COOKIE
+
+VENUE = {'name': 'New Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+         'phone': '555-555-0101', 'genres': ['Jazz'], 'facebook_link': 'https://www.facebook.com/venue'}
+
+
+@pytest.fixture
+def replica(database, app, monkeypatch):
+    # The test database stands in for the replica; only the routing is checked.
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_BINDS', {'replica': app.config['SQLALCHEMY_DATABASE_URI']})
+    yield db.get_engine(app, bind='replica')
+    db.session.remove()
+
+
+def bind(app, method='GET', cookie=None):
+    headers = {'Cookie': '%s=%s' % (PRIMARY_COOKIE, cookie)} if cookie else {}
+    with app.test_request_context('/venues', method=method, headers=headers):
+        return db.session.get_bind()
+
+
+def test_reads_go_to_the_replica(app, replica):
+    assert bind(app) is replica
+    assert bind(app, method='POST') is db.engine
+    assert bind(app, cookie='%d' % (time.time() - 1)) is replica
+    assert bind(app, cookie='garbage') is replica
+
+
+def test_writers_read_from_the_primary_for_a_while(app, replica):
+    seed(venues=0, artists=0, shows=0)
+    client = app.test_client()
+
+    response = client.post('/api/v1/venues', json=[VENUE])
+    assert response.status_code == 201
+    cookie, = [value for value in response.headers.getlist('Set-Cookie') if value.startswith(PRIMARY_COOKIE)]
+    assert 'Max-Age=%d' % app.config['REPLICA_STICKY_SECONDS'] in cookie
+    until = float(cookie.split(';')[0].split('=')[1])
+    assert bind(app, cookie='%d' % until) is db.engine
+
+    # A read-only request doesn't set it.
+    response = client.get('/api/v1/venues')
+    assert not [value for value in response.headers.getlist('Set-Cookie') if value.startswith(PRIMARY_COOKIE)]
@@ -0,0 +1,76 @@
+import pytest
+from flask import url_for
+import artists
+import venues
+from models import db, Venue
+from benchmarks.seed import seed
+from cache import page_cache
+from profiling import StatementCounter
+
+
+@pytest.fixture
+def catalog(database, app, monkeypatch):
+    # Cached pages live for the test, as in production.
+    monkeypatch.setattr(page_cache, 'timeout', 300)
+    page_cache.clear()
+    seed(venues=2, artists=2, shows=20)
+    yield
+    page_cache.clear()
+
+
+def refuse_to_render(monkeypatch):
+    def render(*args, **kwargs):
+        raise AssertionError('rendered a page the client already has')
+    for module in (venues, artists):
+        monkeypatch.setattr(module, 'render_template', render)
+        monkeypatch.setattr(module, 'render_detail', render)
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/venues/1', '/artists/1'])
+def test_matching_etag_gets_a_304_without_rendering(catalog, client, monkeypatch, path):
+    response = client.get(path)
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag.startswith('W/')
+
+    refuse_to_render(monkeypatch)
+    db.session.remove()
+    with StatementCounter(db.engine) as counter:
+        response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.headers['ETag'] == etag and not response.data
+    assert counter.count == 1
+
+
+def test_etag_changes_after_an_edit(catalog, client):
+    before = client.get('/venues/1').headers['ETag']
+    response = client.patch('/api/v1/venues', json=[{'id': 1, 'name': 'Renamed'}])
+    assert response.status_code == 200
+
+    response = client.get('/venues/1', headers={'If-None-Match': before})
+    assert response.status_code == 200 and response.headers['ETag'] != before
+    assert b'Renamed' in response.data
+
+
+def test_page_cached_by_another_worker_is_not_served_after_an_edit(catalog, client):
+    # The edit is handled elsewhere, so this worker's page cache still holds
+    # the old page; it must not go out under the new ETag.
+    etag, _ = client.get('/venues/1').get_etag()
+    assert page_cache.get('venue', 1, etag) is not None
+    db.session.query(Venue).filter(Venue.id == 1).update({'name': 'Renamed elsewhere', 'updated_at': db.func.now()},
+                                                         synchronize_session=False)
+    db.session.commit()
+
+    response = client.get('/venues/1')
+    assert response.status_code == 200 and b'Renamed elsewhere' in response.data
+
+
+def test_fingerprinted_static_files_are_immutable(app, client):
+    with app.test_request_context():
+        url = url_for('static', filename='css/main.css')
+    assert url != '/static/css/main.css'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+
+    response = client.get('/static/css/main.css')
+    assert response.status_code == 200 and not response.cache_control.immutable
@@ -0,0 +1,61 @@
+import pytest
+from models import db, Venue, Artist, VenuePage, ArtistPage
+from benchmarks.seed import seed
+from documents import build_pages
+from stats import refresh_stats
+from profiling import StatementCounter
+
+# (method, path, form data, most statements allowed). Detail pages are read
+# from their page documents; without one they are built from queries.
+ROUTES = [
+    ('GET', '/venues', None, 2),
+    ('POST', '/venues/search', {'search_term': 'a'}, 2),
+    ('GET', '/artists', None, 2),
+    ('POST', '/artists/search', {'search_term': 'a'}, 2),
+    ('GET', '/shows', None, 2),
+    ('GET', '/venues/{venue}', None, 2),
+    ('GET', '/venues/{venue}/edit', None, 1),
+    ('GET', '/artists/{artist}', None, 2),
+    ('GET', '/artists/{artist}/edit', None, 1),
+]
+WITHOUT_DOCUMENTS = [
+    ('GET', '/venues/{venue}', None, 6),
+    ('GET', '/artists/{artist}', None, 6),
+]
+
+
+@pytest.fixture(scope='module')
+def catalog(database):
+    seed(venues=20, artists=20, shows=400)
+    refresh_stats(full=True)
+    build_pages('venue', [venue_id for venue_id, in db.session.query(Venue.id)])
+    build_pages('artist', [artist_id for artist_id, in db.session.query(Artist.id)])
+    db.session.commit()
+    return {'venue': 1, 'artist': 1}
+
+
+def statements(client, method, path, data):
+    # A fresh session, so nothing is served from the identity map.
+    db.session.remove()
+    with StatementCounter(db.engine) as counter:
+        response = client.open(path, method=method, data=data)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize('method, path, data, most', ROUTES)
+def test_route_statements(catalog, client, method, path, data, most):
+    assert statements(client, method, path.format(**catalog), data) <= most
+
+
+@pytest.mark.parametrize('method, path, data, most', WITHOUT_DOCUMENTS)
+def test_route_statements_without_documents(catalog, client, method, path, data, most):
+    db.session.execute(VenuePage.__table__.delete())
+    db.session.execute(ArtistPage.__table__.delete())
+    db.session.commit()
+    try:
+        assert statements(client, method, path.format(**catalog), data) <= most
+    finally:
+        build_pages('venue', [catalog['venue']])
+        build_pages('artist', [catalog['artist']])
+        db.session.commit()
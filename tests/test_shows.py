@@ -0,0 +1,16 @@
+from models import db, Job
+from benchmarks.seed import seed
+
+
+def test_create_show_form(database, client):
+    # The form sends the ids as strings; the show is listed and the pages of
+    # its venue and artist are queued for a rebuild.
+    seed(venues=1, artists=1, shows=0)
+    db.session.execute(Job.__table__.delete())
+    db.session.commit()
+
+    response = client.post('/shows/create', data={
+        'venue_id': '1', 'artist_id': '1', 'start_time': '2100-01-01 20:00:00', 'end_time': ''})
+
+    assert b'Show was successfully listed!' in response.data
+    assert sorted(key for key, in db.session.query(Job.key)) == ['page:artist:1', 'page:venue:1']
@@ -0,0 +1,33 @@
+from models import db, Venue
+from pages import render_detail
+from queries import ShowPage
+from benchmarks.seed import seed
+from profiling import StatementCounter
+
+
+def venues_statements(client, venues):
+    seed(venues=venues, artists=1, shows=0)
+    db.session.remove()
+    with StatementCounter(db.engine) as counter:
+        response = client.get('/venues')
+    assert response.status_code == 200
+    return counter.count
+
+
+def test_venues_statements_do_not_grow_with_venues(database, client):
+    # /venues is built from one grouped query, however many venues and areas
+    # there are.
+    assert venues_statements(client, 20) == venues_statements(client, 200)
+
+
+
+def test_detail_page_leaves_the_venue_untouched(database, app):
+    # The template gets a plain copy of the venue and its shows; nothing is
+    # set on the ORM instance.
+    seed(venues=2, artists=2, shows=0)
+    no_shows = ShowPage([], None, None)
+    with app.test_request_context():
+        venue = db.session.get(Venue, 1)
+        html = render_detail('pages/show_venue.html', 'venue', venue, None, no_shows, no_shows)
+        assert 'Venue 1' in html
+        assert not hasattr(venue, 'upcoming_shows') and not db.session.dirty
@@ -0,0 +1,208 @@
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from sqlalchemy.orm import joinedload
+from forms import VenueForm
+from models import db, Venue, VenueStats, Show
+from queries import venue_areas, find_venues, show_page
+from cache import page_cache, invalidate_venues
+from pages import render_detail, cacheable_page, page_timeout
+from documents import page_document, document_timeout, refresh_pages_for_venues
+from revisions import conditional_page, page_version, venue_revision, venues_revision
+from images import queue_images
+
+blueprint = Blueprint('venues', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@blueprint.route('/venues')
+@conditional_page(venues_revision)
+def venues():
+  # DONE: replace with real venues data.
+  #       num_shows should be aggregated based on number of upcoming shows per venue.
+  # Areas and upcoming show counts come from one grouped query instead of
+  # a query per city and a count per venue.
+  data = venue_areas()
+
+  return render_template('pages/venues.html', areas=data)
+
+@blueprint.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+  # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for Hop should return "The Musical Hop".
+  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+  # Name, city, state and genres are all searched, ranked by relevance.
+  # Further pages are requested with GET so they can be linked to.
+  search_term = request.values.get('search_term', '')
+  page = request.values.get('page', 1, type=int)
+  search_results = find_venues(search_term, page)
+
+  response={
+    "count": search_results.total,
+    "data": search_results.items,
+    "pagination": search_results
+  }
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+@blueprint.route('/venues/<int:venue_id>')
+@conditional_page(venue_revision)
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  # DONE: replace with real venue data from the venues table, using venue_id
+  cacheable = cacheable_page()
+  if cacheable:
+    html = page_cache.get('venue', venue_id, page_version())
+    if html is not None:
+      return html
+
+  # The default view is rendered from the venue's page document while it is
+  # fresh; paged views and venues without one query their shows.
+  if not request.args:
+    document = page_document('venue', venue_id)
+    if document is not None:
+      html = render_template('pages/show_venue.html', venue=document)
+      if cacheable:
+        page_cache.set('venue', venue_id, html, document_timeout(document), page_version())
+      return html
+
+  data = Venue.query.get_or_404(venue_id)
+  stats = VenueStats.query.get(venue_id)
+
+  # Upcoming and past shows are paged separately, each with its own cursor.
+  venue_shows = Show.query.filter(Show.venue_id == venue_id).options(joinedload(Show.artist_shows))
+  upcoming_page = show_page(venue_shows, True, request.args.get('upcoming'))
+  past_page = show_page(venue_shows, False, request.args.get('past'))
+
+  html = render_detail('pages/show_venue.html', 'venue', data, stats, upcoming_page, past_page)
+  if cacheable:
+    page_cache.set('venue', venue_id, html, page_timeout(upcoming_page), page_version())
+  return html
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@blueprint.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@blueprint.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  form = VenueForm()
+  if not form.validate_on_submit():
+      flash(form.errors)
+      return render_template('forms/new_venue.html', form=form)
+  # DONE: insert form data as a new Venue record in the db, instead
+  try:
+    newVenue = Venue(
+      name = form.name.data, 
+      city = form.city.data, 
+      state = form.state.data,
+      address = form.address.data, 
+      phone = form.phone.data, 
+      genres = form.genres.data, 
+      facebook_link = form.facebook_link.data, 
+      image_link = form.image_link.data, 
+      website = form.website_link.data, 
+      seeking_description = form.seeking_description.data, 
+      seeking_talent = form.seeking_talent.data
+    )
+    db.session.add(newVenue)
+    queue_images([form.image_link.data])
+    db.session.commit()
+    # on successful db insert, flash success
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    error = True
+    db.session.rollback()
+    # TODO: on unsuccessful db insert, flash an error instead.
+    flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
+  finally:
+    db.session.close()
+    return redirect(url_for('main.index'))
+
+  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+
+@blueprint.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  print(venue_id)
+  try:
+    venue = Venue.query.filter_by(id = venue_id).delete()
+    db.session.commit()
+    invalidate_venues(venue_id)
+    flash('Venue was successfully deleted!')
+  except:
+    db.session.rollback()
+    flash('An error occurred. Venue could not be deleted.')
+  finally:
+    db.session.close()
+    return jsonify({'success': True})
+  
+  return redirect(url_for('main.index'))
+  # TODO: Complete this endpoint for taking a venue_id, and using
+  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+  # clicking that button delete it from the db then redirect the user to the homepage
+
+#  Update
+#  ----------------------------------------------------------------
+
+@blueprint.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venue = Venue.query.get(venue_id)
+  form.name.default = venue.name
+  form.city.default = venue.city
+  form.state.default = venue.state
+  form.address.default = venue.address
+  form.phone.default = venue.phone
+  form.genres.default = venue.genres
+  form.facebook_link.default = venue.facebook_link
+  form.image_link.default = venue.image_link
+  form.website_link.default = venue.website
+  form.seeking_talent.checked = venue.seeking_talent
+  form.seeking_description.default = venue.seeking_description
+
+  form.process()
+  # TODO: populate form with values from venue with ID <venue_id>
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@blueprint.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  venue = Venue.query.get(venue_id)
+  try:
+    form = VenueForm()
+    venue.name = form.name.data 
+    venue.city = form.city.data
+    venue.state = form.state.data
+    venue.address = form.address.data 
+    venue.phone = form.phone.data
+    venue.genres = form.genres.data 
+    venue.facebook_link = form.facebook_link.data
+    venue.image_link = form.image_link.data
+    venue.website = form.website_link.data
+    venue.seeking_talent = form.seeking_talent.data
+    if form.seeking_talent.data:
+      venue.seeking_description = form.seeking_description.data
+    else:
+      venue.seeking_description = ''
+    
+    refresh_pages_for_venues([venue_id])
+    queue_images([form.image_link.data])
+    db.session.commit()
+    invalidate_venues(venue_id)
+    flash(form.name.data + ' was successfully updated!')
+
+  except:
+    db.session.rollback()
+    flash('An error occurred. ' + form.name.data + ' could not be updated.')
+  finally:
+    db.session.close()
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+  # TODO: take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
@@ -0,0 +1,15 @@
+import os
+
+# Production settings unless FYYUR_ENV says otherwise: no debugger and no
+# reloader behind the WSGI server.
+os.environ.setdefault('FYYUR_ENV', 'production')
+
+from app import create_app
+
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#----------------------------------------------------------------------------#
+
+application = create_app(cli=False)